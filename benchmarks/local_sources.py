@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Benchmark decoding originals from FileSystemStorage by path against
+streaming them into a SpooledTemporaryFile (as other storages are) and
+against decoding straight from the file returned by `storage.open`.
+
+Usage: python benchmarks/local_sources.py [--size 4000] [--format TIFF]
+"""
+import argparse
+import os
+import sys
+from tempfile import TemporaryDirectory
+import timeit
+from unittest import mock
+
+import django
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument(
+        '--size', type=int, default=4000,
+        help="The width & height of the original image."
+    )
+    parser.add_argument(
+        '--format', default='TIFF', choices=('TIFF', 'BMP', 'PNG', 'JPEG'),
+        help="The format of the original image."
+    )
+    parser.add_argument(
+        '--number', type=int, default=10,
+        help="How many times to decode the image with each method."
+    )
+    args = parser.parse_args()
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'tests.test_settings'
+    django.setup()
+    from django.core.files.storage import FileSystemStorage
+    from PIL import Image
+    from versatileimagefield.datastructures import base
+    from versatileimagefield.datastructures.base import ProcessedImage
+
+    def decode(processed_image, name):
+        processed_image.retrieve_image(name)[0].load()
+
+    with TemporaryDirectory() as location:
+        storage = FileSystemStorage(location=location)
+        name = 'original.' + args.format.lower()
+        Image.effect_noise((args.size, args.size), 64).convert('RGB').save(
+            storage.path(name), format=args.format
+        )
+        processed_image = ProcessedImage(name, storage, False)
+        print('Decoding a {} byte {} {} times:'.format(
+            storage.size(name), args.format, args.number
+        ))
+        print('By path:      {:.4f}s'.format(timeit.timeit(
+            lambda: decode(processed_image, name), number=args.number
+        )))
+        with mock.patch.object(
+            ProcessedImage, 'get_source_path', return_value=None
+        ):
+            print('Spooled:      {:.4f}s'.format(timeit.timeit(
+                lambda: decode(processed_image, name), number=args.number
+            )))
+            with mock.patch.object(
+                base, 'VERSATILEIMAGEFIELD_SOURCE_SPOOL_MAX_SIZE', None
+            ):
+                print('storage.open: {:.4f}s'.format(timeit.timeit(
+                    lambda: decode(processed_image, name), number=args.number
+                )))
+
+
+if __name__ == '__main__':
+    main()
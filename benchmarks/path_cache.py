@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Benchmark building the paths of a large grid of renditions with and
+without memoization (VERSATILEIMAGEFIELD_SETTINGS['path_cache_size']).
+
+Usage: python benchmarks/path_cache.py [--images 1000] [--renders 10]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import django
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+)
+
+SIZED_RENDITIONS = (
+    ('crop-c0-5__0-5', 400, 400),
+    ('crop-c0-5__0-5', 100, 100),
+    ('thumbnail', 800, 600),
+    ('thumbnail', 200, 150),
+)
+FILTERS = ('invert', 'gray scale')
+
+
+def render_grid(names, get_resized_path, get_filtered_path):
+    """Build the path of every rendition of each of `names`."""
+    for name in names:
+        for filter_name in FILTERS:
+            get_filtered_path(name, filter_name, None)
+        for filename_key, width, height in SIZED_RENDITIONS:
+            get_resized_path(name, width, height, filename_key, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument(
+        '--images', type=int, default=1000,
+        help="How many images the grid contains."
+    )
+    parser.add_argument(
+        '--renders', type=int, default=10,
+        help="How many times the grid is rendered."
+    )
+    args = parser.parse_args()
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'tests.test_settings'
+    django.setup()
+    from versatileimagefield import utils
+
+    names = [
+        'images/{}/Photo {}.jpg'.format(i % 50, i) for i in range(args.images)
+    ]
+
+    def uncached_resized_path(path_to_image, width, height, filename_key,
+                              storage):
+        return utils._get_resized_path.__wrapped__(
+            path_to_image, width, height, filename_key
+        )
+
+    def uncached_filtered_path(path_to_image, filename_key, storage):
+        return utils._get_filtered_path.__wrapped__(
+            path_to_image, filename_key
+        )
+
+    uncached = timeit.timeit(
+        lambda: render_grid(names, uncached_resized_path, uncached_filtered_path),
+        number=args.renders
+    )
+    utils.clear_path_cache()
+    cached = timeit.timeit(
+        lambda: render_grid(
+            names, utils.get_resized_path, utils.get_filtered_path
+        ),
+        number=args.renders
+    )
+
+    num_paths = args.images * (len(FILTERS) + len(SIZED_RENDITIONS))
+    print('{} paths per render, {} renders'.format(num_paths, args.renders))
+    print('Unmemoized: {:.4f}s'.format(uncached))
+    print('Memoized:   {:.4f}s ({:.1f}x)'.format(cached, uncached / cached))
+    for kind, info in sorted(utils.get_path_cache_info().items()):
+        print('{:<9} hits={} misses={} maxsize={} currsize={}'.format(
+            kind, info.hits, info.misses, info.maxsize, info.currsize
+        ))
+
+
+if __name__ == '__main__':
+    main()
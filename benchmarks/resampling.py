@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Benchmark the throughput and quality (PSNR against the 'exact' strategy)
+of each VERSATILEIMAGEFIELD_SETTINGS['resampling_strategy'] for the
+'crop' and 'thumbnail' Sizers.
+
+The corpus is the images in tests/media plus a synthetic photo-sized
+image (or every image in --corpus).
+
+Usage: python benchmarks/resampling.py [--corpus DIR] [--number 5]
+"""
+import argparse
+from io import BytesIO
+import math
+import os
+import sys
+import time
+from unittest import mock
+
+import django
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+SIZES = ((800, 600), (400, 400), (100, 100))
+
+
+def load_corpus(corpus_dir):
+    """Return a list of (name, PIL Image instance) 2-tuples."""
+    from PIL import Image, ImageFilter
+
+    corpus = []
+    if corpus_dir is None:
+        corpus_dir = os.path.join(REPO_DIR, 'tests', 'media')
+        photo = Image.merge('RGB', [
+            Image.effect_mandelbrot((4000, 3000), extent, 100)
+            for extent in ((-2, -1, 1, 1), (-1.5, -1, 1, 1.2), (-2, -1.2, 0.8, 1))
+        ]).filter(ImageFilter.GaussianBlur(2))
+        corpus.append(('synthetic 4000x3000', photo))
+    for name in sorted(os.listdir(corpus_dir)):
+        path = os.path.join(corpus_dir, name)
+        if not os.path.isfile(path):
+            continue
+        try:
+            image = Image.open(path)
+            image.load()
+        except OSError:
+            continue
+        corpus.append((name, image.convert('RGB')))
+    return corpus
+
+
+def psnr(image, reference):
+    """Return the peak signal-to-noise ratio (in dB) of `image`."""
+    from PIL import ImageChops, ImageStat
+
+    rms = ImageStat.Stat(ImageChops.difference(image, reference)).rms
+    mse = sum(band ** 2 for band in rms) / len(rms)
+    if mse == 0:
+        return float('inf')
+    return 20 * math.log10(255 / math.sqrt(mse))
+
+
+def render(sizer, image, width, height):
+    """Return (seconds, PIL Image) of `sizer` sizing `image`."""
+    from PIL import Image
+
+    image = image.copy()
+    start = time.perf_counter()
+    imagefile = sizer.process_image(
+        image, 'BMP', {'format': 'BMP'}, width, height
+    )
+    seconds = time.perf_counter() - start
+    return seconds, Image.open(BytesIO(imagefile.getvalue()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument(
+        '--corpus', default=None,
+        help="A directory of images (defaults to tests/media and a synthetic image)."
+    )
+    parser.add_argument(
+        '--number', type=int, default=5,
+        help="How many times to size each image with each strategy."
+    )
+    args = parser.parse_args()
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'tests.test_settings'
+    django.setup()
+    from versatileimagefield import versatileimagefield
+    from versatileimagefield.settings import RESAMPLING_STRATEGY_REDUCING_GAPS
+
+    sizers = (
+        ('crop', versatileimagefield.CroppedImage(None, None, False, ppoi=(0.5, 0.5))),
+        ('thumbnail', versatileimagefield.ThumbnailImage(None, None, False)),
+    )
+    corpus = load_corpus(args.corpus)
+    print('{:<26} {:<9} {:>9}  {:<12} {:>12} {:>9}'.format(
+        'image', 'sizer', 'size', 'strategy', 'renders/s', 'PSNR (dB)'
+    ))
+    for name, image in corpus:
+        for sizer_name, sizer in sizers:
+            for width, height in SIZES:
+                if width >= image.size[0] and height >= image.size[1]:
+                    continue
+                reference = None
+                for strategy, reducing_gap in RESAMPLING_STRATEGY_REDUCING_GAPS.items():
+                    with mock.patch.object(
+                        versatileimagefield,
+                        'VERSATILEIMAGEFIELD_REDUCING_GAP',
+                        reducing_gap
+                    ):
+                        seconds = 0
+                        for i in range(args.number):
+                            elapsed, output = render(sizer, image, width, height)
+                            seconds += elapsed
+                    if reference is None:
+                        reference = output
+                    print('{:<26} {:<9} {:>9}  {:<12} {:>12.1f} {:>9.2f}'.format(
+                        name[:26],
+                        sizer_name,
+                        '{}x{}'.format(width, height),
+                        strategy,
+                        args.number / seconds,
+                        psnr(output, reference)
+                    ))
+
+
+if __name__ == '__main__':
+    main()
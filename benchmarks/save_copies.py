@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Benchmark the bytes copied while saving an encoded rendition to storage via
+InMemoryUploadedFile (the previous save path) and RenditionFile.
+
+Bytes are counted as copied when the storage receives them in an object
+other than the BytesIO's own buffer (which, on CPython, `getvalue` returns
+without copying). Two storages are measured:
+FileSystemStorage (which iterates `chunks()`) and one that `read`s the
+file in 64KB pieces, like many remote storages.
+
+Usage: python benchmarks/save_copies.py [--size 2000] [--format PNG]
+"""
+import argparse
+from functools import partial
+from io import BytesIO
+import os
+import sys
+from tempfile import TemporaryDirectory
+import time
+
+import django
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+)
+
+
+class CountingBytesIO(BytesIO):
+    """A BytesIO that records the objects it returns."""
+
+    def __init__(self, data):
+        super(CountingBytesIO, self).__init__()
+        # Written in pieces (like PIL does) so the buffer is over-allocated.
+        for i in range(0, len(data), 64 * 1024):
+            self.write(data[i:i + 64 * 1024])
+        self.returned = []
+
+    def read(self, *args):
+        data = super(CountingBytesIO, self).read(*args)
+        self.returned.append(data)
+        return data
+
+    def getvalue(self):
+        data = super(CountingBytesIO, self).getvalue()
+        self.returned.append(data)
+        return data
+
+    @property
+    def bytes_copied(self):
+        """The bytes returned in objects other than the buffer itself."""
+        buffer_object = super(CountingBytesIO, self).getvalue()
+        return sum(
+            len(data) for data in self.returned if data is not buffer_object
+        )
+
+
+def encode_image(size, image_format):
+    """Return the bytes of a `size` x `size` noisy image."""
+    from PIL import Image
+
+    image = Image.effect_noise((size, size), 64).convert('RGB')
+    imagefile = BytesIO()
+    image.save(imagefile, format=image_format)
+    return imagefile.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument(
+        '--size', type=int, default=2000,
+        help="The width & height of the encoded image."
+    )
+    parser.add_argument(
+        '--format', default='PNG', choices=('PNG', 'WEBP', 'JPEG'),
+        help="The format of the encoded image."
+    )
+    parser.add_argument(
+        '--number', type=int, default=20,
+        help="How many times to save the image with each combination."
+    )
+    args = parser.parse_args()
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'tests.test_settings'
+    django.setup()
+    from django.core.files.storage import FileSystemStorage
+    from django.core.files.uploadedfile import InMemoryUploadedFile
+    from versatileimagefield.datastructures.base import RenditionFile
+
+    class ChunkedReadStorage(FileSystemStorage):
+        """Saves files by `read`ing them in 64KB pieces."""
+
+        def _save(self, name, content):
+            full_path = self.path(name)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'wb') as f:
+                for chunk in iter(partial(content.read, 64 * 1024), b''):
+                    f.write(chunk)
+            return name
+
+    data = encode_image(args.size, args.format)
+    ext = args.format.lower()
+    mime_type = 'image/' + ext
+    file_classes = (
+        ('InMemoryUploadedFile', lambda imagefile: InMemoryUploadedFile(
+            imagefile, None, 'foo.' + ext, mime_type, len(data), None
+        )),
+        ('RenditionFile', lambda imagefile: RenditionFile(
+            imagefile, 'foo.' + ext, mime_type
+        )),
+    )
+
+    print('Saving a {} byte {} {} times:'.format(len(data), args.format, args.number))
+    with TemporaryDirectory() as location:
+        for storage in (
+            FileSystemStorage(location=location, allow_overwrite=True),
+            ChunkedReadStorage(location=location),
+        ):
+            for name, file_class in file_classes:
+                seconds = bytes_copied = 0
+                for i in range(args.number):
+                    imagefile = CountingBytesIO(data)
+                    file_to_save = file_class(imagefile)
+                    file_to_save.seek(0)
+                    start = time.perf_counter()
+                    storage.save('image.' + ext, file_to_save)
+                    seconds += time.perf_counter() - start
+                    bytes_copied += imagefile.bytes_copied
+                print('{:<19} {:<21} {:>6.2f} bytes copied per byte {:.4f}s'.format(
+                    storage.__class__.__name__,
+                    name,
+                    bytes_copied / (len(data) * args.number),
+                    seconds
+                ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+"""
+Settings for benchmarks/suite.py: the test settings with a locmem cache,
+an in-memory database and a temporary MEDIA_ROOT.
+"""
+import tempfile
+
+from tests.test_settings import *  # noqa: F401,F403
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='versatileimagefield-benchmarks-')
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+}
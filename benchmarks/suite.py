@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+"""
+Benchmark the rendition pipeline against FileSystemStorage and a locmem cache.
+
+Measures:
+    * sizers.*/filters.*: Decoding, resizing (or filtering), encoding and
+      saving a rendition of each test image format.
+    * descriptor.*: Accessing a VersatileImageField and the URLs of its
+      renditions on freshly loaded instances.
+    * serializer.*: VersatileImageFieldSerializer URL sets for N objects.
+    * warmer.*: VersatileImageFieldWarmer images per second.
+
+Results can be written as JSON (--json) and compared with a previous run
+(--compare) to spot regressions across commits:
+
+    python benchmarks/suite.py --json before.json
+    git checkout my-branch
+    python benchmarks/suite.py --compare before.json
+
+Usage: python benchmarks/suite.py [--filter NAME] [--quick]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+import django
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+# {PIL format: A test image in that format}
+IMAGES = {
+    'JPEG': 'python-logo.jpg',
+    'PNG': 'python-logo.png',
+    'GIF': 'python-logo.gif',
+    'WEBP': 'python-logo.webp',
+}
+BENCHMARKS = []
+
+
+def benchmark(func):
+    """Register `func` (which yields (name, setup, run, items) 4-tuples)."""
+    BENCHMARKS.append(func)
+    return func
+
+
+def measure(setup, run, items, repeat):
+    """
+    Return a dict of timings of `run(setup())`, repeated `repeat` times.
+
+    `setup` is called (outside of the timing) before every repetition so
+    each one starts from the same state.
+    """
+    timings = []
+    for i in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        run(arg)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {
+        'items': items,
+        'repeat': repeat,
+        'best': best,
+        'mean': sum(timings) / repeat,
+        'items_per_second': items / best,
+    }
+
+
+def media_path(*parts):
+    from django.conf import settings
+
+    return os.path.join(settings.MEDIA_ROOT, *parts)
+
+
+def clear_renditions():
+    """Delete every sized & filtered image and clear the cache."""
+    from versatileimagefield.settings import (
+        cache,
+        VERSATILEIMAGEFIELD_FILTERED_DIRNAME,
+        VERSATILEIMAGEFIELD_SIZED_DIRNAME,
+    )
+
+    for dirname in (
+        VERSATILEIMAGEFIELD_SIZED_DIRNAME, VERSATILEIMAGEFIELD_FILTERED_DIRNAME
+    ):
+        shutil.rmtree(media_path(dirname), ignore_errors=True)
+    cache.clear()
+
+
+def create_instances(count, image_format='JPEG', prefix='bench'):
+    """Return `count` saved instances, each with its own copy of an image."""
+    from tests.models import VersatileImageTestModel
+
+    os.makedirs(media_path(prefix), exist_ok=True)
+    ext = IMAGES[image_format].rsplit('.', 1)[-1]
+    instances = []
+    for i in range(count):
+        name = '{}/image-{}.{}'.format(prefix, i, ext)
+        shutil.copyfile(media_path(IMAGES[image_format]), media_path(name))
+        instances.append(VersatileImageTestModel.objects.create(
+            img_type='{}{}'.format(prefix[:1], i),
+            image=name,
+            ppoi='0.5x0.5'
+        ))
+    return instances
+
+
+@benchmark
+def rendition_creation(options):
+    """Decode/resize/encode/save a rendition of each format."""
+    from django.core.files.storage import default_storage
+    from versatileimagefield.versatileimagefield import (
+        CroppedImage,
+        InvertImage,
+        ThumbnailImage,
+    )
+
+    for image_format, name in sorted(IMAGES.items()):
+        for sizer_name, sizer_cls in (
+            ('crop', CroppedImage), ('thumbnail', ThumbnailImage)
+        ):
+            sizer = sizer_cls(name, default_storage, False, ppoi=(0.5, 0.5))
+
+            def run(arg, sizer=sizer, name=name):
+                for i in range(options.number):
+                    sizer.create_resized_image(
+                        name, '__sized__/bench-' + name, 100, 100
+                    )
+
+            yield (
+                'sizers.{}.{}'.format(sizer_name, image_format.lower()),
+                lambda: None, run, options.number
+            )
+
+        invert = InvertImage(name, default_storage, False, 'invert')
+
+        def run(arg, invert=invert, name=name):
+            for i in range(options.number):
+                invert.create_filtered_image(
+                    name, '__filtered__/bench-' + name
+                )
+
+        yield (
+            'filters.invert.{}'.format(image_format.lower()),
+            lambda: None, run, options.number
+        )
+
+
+@benchmark
+def descriptor_access(options):
+    """Access fields & rendition URLs on freshly loaded instances."""
+    from tests.models import VersatileImageTestModel
+    from versatileimagefield.image_warmer import VersatileImageFieldWarmer
+
+    instances = create_instances(options.objects, prefix='descriptor')
+    queryset = VersatileImageTestModel.objects.filter(
+        pk__in=[instance.pk for instance in instances]
+    )
+    VersatileImageFieldWarmer(queryset, 'test_set', 'image').warm()
+
+    def load():
+        return list(queryset)
+
+    def field_file(instances):
+        for instance in instances:
+            instance.image
+
+    def sized_url(instances):
+        for instance in instances:
+            instance.image.create_on_demand = True
+            instance.image.crop['100x100'].url
+
+    def filtered_sized_url(instances):
+        for instance in instances:
+            instance.image.create_on_demand = True
+            instance.image.filters.invert.thumbnail['100x100'].url
+
+    def sized_url_off_demand(instances):
+        for instance in instances:
+            instance.image.crop['100x100'].url
+
+    for name, run in (
+        ('descriptor.field_file', field_file),
+        ('descriptor.sized_url', sized_url),
+        ('descriptor.filtered_sized_url', filtered_sized_url),
+        ('descriptor.sized_url_off_demand', sized_url_off_demand),
+    ):
+        yield name, load, run, len(instances)
+
+
+@benchmark
+def serializer_url_sets(options):
+    """Serialize the 'test_set' URL set of N objects."""
+    from tests.models import VersatileImageTestModel
+    from tests.serializers import VersatileImageTestModelSerializer
+
+    instances = create_instances(options.objects, prefix='serializer')
+    queryset = VersatileImageTestModel.objects.filter(
+        pk__in=[instance.pk for instance in instances]
+    )
+
+    def load():
+        return list(queryset)
+
+    def run(instances):
+        VersatileImageTestModelSerializer(instances, many=True).data
+
+    yield 'serializer.url_sets', load, run, len(instances)
+
+
+@benchmark
+def warmer(options):
+    """Warm the 'test_set' renditions of N images."""
+    from tests.models import VersatileImageTestModel
+    from versatileimagefield.image_warmer import VersatileImageFieldWarmer
+
+    instances = create_instances(options.warm_objects, prefix='warmer')
+    queryset = VersatileImageTestModel.objects.filter(
+        pk__in=[instance.pk for instance in instances]
+    )
+
+    def run(arg):
+        VersatileImageFieldWarmer(queryset, 'test_set', 'image').warm()
+
+    # Images per second (each image has 5 renditions in 'test_set').
+    yield 'warmer.test_set', clear_renditions, run, len(instances)
+
+
+def get_metadata():
+    """Return the environment the benchmarks ran in."""
+    import PIL
+
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR,
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'pillow': PIL.__version__,
+        'platform': platform.platform(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument(
+        '--filter', default=None,
+        help="Only run benchmarks whose names contain this string."
+    )
+    parser.add_argument(
+        '--json', default=None,
+        help="Write the results (as JSON) to this path."
+    )
+    parser.add_argument(
+        '--compare', default=None,
+        help="A JSON file written by --json to compare the results with."
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help="How many times to repeat each benchmark (the best is reported)."
+    )
+    parser.add_argument(
+        '--number', type=int, default=10,
+        help="How many renditions each sizers.*/filters.* repetition creates."
+    )
+    parser.add_argument(
+        '--objects', type=int, default=100,
+        help="How many objects descriptor.*/serializer.* benchmarks use."
+    )
+    parser.add_argument(
+        '--warm-objects', type=int, default=20,
+        help="How many images warmer.* benchmarks warm."
+    )
+    parser.add_argument(
+        '--quick', action='store_true',
+        help="Run fewer repetitions on fewer objects (for smoke testing)."
+    )
+    options = parser.parse_args()
+    if options.quick:
+        options.repeat, options.number = 1, 1
+        options.objects, options.warm_objects = 5, 2
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    django.setup()
+    from django.conf import settings
+    from django.core.management import call_command
+
+    baseline = {}
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = {
+                result['name']: result for result in json.load(f)['benchmarks']
+            }
+
+    results = []
+    try:
+        shutil.copytree(
+            os.path.join(REPO_DIR, 'tests', 'media'), settings.MEDIA_ROOT,
+            dirs_exist_ok=True,
+            ignore=shutil.ignore_patterns('__sized__', '__filtered__')
+        )
+        call_command('migrate', run_syncdb=True, verbosity=0)
+        print('{:<36} {:>14} {:>12}{}'.format(
+            'benchmark', 'items/s', 'best (s)', '  vs baseline' if baseline else ''
+        ))
+        for func in BENCHMARKS:
+            for name, setup, run, items in func(options):
+                if options.filter and options.filter not in name:
+                    continue
+                result = dict(name=name, **measure(
+                    setup, run, items, options.repeat
+                ))
+                results.append(result)
+                comparison = ''
+                if name in baseline:
+                    ratio = result['items_per_second'] / baseline[name]['items_per_second']
+                    comparison = '  {:>+10.1%}'.format(ratio - 1)
+                print('{:<36} {:>14.1f} {:>12.6f}{}'.format(
+                    name, result['items_per_second'], result['best'], comparison
+                ))
+    finally:
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    if options.json:
+        with open(options.json, 'w') as f:
+            json.dump(
+                {'metadata': get_metadata(), 'benchmarks': results},
+                f, indent=2, sort_keys=True
+            )
+
+
+if __name__ == '__main__':
+    main()
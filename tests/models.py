@@ -44,6 +44,16 @@ class VersatileImageTestModel(models.Model):
     ppoi = PPOIField()
 
 
+class VersatileImageTestRelatedModel(models.Model):
+    """A model for testing VersatileImageFields on related models."""
+
+    test_model = models.ForeignKey(
+        VersatileImageTestModel,
+        on_delete=models.CASCADE
+    )
+    created = models.DateTimeField(auto_now_add=True)
+
+
 class VersatileImageTestUploadDirectoryModel(models.Model):
     image = VersatileImageField(upload_to='./foo/')
 
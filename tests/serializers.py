@@ -1,6 +1,9 @@
 from rest_framework.serializers import ModelSerializer
 
-from versatileimagefield.serializers import VersatileImageFieldSerializer
+from versatileimagefield.serializers import (
+    VersatileImageFieldSerializer,
+    VersatileImageListSerializer
+)
 
 from .models import VersatileImageTestModel
 
@@ -23,3 +26,4 @@ class VersatileImageTestModelSerializer(ModelSerializer):
             'optional_image_2',
             'optional_image_3'
         )
+        list_serializer_class = VersatileImageListSerializer
@@ -1,16 +1,24 @@
 """versatileimagefield tests."""
 from __future__ import division, unicode_literals
 
+import asyncio
 from functools import reduce
+import hashlib
+from io import BytesIO, StringIO
+import json
 import math
 import operator
 import os
+import re
 from shutil import rmtree
-from unittest import skipIf
+from tempfile import SpooledTemporaryFile, TemporaryDirectory
+import time
+from unittest import mock, skipIf
 
 import django
 from testfixtures import compare
 
+from asgiref.sync import async_to_sync
 from django import VERSION as DJANGO_VERSION
 from django.conf import settings
 from django.contrib.auth.models import User
@@ -18,44 +26,86 @@ from django.core import serializers
 from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models.query import QuerySet
 from django.template.loader import get_template
-from django.test import TestCase
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
 from django.test.utils import override_settings
 import pickle
 
-from PIL import Image
+from PIL import Image, ImageOps
 from rest_framework.test import APIRequestFactory
 
-from versatileimagefield.datastructures.base import ProcessedImage
+from versatileimagefield.datastructures.base import ProcessedImage, RenditionFile
 from versatileimagefield.datastructures.filteredimage import InvalidFilter
+from versatileimagefield.datastructures.mixins import RenditionCacheMixIn
 from versatileimagefield.datastructures.sizedimage import MalformedSizedImageKey, SizedImage
 from versatileimagefield.datastructures.filteredimage import FilteredImage
-from versatileimagefield.image_warmer import VersatileImageFieldWarmer
+from versatileimagefield.engine import RenditionEngine
+from versatileimagefield.locks import RenditionLock
+from versatileimagefield.storage_urls import build_url, StorageURLCache
+from versatileimagefield.tasks import BaseRenditionBackend, RenditionJob, ThreadPoolBackend
+from versatileimagefield import manifest as manifest_module
+from versatileimagefield.manifest import RenditionManifest
+from versatileimagefield.instrumentation import (
+    format_rendition_stats,
+    RenditionStatsCollector,
+    STAGES,
+    summarize_rendition_stats
+)
+from versatileimagefield.middleware import RenditionStatsMiddleware
+from versatileimagefield.image_warmer import (
+    CacheCheckpoint,
+    FileCheckpoint,
+    VersatileImageFieldWarmer
+)
 from versatileimagefield.registry import (
     autodiscover, versatileimagefield_registry, AlreadyRegistered, InvalidSizedImageSubclass,
     InvalidFilteredImageSubclass, NotRegistered, UnallowedSizerName, UnallowedFilterName
 )
+from versatileimagefield.signals import rendition_stage_finished, rendition_stage_started
 from versatileimagefield.settings import (
     JPEG_QUAL,
+    RESAMPLING_STRATEGY_REDUCING_GAPS,
     VERSATILEIMAGEFIELD_SIZED_DIRNAME,
     VERSATILEIMAGEFIELD_FILTERED_DIRNAME,
     VERSATILEIMAGEFIELD_PLACEHOLDER_DIRNAME,
     WEBP_QUAL
 )
+from versatileimagefield import settings as versatileimagefield_settings
 from versatileimagefield.utils import (
+    build_versatileimagefield_url_set,
+    build_versatileimagefield_url_set_async,
+    clear_path_cache,
+    compile_rendition_key_set,
     get_filtered_filename,
+    get_filtered_path,
+    get_path_cache_info,
     get_rendition_key_set,
+    get_rendition_plans,
+    get_rendition_urls,
     get_resized_filename,
+    get_resized_path,
+    get_url_from_image_key,
     InvalidSizeKey,
-    InvalidSizeKeySet
+    InvalidSizeKeySet,
+    parse_image_key,
+    prefetch_renditions,
+    RenditionPlan
 )
 from versatileimagefield.validators import validate_ppoi_tuple
-from versatileimagefield.versatileimagefield import CroppedImage, InvertImage
+from versatileimagefield.versatileimagefield import (
+    CroppedImage, get_resize_kwargs, InvertImage, ThumbnailImage
+)
 
 from .forms import VersatileImageTestModelForm, VersatileImageWidgetTestModelForm
 from .models import (
     VersatileImageTestModel,
+    VersatileImageTestRelatedModel,
     VersatileImageTestUploadDirectoryModel,
     VersatileImageWidgetTestModel,
     MaybeVersatileImageModel
@@ -186,6 +236,21 @@ class VersatileImageFieldTestCase(VersatileImageFieldBaseTestCase):
         )
         self.assertEqual(rms, 0.0)
 
+    def get_on_demand_jpg(self):
+        """Return a fresh jpg instance that creates renditions on demand."""
+        jpg = VersatileImageTestModel.objects.get(img_type='jpg')
+        jpg.image.create_on_demand = True
+        return jpg
+
+    def get_jpg_renditions(self):
+        """Return a crop, a filtered & a filtered crop rendition of the jpg."""
+        image = self.get_on_demand_jpg().image
+        return [
+            image.crop['100x100'],
+            image.filters.invert,
+            image.filters.invert.crop['50x50'],
+        ]
+
     def test_field_can_be_null(self):
         obj = MaybeVersatileImageModel(pk=34, name='foo')
         obj.save()
@@ -329,6 +394,23 @@ class VersatileImageFieldTestCase(VersatileImageFieldBaseTestCase):
         with self.assertRaises(ValueError):
             self.jpg.image.create_on_demand = 'pickle'
 
+    def test_filters_and_sizers_built_lazily(self):
+        """Ensure sizers & filters are only rebuilt when their inputs change."""
+        jpg = VersatileImageTestModel.objects.get(img_type='jpg')
+        image = jpg.image
+        self.assertNotIn('crop', image.__dict__)
+        self.assertNotIn('filters', image.__dict__)
+        crop = image.crop
+        filters = image.filters
+        self.assertIs(jpg.image.crop, crop)
+        self.assertIs(jpg.image.filters, filters)
+        jpg.image.ppoi = (0.75, 0.75)
+        self.assertIsNot(jpg.image.crop, crop)
+        self.assertEqual(jpg.image.crop.ppoi, (0.75, 0.75))
+        self.assertIsNot(jpg.image.filters, filters)
+        with self.assertRaises(AttributeError):
+            jpg.image.not_a_sizer
+
     def test_create_on_demand_functionality(self):
         """Ensure create_on_demand functionality works as advertised."""
         self.assertImageDeleted(self.jpg.image)
@@ -343,6 +425,29 @@ class VersatileImageFieldTestCase(VersatileImageFieldBaseTestCase):
         field_instance.delete_sized_images()
         self.assertFalse(field_instance.field.storage.exists(path))
 
+    def test_delete_measure(self):
+        """Ensure the delete_* methods only measure files when asked to."""
+        o = VersatileImageTestUploadDirectoryModel.objects.create(image="foo/python-logo.jpg")
+        field_instance = o.image
+        field_instance.create_on_demand = True
+        storage = field_instance.field.storage
+        path = field_instance.crop['100x100'].name
+        with mock.patch.object(
+            storage, 'size', wraps=storage.size
+        ) as size:
+            self.assertEqual(field_instance.delete_sized_images(), [path])
+        size.assert_not_called()
+        path = field_instance.crop['100x100'].name
+        num_bytes = storage.size(path)
+        self.assertEqual(
+            field_instance.delete_all_created_images(measure=True),
+            ([path], num_bytes)
+        )
+        # Nothing is carried over from previous calls.
+        self.assertEqual(
+            field_instance.delete_all_created_images(measure=True), ([], 0)
+        )
+
     def test_image_warmer(self):
         """Ensure VersatileImageFieldWarmer works as advertised."""
         jpg_warmer = VersatileImageFieldWarmer(
@@ -383,6 +488,828 @@ class VersatileImageFieldTestCase(VersatileImageFieldBaseTestCase):
             )
             del invalid_warmer
 
+    def test_image_warmer_streaming(self):
+        """Ensure VersatileImageFieldWarmer streams only the columns it needs."""
+        rendition_key_set = (
+            ('test_thumb', 'thumbnail__100x100'),
+            ('test_crop', 'crop__100x100'),
+        )
+        warmer = VersatileImageFieldWarmer(
+            instance_or_queryset=VersatileImageTestModel.objects.filter(
+                img_type__in=['jpg', 'png', 'gif']
+            ),
+            rendition_key_set=rendition_key_set,
+            image_attr='image',
+            verbose=True,
+            chunk_size=2,
+            total=1
+        )
+        self.assertEqual(
+            warmer.get_queryset().query.deferred_loading,
+            ({'image', 'ppoi', 'width', 'height'}, False)
+        )
+        with mock.patch.object(QuerySet, 'count') as count:
+            num_created, failed_to_create = warmer.warm()
+        count.assert_not_called()
+        self.assertEqual(num_created, 6)
+        self.assertEqual(failed_to_create, [])
+
+        VersatileImageTestRelatedModel.objects.create(test_model=self.jpg)
+        related_warmer = VersatileImageFieldWarmer(
+            instance_or_queryset=VersatileImageTestRelatedModel.objects.all(),
+            rendition_key_set=rendition_key_set,
+            image_attr='test_model.image'
+        )
+        queryset = related_warmer.get_queryset()
+        self.assertEqual(queryset.query.select_related, {'test_model': {}})
+        self.assertEqual(
+            queryset.query.deferred_loading,
+            (
+                {
+                    'test_model__image',
+                    'test_model__ppoi',
+                    'test_model__width',
+                    'test_model__height'
+                },
+                False
+            )
+        )
+        with self.assertNumQueries(1):
+            work_unit = related_warmer.get_work_unit(next(related_warmer.iterator()))
+        self.assertEqual(
+            work_unit,
+            (
+                'tests.VersatileImageTestModel',
+                'image',
+                'python-logo.jpg',
+                (0.25, 0.25),
+                related_warmer.size_key_list
+            )
+        )
+        num_created, failed_to_create = related_warmer.warm()
+        self.assertEqual(num_created, 2)
+
+    def test_image_warmer_checkpoint(self):
+        """Ensure interrupted VersatileImageFieldWarmer runs can be resumed."""
+        queryset = VersatileImageTestModel.objects.filter(
+            img_type__in=['jpg', 'png', 'gif']
+        )
+        first_pk, second_pk, third_pk = queryset.order_by('pk').values_list(
+            'pk', flat=True
+        )
+        prewarm = VersatileImageFieldWarmer._prewarm_versatileimagefield
+
+        def interrupt_second(warmer, size_key_list, versatileimagefieldfile):
+            if versatileimagefieldfile.instance.pk == second_pk:
+                raise RuntimeError('Interrupted')
+            return prewarm(warmer, size_key_list, versatileimagefieldfile)
+
+        with TemporaryDirectory() as tmp_dir:
+            checkpoint = FileCheckpoint(os.path.join(tmp_dir, 'warm.json'))
+            for resume, expected_pks in (
+                (True, [second_pk, third_pk]),
+                (False, [first_pk, second_pk, third_pk]),
+            ):
+                warmer = VersatileImageFieldWarmer(
+                    instance_or_queryset=queryset,
+                    rendition_key_set='test_set',
+                    image_attr='image',
+                    checkpoint=checkpoint,
+                    checkpoint_every=1
+                )
+                with mock.patch.object(
+                    VersatileImageFieldWarmer,
+                    '_prewarm_versatileimagefield',
+                    side_effect=interrupt_second,
+                    autospec=True
+                ):
+                    with self.assertRaises(RuntimeError):
+                        warmer.warm()
+                self.assertEqual(checkpoint.load()['last_pk'], first_pk)
+
+                warmer = VersatileImageFieldWarmer(
+                    instance_or_queryset=queryset,
+                    rendition_key_set='test_set',
+                    image_attr='image',
+                    checkpoint=checkpoint,
+                    resume=resume
+                )
+                with mock.patch.object(
+                    VersatileImageFieldWarmer,
+                    '_prewarm_versatileimagefield',
+                    side_effect=prewarm,
+                    autospec=True
+                ) as prewarm_mock:
+                    num_created, failed_to_create = warmer.warm()
+                self.assertEqual(
+                    [
+                        call[0][2].instance.pk
+                        for call in prewarm_mock.call_args_list
+                    ],
+                    expected_pks
+                )
+                self.assertEqual(num_created, 5 * len(expected_pks))
+                self.assertIsNone(checkpoint.load())
+
+        # Checkpoints from a different warming job aren't resumed from.
+        checkpoint = CacheCheckpoint('test_image_warmer_checkpoint')
+        checkpoint.save({'job': [], 'last_pk': third_pk, 'failed': []})
+        warmer = VersatileImageFieldWarmer(
+            instance_or_queryset=queryset,
+            rendition_key_set='test_set',
+            image_attr='image',
+            checkpoint=checkpoint
+        )
+        self.assertEqual(warmer.load_checkpoint(), (None, 0, []))
+        self.assertEqual(warmer.warm()[0], 15)
+        self.assertIsNone(checkpoint.load())
+
+        # Ordered querysets keep their ordering and are resumed after the
+        # instances already warmed.
+        ordered_queryset = queryset.order_by('-pk')
+        with TemporaryDirectory() as tmp_dir:
+            checkpoint = FileCheckpoint(os.path.join(tmp_dir, 'warm.json'))
+            warmer = VersatileImageFieldWarmer(
+                instance_or_queryset=ordered_queryset,
+                rendition_key_set='test_set',
+                image_attr='image',
+                checkpoint=checkpoint,
+                checkpoint_every=1
+            )
+            with mock.patch.object(
+                VersatileImageFieldWarmer,
+                '_prewarm_versatileimagefield',
+                side_effect=interrupt_second,
+                autospec=True
+            ):
+                with self.assertRaises(RuntimeError):
+                    warmer.warm()
+            state = checkpoint.load()
+            self.assertEqual(state['last_pk'], third_pk)
+            self.assertEqual(state['warmed'], 1)
+
+            warmer = VersatileImageFieldWarmer(
+                instance_or_queryset=ordered_queryset,
+                rendition_key_set='test_set',
+                image_attr='image',
+                checkpoint=checkpoint,
+                checkpoint_every=1
+            )
+            with mock.patch.object(
+                VersatileImageFieldWarmer,
+                '_prewarm_versatileimagefield',
+                side_effect=prewarm,
+                autospec=True
+            ) as prewarm_mock:
+                num_created, failed_to_create = warmer.warm()
+            self.assertEqual(
+                [
+                    call[0][2].instance.pk
+                    for call in prewarm_mock.call_args_list
+                ],
+                [second_pk, first_pk]
+            )
+            self.assertEqual(num_created, 10)
+            self.assertIsNone(checkpoint.load())
+
+        # Sliced querysets can't be resumed.
+        with self.assertRaises(ValueError):
+            VersatileImageFieldWarmer(
+                instance_or_queryset=queryset.order_by('pk')[:2],
+                rendition_key_set='test_set',
+                image_attr='image',
+                checkpoint=checkpoint
+            )
+
+    def test_versatileimagefield_warm_command(self):
+        """Ensure the versatileimagefield_warm management command works."""
+        purge_output = (
+            r'^Deleted (\d+) image\(s\) in [\d.]+s '
+            r'\([\d.]+ images/sec, (\d+) bytes deleted\)\.\n$'
+        )
+        stdout = StringIO()
+        call_command(
+            'versatileimagefield_purge',
+            'tests.VersatileImageTestModel',
+            'image',
+            stdout=stdout
+        )
+        self.assertRegex(stdout.getvalue(), purge_output)
+        storage = self.jpg.image.field.storage
+        crop_path = self.jpg.image.crop['100x100'].name
+        self.assertFalse(storage.exists(crop_path))
+
+        stdout = StringIO()
+        call_command(
+            'versatileimagefield_warm',
+            'tests.VersatileImageTestModel',
+            'image',
+            '--set=test_set',
+            '--resume',
+            '--workers=2',
+            '--executor=thread',
+            '--batch-size=2',
+            stdout=stdout
+        )
+        num_warmed, bytes_written = re.match(
+            r'^Warmed (\d+) image\(s\) in [\d.]+s '
+            r'\([\d.]+ images/sec, (\d+) bytes written\)\.\n$',
+            stdout.getvalue()
+        ).groups()
+        self.assertEqual(
+            int(num_warmed), 5 * VersatileImageTestModel.objects.count()
+        )
+        self.assertGreater(int(bytes_written), 0)
+        self.assertTrue(storage.exists(crop_path))
+        self.assertIsNone(
+            cache.get(
+                'versatileimagefield_warm:' + hashlib.md5(
+                    b'tests.VersatileImageTestModel:image:test_set:'
+                ).hexdigest()
+            )
+        )
+
+        stdout = StringIO()
+        call_command(
+            'versatileimagefield_purge',
+            'tests.VersatileImageTestModel',
+            'image',
+            stdout=stdout
+        )
+        num_deleted, bytes_deleted = re.match(
+            purge_output, stdout.getvalue()
+        ).groups()
+        self.assertEqual(int(num_deleted), int(num_warmed))
+        self.assertEqual(int(bytes_deleted), int(bytes_written))
+        self.assertFalse(storage.exists(crop_path))
+
+        VersatileImageTestRelatedModel.objects.create(test_model=self.jpg)
+        for since, expected in (('2000-01-01', 5), ('2999-01-01 12:00', 0)):
+            stdout = StringIO()
+            call_command(
+                'versatileimagefield_warm',
+                'tests.VersatileImageTestRelatedModel',
+                'test_model.image',
+                '--set=test_set',
+                '--since={}'.format(since),
+                '--since-field=created',
+                stdout=stdout
+            )
+            self.assertTrue(
+                stdout.getvalue().startswith(
+                    'Warmed {} image(s)'.format(expected)
+                )
+            )
+
+        for args in (
+            ('tests.Invalid', 'image', '--set=test_set'),
+            ('tests.VersatileImageTestModel', 'image', '--set=invalid'),
+            (
+                'tests.VersatileImageTestModel', 'image', '--set=test_set',
+                '--since=2000-01-01'
+            ),
+            (
+                'tests.VersatileImageTestRelatedModel', 'test_model.image',
+                '--set=test_set', '--since=invalid', '--since-field=created'
+            ),
+        ):
+            with self.assertRaises(CommandError):
+                call_command('versatileimagefield_warm', *args)
+
+    def test_parallel_image_warmer(self):
+        """Ensure VersatileImageFieldWarmer can warm images in parallel."""
+        rendition_key_set = (
+            ('test_thumb', 'thumbnail__100x100'),
+            ('test_crop', 'crop__100x100'),
+            ('test_invert', 'filters__invert__url'),
+            ('test_invert_crop', 'filters__invert__crop__50x50'),
+        )
+        queryset = VersatileImageTestModel.objects.filter(
+            img_type__in=['jpg', 'png', 'gif']
+        )
+        for executor in ('thread', 'process'):
+            self.jpg.image.delete_all_created_images()
+            self.png.image.delete_all_created_images()
+            self.gif.image.delete_all_created_images()
+            cache.clear()
+            warmer = VersatileImageFieldWarmer(
+                instance_or_queryset=queryset,
+                rendition_key_set=rendition_key_set,
+                image_attr='image',
+                verbose=True,
+                workers=2,
+                executor=executor,
+                checkpoint=CacheCheckpoint('test_parallel_image_warmer'),
+                checkpoint_every=1
+            )
+            with mock.patch.object(
+                CacheCheckpoint, 'save', autospec=True
+            ) as save:
+                num_created, failed_to_create = warmer.warm()
+            # Checkpoints only advance past instances once every instance
+            # before them (in primary key order) has been warmed.
+            saved_pks = [call[0][1]['last_pk'] for call in save.call_args_list]
+            self.assertEqual(saved_pks, sorted(saved_pks))
+            self.assertEqual(saved_pks[-1], queryset.order_by('pk').last().pk)
+            self.assertEqual(num_created, 12)
+            self.assertEqual(failed_to_create, [])
+            # Workers leave the cache to the warming process.
+            urls = get_rendition_urls(self.jpg.image, 'crop__100x100') + \
+                get_rendition_urls(self.jpg.image, 'filters__invert__crop__50x50')
+            self.assertEqual(len(cache.get_many(urls)), 3)
+            self.assertTrue(
+                self.jpg.image.field.storage.exists(
+                    self.jpg.image.crop['100x100'].name
+                )
+            )
+
+        with self.assertRaises(ValueError):
+            VersatileImageFieldWarmer(
+                instance_or_queryset=queryset,
+                rendition_key_set=rendition_key_set,
+                image_attr='image',
+                executor='invalid'
+            )
+
+    @mock.patch('versatileimagefield.manifest.VERSATILEIMAGEFIELD_USE_RENDITION_MANIFEST', True)
+    def test_rendition_manifest(self):
+        """Ensure the rendition manifest replaces storage.exists calls."""
+        self.jpg.image.delete_all_created_images()
+        manifest = RenditionManifest(self.jpg.image.name)
+        self.assertEqual(manifest.paths, set())
+
+        renditions = self.get_jpg_renditions()
+        paths = set(rendition.name for rendition in renditions)
+        self.assertEqual(RenditionManifest(self.jpg.image.name).paths, paths)
+        # With the cache entries of the renditions gone, one cache lookup
+        # (of the manifest) replaces a storage.exists call per rendition.
+        cache.delete_many([rendition.url for rendition in renditions])
+        storage_cls = self.jpg.image.field.storage.__class__
+        with mock.patch.object(storage_cls, 'exists') as exists:
+            self.get_jpg_renditions()
+        exists.assert_not_called()
+
+        # Deleting renditions removes them from the manifest.
+        crop = self.get_jpg_renditions()[0]
+        crop.delete()
+        self.assertEqual(
+            RenditionManifest(self.jpg.image.name).paths,
+            paths - {crop.name}
+        )
+        jpg = self.get_on_demand_jpg()
+        jpg.image.filters.invert.url
+        jpg.image.delete_all_created_images()
+        self.assertEqual(RenditionManifest(self.jpg.image.name).paths, set())
+        # The manifest shared by the file's sizers & filters is updated too.
+        self.assertEqual(
+            jpg.image.get_rendition_manifest(jpg.image.name).paths, set()
+        )
+
+        # Renditions created by RenditionEngine are recorded too.
+        jpg.image.delete_all_created_images()
+        RenditionEngine.from_field_file(jpg.image).create_renditions(
+            ['crop__100x100', 'filters__invert__crop__50x50']
+        )
+        self.assertEqual(RenditionManifest(self.jpg.image.name).paths, paths)
+        jpg.image.delete_all_created_images()
+        VersatileImageFieldWarmer(
+            instance_or_queryset=self.jpg,
+            rendition_key_set=(
+                ('crop', 'crop__100x100'),
+                ('invert_crop', 'filters__invert__crop__50x50'),
+            ),
+            image_attr='image',
+            workers=2,
+            executor='thread'
+        ).warm()
+        self.assertEqual(RenditionManifest(self.jpg.image.name).paths, paths)
+
+        # A rendition discarded while another process is adding to the
+        # manifest (having read it before the discard) isn't written back.
+        crop_path = self.get_jpg_renditions()[0].name
+        manifest_cache = manifest_module.cache
+        get = manifest_cache.get
+        discarded = []
+
+        def get_then_discard(key, *args, **kwargs):
+            entry = get(key, *args, **kwargs)
+            if not discarded:
+                discarded.append(crop_path)
+                RenditionManifest(self.jpg.image.name).discard(discarded)
+            return entry
+
+        with mock.patch.object(manifest_cache, 'get', side_effect=get_then_discard):
+            RenditionManifest(self.jpg.image.name).add('foo.jpg')
+        self.assertEqual(
+            RenditionManifest(self.jpg.image.name).paths,
+            (paths - {crop_path}) | {'foo.jpg'}
+        )
+        jpg.image.delete_all_created_images()
+
+    def test_rendition_lock(self):
+        """Ensure concurrent requests for a rendition only create it once."""
+        storage = self.jpg.image.field.storage
+        crop = self.jpg.image.crop['120x120']
+        storage.delete(crop.name)
+        cache.delete(crop.url)
+
+        # Another process is creating the rendition but doesn't finish in
+        # time: its URL is returned without creating (or caching) it.
+        lock = RenditionLock(crop.name)
+        self.assertTrue(lock.acquire())
+        with mock.patch(
+            'versatileimagefield.locks.VERSATILEIMAGEFIELD_RENDITION_LOCK_WAIT',
+            0.1
+        ):
+            self.assertEqual(self.get_on_demand_jpg().image.crop['120x120'].url, crop.url)
+        self.assertFalse(storage.exists(crop.name))
+        self.assertIsNone(cache.get(crop.url))
+
+        # Another process finishes creating the rendition while waiting.
+        create_resized_image = CroppedImage.create_resized_image
+
+        def other_process_finishes(seconds):
+            create_resized_image(
+                self.jpg.image.crop,
+                path_to_image=self.jpg.image.name,
+                save_path_on_storage=crop.name,
+                width=120,
+                height=120
+            )
+            lock.release()
+
+        with mock.patch(
+            'versatileimagefield.locks.time.sleep',
+            side_effect=other_process_finishes
+        ) as sleep, mock.patch.object(
+            CroppedImage, 'create_resized_image'
+        ) as create:
+            self.assertEqual(self.get_on_demand_jpg().image.crop['120x120'].url, crop.url)
+        self.assertEqual(sleep.call_count, 1)
+        create.assert_not_called()
+        self.assertTrue(storage.exists(crop.name))
+        self.assertEqual(cache.get(crop.url), 1)
+        self.assertIsNone(cache.get(lock.key))
+
+        # A lock that expired (and was acquired by another process) before
+        # it's released is left to its new holder.
+        lock = RenditionLock(crop.name)
+        self.assertTrue(lock.acquire())
+        cache.delete(lock.key)
+        other_lock = RenditionLock(crop.name, wait=0)
+        self.assertTrue(other_lock.acquire())
+        lock.release()
+        self.assertEqual(cache.get(lock.key), other_lock.token)
+        self.assertFalse(RenditionLock(crop.name, wait=0).acquire())
+        # Jobs only release the lock taken when they were enqueued.
+        with self.assertLogs('versatileimagefield.tasks', 'ERROR'):
+            RenditionJob(
+                'foo', {}, None, crop.name, crop.url, lock_token=lock.token
+            ).run()
+        self.assertEqual(cache.get(lock.key), other_lock.token)
+        RenditionLock(crop.name, token=other_lock.token).release()
+        self.assertIsNone(cache.get(lock.key))
+
+        # Locking can be disabled.
+        lock = RenditionLock(crop.name, timeout=0)
+        self.assertTrue(lock.acquire())
+        self.assertIsNone(cache.get(lock.key))
+
+    @mock.patch(
+        'versatileimagefield.datastructures.mixins.VERSATILEIMAGEFIELD_CREATE_IMAGES_ASYNCHRONOUSLY',
+        True
+    )
+    def test_asynchronous_rendition_creation(self):
+        """Ensure renditions can be created by a task backend."""
+        storage = self.jpg.image.field.storage
+        self.jpg.image.delete_all_created_images()
+
+        class DroppingBackend(BaseRenditionBackend):
+            def submit(self, get_job):
+                return False
+
+        # Jobs dropped by the backend aren't built and don't hold a lock.
+        storage_cls = storage.__class__
+        with mock.patch(
+            'versatileimagefield.datastructures.mixins.get_rendition_backend',
+            return_value=DroppingBackend()
+        ), mock.patch.object(storage_cls, 'deconstruct') as deconstruct:
+            renditions = self.get_jpg_renditions()
+        deconstruct.assert_not_called()
+        for rendition in renditions:
+            self.assertIsNone(cache.get(RenditionLock(rendition.name).key))
+
+        backend = BaseRenditionBackend()
+        backend.enqueue = mock.Mock()
+        with mock.patch(
+            'versatileimagefield.datastructures.mixins.get_rendition_backend',
+            return_value=backend
+        ):
+            renditions = self.get_jpg_renditions()
+            # Renditions being created aren't enqueued again.
+            self.assertEqual(
+                [rendition.url for rendition in self.get_jpg_renditions()],
+                [rendition.url for rendition in renditions]
+            )
+        self.assertEqual(backend.enqueue.call_count, 3)
+        jobs = [call[0][0] for call in backend.enqueue.call_args_list]
+        for rendition in renditions:
+            self.assertFalse(storage.exists(rendition.name))
+            self.assertIsNone(cache.get(rendition.url))
+
+        # Jobs can be pickled or serialized to JSON.
+        jobs[0] = pickle.loads(pickle.dumps(jobs[0]))
+        jobs[1] = RenditionJob.from_dict(
+            json.loads(json.dumps(jobs[1].to_dict()))
+        )
+        self.assertEqual(jobs[2].source.save_path, renditions[1].name)
+        # Sized renditions of filtered images create the filtered image
+        # first if need be.
+        for job in reversed(jobs):
+            job.run()
+        for rendition in renditions:
+            self.assertTrue(storage.exists(rendition.name))
+            self.assertEqual(cache.get(rendition.url), 1)
+            self.assertIsNone(cache.get(RenditionLock(rendition.name).key))
+        self.assertEqual(
+            [rendition.url for rendition in self.get_jpg_renditions()],
+            [rendition.url for rendition in renditions]
+        )
+
+        job = mock.Mock()
+        backend = ThreadPoolBackend()
+        self.assertEqual(backend.executor._max_workers, 4)
+        backend.enqueue(job).result()
+        job.run.assert_called_once_with()
+        # Exceptions raised by jobs are logged.
+        job.run.side_effect = OSError
+        with self.assertLogs('versatileimagefield.tasks', 'ERROR'):
+            backend.enqueue(job)
+            # Waits for the job (and its done callback) to finish.
+            backend.shutdown()
+        # Jobs submitted after the backend is shut down are dropped.
+        get_job = mock.Mock()
+        self.assertFalse(backend.submit(get_job))
+        get_job.assert_not_called()
+        self.assertEqual(ThreadPoolBackend(max_workers=2).executor._max_workers, 2)
+
+    def test_async_rendition_api(self):
+        """Ensure renditions can be resolved from async code."""
+        storage = self.jpg.image.field.storage
+        self.jpg.image.delete_all_created_images()
+        jpg = self.get_on_demand_jpg()
+
+        async def get_renditions():
+            invert = await jpg.image.filters.aget('invert')
+            return await asyncio.gather(
+                jpg.image.crop.aget('100x100'),
+                jpg.image.thumbnail.aget('100x100'),
+                invert.crop.aget('50x50'),
+            )
+
+        # The test database can't be shared with the threads renditions are
+        # normally created in.
+        with mock.patch.object(
+            RenditionCacheMixIn, 'arun_thread_sensitive', True
+        ):
+            renditions = async_to_sync(get_renditions)()
+        for rendition in renditions:
+            self.assertTrue(storage.exists(rendition.name))
+            self.assertEqual(cache.get(rendition.url), 1)
+        self.assertEqual(
+            [rendition.url for rendition in renditions],
+            [
+                self.jpg.image.crop['100x100'].url,
+                self.jpg.image.thumbnail['100x100'].url,
+                self.jpg.image.filters.invert.crop['50x50'].url,
+            ]
+        )
+
+        warmer = VersatileImageFieldWarmer(
+            instance_or_queryset=jpg,
+            rendition_key_set='test_set',
+            image_attr='image'
+        )
+        self.assertEqual(
+            async_to_sync(warmer.awarm)(), (len(warmer.size_key_list), [])
+        )
+
+        # Cached renditions aren't looked for on storage.
+        jpg = self.get_on_demand_jpg()
+        size_set = get_rendition_key_set('test_set')
+        with mock.patch.object(
+            storage, 'exists', side_effect=AssertionError
+        ):
+            self.assertEqual(
+                async_to_sync(build_versatileimagefield_url_set_async)(
+                    jpg.image, size_set
+                ),
+                build_versatileimagefield_url_set(jpg.image, size_set)
+            )
+
+    def test_rendition_plans(self):
+        """Ensure Rendition Key Sets compile to RenditionPlan instances."""
+        self.assertEqual(
+            RenditionPlan.compile('invert_crop', 'filters__invert__crop__100x50'),
+            ('invert_crop', 'filters__invert__crop__100x50', 'invert', 'crop', 100, 50)
+        )
+        self.assertEqual(
+            RenditionPlan.compile('url', 'url'),
+            ('url', 'url', None, None, None, None)
+        )
+        plans = get_rendition_plans('test_set')
+        self.assertIs(get_rendition_plans('test_set'), plans)
+        self.assertEqual(
+            sorted(plans),
+            sorted(compile_rendition_key_set(get_rendition_key_set('test_set')))
+        )
+        with self.assertRaises(InvalidSizeKey):
+            compile_rendition_key_set([('test', 'thumbnail')])
+
+        size_set = get_rendition_key_set('test_set') + [
+            ('url', 'url'),
+            ('invert', 'filters__invert__url'),
+        ]
+        with mock.patch(
+            'versatileimagefield.datastructures.sizedimage.SizedImage.parse_size_key'
+        ) as parse_size_key:
+            urls = build_versatileimagefield_url_set(self.jpg.image, size_set)
+        self.assertFalse(parse_size_key.called)
+        for key, image_key in size_set:
+            self.assertEqual(
+                urls[key], get_url_from_image_key(self.jpg.image, image_key)
+            )
+
+        # Sizers that override `__getitem__` (or `aget`) are resolved
+        # through it, as they are in templates.
+        plan = RenditionPlan.compile('thumb', 'thumbnail__100x100')
+        getitem = SizedImage.__getitem__
+        aget = SizedImage.aget
+        with mock.patch.object(
+            ThumbnailImage, '__getitem__', autospec=True, side_effect=getitem
+        ) as custom_getitem, mock.patch.object(
+            ThumbnailImage, 'aget', autospec=True, side_effect=aget
+        ) as custom_aget:
+            self.assertEqual(plan.get_url(self.jpg.image), urls['test_thumb'])
+            self.assertEqual(
+                async_to_sync(plan.aget_url)(self.jpg.image), urls['test_thumb']
+            )
+        custom_getitem.assert_called_once_with(self.jpg.image.thumbnail, '100x100')
+        custom_aget.assert_called_once_with(self.jpg.image.thumbnail, '100x100')
+
+    def test_prefetch_renditions(self):
+        """Ensure prefetch_renditions replaces per-rendition cache lookups."""
+        self.assertEqual(
+            get_rendition_urls(self.jpg.image, 'filters__invert__crop__100x100'),
+            [
+                '/media/__filtered__/python-logo__invert__.jpg',
+                '/media/__sized__/__filtered__/python-logo__invert__-crop-c0-25__0-25-100x100-{}.jpg'.format(
+                    JPEG_QUAL
+                )
+            ]
+        )
+        self.assertEqual(get_rendition_urls(self.jpg.image, 'url'), [])
+        jpg = VersatileImageTestModel.objects.get(img_type='jpg')
+        png = VersatileImageTestModel.objects.get(img_type='png')
+        jpg.image.create_on_demand = True
+        png.image.create_on_demand = True
+        for obj in (jpg, png):
+            # Creating renditions consults the cache (for locks) so they're
+            # created first.
+            build_versatileimagefield_url_set(
+                obj.image,
+                get_rendition_key_set('test_set')
+            )
+        jpg.image.thumbnail['100x100']
+        with mock.patch.object(
+            versatileimagefield_settings.cache,
+            'get_many',
+            wraps=versatileimagefield_settings.cache.get_many
+        ) as get_many:
+            objs = prefetch_renditions([jpg, png], 'image', 'test_set')
+        self.assertEqual(get_many.call_count, 1)
+        self.assertEqual(objs, [jpg, png])
+        thumb_url = jpg.image.thumbnail['100x100'].url
+        self.assertEqual(jpg.image.rendition_memo[thumb_url], 1)
+        with mock.patch.object(
+            versatileimagefield_settings.cache,
+            'get',
+            side_effect=AssertionError('cache.get should not be called')
+        ):
+            for obj in (jpg, png):
+                build_versatileimagefield_url_set(
+                    obj.image,
+                    get_rendition_key_set('test_set')
+                )
+
+    def test_rendition_memo_forgets_deleted_renditions(self):
+        """Ensure deleted renditions are recreated by the same file."""
+        jpg = self.get_on_demand_jpg()
+        storage = jpg.image.field.storage
+        crop = jpg.image.crop['50x50']
+        self.assertIn(crop.url, jpg.image.rendition_memo)
+        crop.delete()
+        self.assertNotIn(crop.url, jpg.image.rendition_memo)
+        self.assertEqual(jpg.image.crop['50x50'].url, crop.url)
+        self.assertTrue(storage.exists(crop.name))
+
+        inverted = jpg.image.filters.invert
+        inverted_crop = inverted.crop['50x50']
+        jpg.image.delete_all_created_images()
+        self.assertFalse(storage.exists(crop.name))
+        self.assertFalse(storage.exists(inverted_crop.name))
+        jpg.image.crop['50x50']
+        jpg.image.filters.invert.crop['50x50']
+        self.assertTrue(storage.exists(crop.name))
+        self.assertTrue(storage.exists(inverted.name))
+        self.assertTrue(storage.exists(inverted_crop.name))
+
+        jpg.image.crop['50x50'].clear_cache()
+        self.assertNotIn(crop.url, jpg.image.rendition_memo)
+        jpg.image.delete_all_created_images()
+
+    def test_rendition_engine(self):
+        """Ensure RenditionEngine creates many renditions from one decode."""
+        instance = VersatileImageTestModel.objects.create(
+            img_type='engine',
+            image='python-logo-2.jpg',
+            ppoi='0.5x0.5',
+            width=0,
+            height=0
+        )
+        engine = RenditionEngine.from_field_file(instance.image)
+        size_key_list = [
+            size_key for key, size_key in get_rendition_key_set('test_set')
+        ] + ['url', 'not__a__valid__key']
+        with mock.patch.object(
+            ProcessedImage,
+            'retrieve_image',
+            autospec=True,
+            side_effect=ProcessedImage.retrieve_image
+        ) as retrieve_image, self.assertLogs('versatileimagefield.engine', 'ERROR'):
+            results = engine.create_renditions(size_key_list)
+        self.assertEqual(retrieve_image.call_count, 1)
+        self.assertEqual(
+            [success for success, url in results],
+            [True] * 6 + [False]
+        )
+        instance.image.create_on_demand = True
+        self.assertEqual(
+            dict(zip(size_key_list, [url for success, url in results[:-1]])),
+            dict(
+                (size_key, get_url_from_image_key(instance.image, size_key))
+                for size_key in size_key_list[:-1]
+            )
+        )
+        storage = instance.image.field.storage
+        crop = Image.open(storage.open(instance.image.crop['100x100'].name))
+        self.assertEqual(crop.size, (100, 100))
+        invert_crop = instance.image.filters.invert.crop['100x100'].name
+        self.assertTrue(storage.exists(invert_crop))
+        with mock.patch.object(ProcessedImage, 'retrieve_image') as retrieve_image:
+            engine.create_renditions(size_key_list[:-1])
+        self.assertFalse(retrieve_image.called)
+        instance.image.delete_all_created_images()
+
+    def test_rendition_engine_custom_sizers(self):
+        """Ensure RenditionEngine creates renditions through custom sizers."""
+
+        class DoubleCroppedImage(CroppedImage):
+            def get_sized_image(self, width, height):
+                return super(DoubleCroppedImage, self).get_sized_image(
+                    width * 2, height * 2
+                )
+
+        jpg = VersatileImageTestModel.objects.get(img_type='jpg')
+        storage = jpg.image.field.storage
+        size_key_list = [
+            'crop__50x50', 'filters__invert__crop__50x50', 'thumbnail__50x50'
+        ]
+        with mock.patch.dict(
+            versatileimagefield_registry._sizedimage_registry,
+            {'crop': DoubleCroppedImage}
+        ):
+            results = RenditionEngine.from_field_file(
+                jpg.image
+            ).create_renditions(size_key_list)
+            jpg.image.create_on_demand = False
+            self.assertEqual(
+                results,
+                [
+                    (True, jpg.image.crop['50x50'].url),
+                    (True, jpg.image.filters.invert.crop['50x50'].url),
+                    (True, jpg.image.thumbnail['50x50'].url),
+                ]
+            )
+            crop_path = jpg.image.crop['50x50'].name
+            invert_crop_path = jpg.image.filters.invert.crop['50x50'].name
+        self.assertIn('100x100', crop_path)
+        crop = Image.open(storage.open(crop_path))
+        self.assertEqual(crop.size, (100, 100))
+        self.assertTrue(storage.exists(invert_crop_path))
+        self.assertTrue(storage.exists(jpg.image.thumbnail['50x50'].name))
+        jpg.image.delete_all_created_images()
+
     def test_versatile_image_field_serializer_output(self):
         """Ensure VersatileImageFieldSerializer serializes correctly."""
         serializer = VersatileImageTestModelSerializer(
@@ -410,6 +1337,40 @@ class VersatileImageFieldTestCase(VersatileImageFieldBaseTestCase):
             }
         )
 
+    def test_versatile_image_list_serializer(self):
+        """Ensure list serializers fetch rendition cache entries in bulk."""
+        request = APIRequestFactory().get('/admin/')
+        queryset = VersatileImageTestModel.objects.filter(
+            img_type__in=('jpg', 'png')
+        ).order_by('pk')
+        for obj in queryset:
+            obj.image.create_on_demand = True
+            obj.optional_image.create_on_demand = True
+        # Creating renditions consults the cache (for locks) so they're
+        # created first.
+        expected = [
+            VersatileImageTestModelSerializer(
+                obj, context={'request': request}
+            ).data
+            for obj in queryset
+        ]
+        with mock.patch.object(
+            versatileimagefield_settings.cache,
+            'get_many',
+            wraps=versatileimagefield_settings.cache.get_many
+        ) as get_many, mock.patch.object(
+            versatileimagefield_settings.cache,
+            'get',
+            wraps=versatileimagefield_settings.cache.get
+        ) as get:
+            serializer = VersatileImageTestModelSerializer(
+                queryset, many=True, context={'request': request}
+            )
+            self.assertEqual(serializer.data, expected)
+        # One query per VersatileImageFieldSerializer.
+        self.assertEqual(get_many.call_count, 2)
+        self.assertFalse(get.called)
+
     def test_widget_javascript(self):
         """Ensure VersatileImagePPOIClickWidget widget loads appropriately."""
         self.widget_test.image.create_on_demand = True
@@ -623,6 +1584,360 @@ class VersatileImageFieldTestCase(VersatileImageFieldBaseTestCase):
         #     Image.open(exif_8_control)
         # )
 
+    def test_exif_orientations(self):
+        """Ensure all eight EXIF orientations are displayed upright."""
+        original = Image.new('RGB', (60, 40))
+        original.paste((255, 0, 0), (0, 0, 20, 10))
+        processed_image = self.jpg.image.thumbnail
+        for orientation in range(1, 9):
+            exif = Image.Exif()
+            exif[274] = orientation
+            imagefile = BytesIO()
+            original.save(imagefile, format='JPEG', exif=exif.tobytes())
+            image = Image.open(imagefile)
+            self.assertEqual(processed_image.get_exif_orientation(image), orientation)
+            processed = processed_image.preprocess(image, 'JPEG')[0]
+            expected = ImageOps.exif_transpose(image)
+            self.assertEqual(processed.size, expected.size)
+            self.assertEqual(processed.tobytes(), expected.tobytes())
+        self.assertIsNone(processed_image.get_exif_orientation(Image.new('RGB', (1, 1))))
+
+    def test_jpeg_draft_mode(self):
+        """Ensure JPEGs are decoded at reduced scale when resized."""
+        exif_6 = VersatileImageTestModel.objects.create(
+            img_type='draft',
+            image="exif-orientation-examples/Landscape_6.jpg",
+            ppoi="0.5x0.5",
+            width=0,
+            height=0
+        )
+        storage = exif_6.image.field.storage
+        thumbnail = exif_6.image.thumbnail
+        self.assertEqual(thumbnail.get_draft_size((600, 450), 100, 100), (100, 75))
+        self.assertEqual(thumbnail.get_draft_size((600, 450), 800, 800), None)
+        self.assertEqual(exif_6.image.crop.get_draft_size((600, 450), 100, 100), (134, 100))
+        decoded_sizes = []
+        original_process_image = ThumbnailImage.process_image
+
+        def process_image(sizer, image, **kwargs):
+            decoded_sizes.append(image.size)
+            return original_process_image(sizer, image, **kwargs)
+
+        with mock.patch.object(ThumbnailImage, 'process_image', autospec=True, side_effect=process_image):
+            with mock.patch(
+                'versatileimagefield.datastructures.base.VERSATILEIMAGEFIELD_JPEG_DRAFT_MODE',
+                True
+            ):
+                thumbnail.create_resized_image(
+                    exif_6.image.name, '__sized__/draft-test.jpg', 100, 100
+                )
+            # Draft mode is off by default.
+            thumbnail.create_resized_image(
+                exif_6.image.name, '__sized__/draft-test-full.jpg', 100, 100
+            )
+        # Landscape_6.jpg is 450x600 (rotated to 600x450) and can be decoded
+        # at 1/4 scale to create a 100x75 thumbnail.
+        self.assertEqual(decoded_sizes, [(150, 113), (600, 450)])
+        for path in ('__sized__/draft-test.jpg', '__sized__/draft-test-full.jpg'):
+            self.assertEqual(Image.open(storage.open(path)).size, (100, 75))
+            storage.delete(path)
+
+    def test_spooled_sources(self):
+        """Ensure originals are streamed into a SpooledTemporaryFile."""
+        thumbnail = self.jpg.image.thumbnail
+        storage_file = self.jpg.image.field.storage.open(self.jpg.image.name)
+        with storage_file:
+            contents = storage_file.read()
+        source = thumbnail.open_source(self.jpg.image.name)
+        self.assertIsInstance(source, SpooledTemporaryFile)
+        self.assertFalse(source._rolled)
+        self.assertEqual(source.read(), contents)
+        with mock.patch(
+            'versatileimagefield.datastructures.base.VERSATILEIMAGEFIELD_SOURCE_SPOOL_MAX_SIZE',
+            1024
+        ):
+            source = thumbnail.open_source(self.jpg.image.name)
+            self.assertTrue(source._rolled)
+            self.assertEqual(source.read(), contents)
+            image = thumbnail.retrieve_image(self.jpg.image.name)[0]
+            image.load()
+            self.assertEqual(image.size, (300, 300))
+            # Spooled sources are closed once renditions are created.
+            open_source = SizedImage.open_source
+            spooled = []
+
+            def record_source(processed_image, path_to_image):
+                spooled.append(open_source(processed_image, path_to_image))
+                return spooled[-1]
+
+            storage = self.jpg.image.field.storage
+            with mock.patch.object(
+                SizedImage, 'get_source_path', return_value=None
+            ), mock.patch.object(
+                SizedImage, 'open_source', autospec=True, side_effect=record_source
+            ):
+                thumbnail.create_resized_image(
+                    self.jpg.image.name, 'spool-test/thumbnail.jpg', 30, 30
+                )
+            self.assertTrue(storage.exists('spool-test/thumbnail.jpg'))
+            rmtree(storage.path('spool-test'))
+            self.assertEqual(len(spooled), 1)
+            self.assertTrue(spooled[0].closed)
+        # Sources of images PIL can't open are closed too.
+        remote_storage = mock.Mock()
+        remote_storage.path.side_effect = NotImplementedError
+        remote_storage.open.return_value = BytesIO(b'not an image')
+        spooled = []
+        with mock.patch.object(
+            ProcessedImage, 'open_source', autospec=True, side_effect=record_source
+        ), self.assertRaises(Image.UnidentifiedImageError):
+            ProcessedImage(
+                'corrupt.jpg', remote_storage, False
+            ).retrieve_image('corrupt.jpg')
+        self.assertEqual(len(spooled), 1)
+        self.assertTrue(spooled[0].closed)
+        # Files without a `chunks` method are read in pieces.
+        remote_storage = mock.Mock()
+        remote_storage.open.return_value = BytesIO(contents)
+        source = ProcessedImage(
+            self.jpg.image.name, remote_storage, False
+        ).open_source(self.jpg.image.name)
+        self.assertEqual(source.read(), contents)
+        with mock.patch(
+            'versatileimagefield.datastructures.base.VERSATILEIMAGEFIELD_SOURCE_SPOOL_MAX_SIZE',
+            None
+        ):
+            source = thumbnail.open_source(self.jpg.image.name)
+            self.assertNotIsInstance(source, SpooledTemporaryFile)
+            source.close()
+
+    def test_local_source_paths(self):
+        """Ensure originals on local storage are opened by path."""
+        thumbnail = self.jpg.image.thumbnail
+        storage = self.jpg.image.field.storage
+        source_path = storage.path(self.jpg.image.name)
+        self.assertEqual(thumbnail.get_source_path(self.jpg.image.name), source_path)
+        with mock.patch.object(SizedImage, 'open_source') as open_source:
+            image, file_ext, image_format, mime_type = thumbnail.retrieve_image(
+                self.jpg.image.name
+            )
+        open_source.assert_not_called()
+        self.assertEqual(image.filename, source_path)
+        self.assertEqual((file_ext, image_format, mime_type), ('jpg', 'JPEG', 'image/jpeg'))
+
+        remote_storage = mock.Mock()
+        remote_storage.path.side_effect = NotImplementedError
+        remote_image = ProcessedImage(self.jpg.image.name, remote_storage, False)
+        self.assertIsNone(remote_image.get_source_path(self.jpg.image.name))
+        with mock.patch.object(SizedImage, 'get_source_path', return_value=None):
+            image = thumbnail.retrieve_image(self.jpg.image.name)[0]
+        self.assertIsInstance(image.fp, SpooledTemporaryFile)
+
+    def test_pil_image_format(self):
+        """Ensure image formats are taken from PIL instead of libmagic."""
+        for instance, expected in (
+            (self.jpg, ('JPEG', 'image/jpeg')),
+            (self.png, ('PNG', 'image/png')),
+            (self.gif, ('GIF', 'image/gif')),
+            (self.webp, ('WEBP', 'image/webp')),
+        ):
+            processed_image = instance.image.thumbnail
+            with mock.patch('versatileimagefield.utils.magic') as magic:
+                metadata = processed_image.retrieve_image(instance.image.name)[2:]
+            magic.from_buffer.assert_not_called()
+            self.assertEqual(metadata, expected)
+            with mock.patch(
+                'versatileimagefield.datastructures.base.VERSATILEIMAGEFIELD_USE_PIL_IMAGE_FORMAT',
+                False
+            ):
+                self.assertEqual(
+                    processed_image.retrieve_image(instance.image.name)[2:], expected
+                )
+        # Formats PIL names differently are sniffed by libmagic.
+        with mock.patch.dict(
+            'versatileimagefield.utils.PIL_IDENTIFIER_TO_MIME_TYPE', clear=True
+        ), mock.patch.object(SizedImage, 'get_source_path', return_value=None):
+            image, file_ext, image_format, mime_type = self.jpg.image.thumbnail.retrieve_image(
+                self.jpg.image.name
+            )
+            self.assertEqual((image_format, mime_type), ('JPEG', 'image/jpeg'))
+            image.load()
+            self.assertEqual(image.size, (300, 300))
+
+    def test_mpo_images(self):
+        """Ensure JPEGs PIL identifies as MPO are handled as JPEGs."""
+        mpo = VersatileImageTestModel.objects.create(
+            img_type='mpo',
+            image='python-logo-mpo.jpg',
+            ppoi='0.5x0.5',
+            width=0,
+            height=0
+        )
+        thumbnail = mpo.image.thumbnail
+        with mock.patch('versatileimagefield.utils.magic') as magic:
+            image, file_ext, image_format, mime_type = thumbnail.retrieve_image(
+                mpo.image.name
+            )
+        magic.from_buffer.assert_not_called()
+        self.assertEqual(image.format, 'MPO')
+        self.assertEqual((image_format, mime_type), ('JPEG', 'image/jpeg'))
+        # MPOs are decoded at reduced scale too.
+        with mock.patch(
+            'versatileimagefield.datastructures.base.VERSATILEIMAGEFIELD_JPEG_DRAFT_MODE',
+            True
+        ):
+            image = thumbnail.draft_image(image, lambda size: (100, 100))
+        image.load()
+        self.assertEqual(image.size, (150, 150))
+
+        mpo.image.create_on_demand = True
+        rendition = mpo.image.thumbnail['100x100']
+        storage = mpo.image.field.storage
+        with storage.open(rendition.name) as f:
+            created = Image.open(f)
+            self.assertEqual((created.format, created.size), ('JPEG', (100, 100)))
+        mpo.image.delete_all_created_images()
+        mpo.delete()
+
+    def test_resampling_strategies(self):
+        """Ensure Sizers resample according to the 'resampling_strategy' setting."""
+        image = Image.effect_mandelbrot((1200, 900), (-2, -1, 1, 1), 100).convert('RGB')
+        sizers = {
+            'crop': CroppedImage(None, None, False, ppoi=(0.5, 0.5)),
+            'thumbnail': ThumbnailImage(None, None, False),
+        }
+        outputs = {}
+        for strategy, reducing_gap in RESAMPLING_STRATEGY_REDUCING_GAPS.items():
+            with mock.patch(
+                'versatileimagefield.versatileimagefield.VERSATILEIMAGEFIELD_REDUCING_GAP',
+                reducing_gap
+            ):
+                if strategy == 'pillow':
+                    self.assertEqual(get_resize_kwargs(), {})
+                else:
+                    self.assertEqual(get_resize_kwargs(), {'reducing_gap': reducing_gap})
+                for name, sizer in sizers.items():
+                    imagefile = sizer.process_image(
+                        image.copy(), 'PNG', {'format': 'PNG'}, 100, 100
+                    )
+                    outputs[name, strategy] = Image.open(imagefile)
+        for sizer, size in (('crop', (100, 100)), ('thumbnail', (100, 75))):
+            for strategy in RESAMPLING_STRATEGY_REDUCING_GAPS:
+                self.assertEqual(outputs[sizer, strategy].size, size)
+            # Reducing first only approximates an exact resample.
+            self.assertNotEqual(
+                outputs[sizer, 'exact'].tobytes(), outputs[sizer, 'fast'].tobytes()
+            )
+        # By default images are resampled as Pillow would.
+        self.assertEqual(versatileimagefield_settings.VERSATILEIMAGEFIELD_RESAMPLING_STRATEGY, 'pillow')
+        self.assertEqual(outputs['crop', 'pillow'].tobytes(), outputs['crop', 'exact'].tobytes())
+        self.assertEqual(
+            outputs['thumbnail', 'pillow'].tobytes(), outputs['thumbnail', 'reducing_gap'].tobytes()
+        )
+
+    def test_instrumentation(self):
+        """Ensure rendition lookups & creation send timing signals."""
+        collector = RenditionStatsCollector()
+        collector.connect()
+        started = []
+
+        def stage_started(sender, stage, path, **kwargs):
+            started.append((sender, stage))
+
+        rendition_stage_started.connect(stage_started, sender=CroppedImage)
+        try:
+            image = VersatileImageTestModel.objects.get(img_type='jpg').image
+            image.create_on_demand = True
+            image.crop['101x101']
+            image.crop['101x101']
+            image.thumbnail['101x101']
+        finally:
+            collector.disconnect()
+            rendition_stage_started.disconnect(stage_started, sender=CroppedImage)
+        image.crop['102x102']
+        self.assertEqual(started, [(CroppedImage, stage) for stage in STAGES])
+        stats = collector.snapshot(reset=True)
+        self.assertEqual((stats['cache']['hits'], stats['cache']['misses']), (1, 2))
+        self.assertEqual(stats['resolved']['count'], 3)
+        self.assertEqual(stats['exists']['count'], 2)
+        self.assertEqual(stats['exists']['found'], 0)
+        for stage in STAGES:
+            self.assertEqual(stats['stages'][stage]['count'], 2)
+            self.assertGreater(stats['stages'][stage]['duration'], 0)
+        # The original image is read once per rendition created.
+        self.assertEqual(
+            stats['stages']['retrieve_image']['nbytes'],
+            2 * image.field.storage.size(image.name)
+        )
+        self.assertEqual(
+            stats['stages']['save_image']['nbytes'],
+            sum(
+                image.field.storage.size(path)
+                for path in (image.crop['101x101'].name, image.thumbnail['101x101'].name)
+            )
+        )
+        self.assertEqual(collector.snapshot()['cache'], {'hits': 0, 'misses': 0, 'duration': 0.0})
+
+        # Stages that raise are reported (with their exception) too.
+        finished = []
+
+        def stage_finished(sender, stage, exception, **kwargs):
+            finished.append((stage, exception))
+
+        rendition_stage_finished.connect(stage_finished, sender=CroppedImage)
+        collector.connect()
+        error = OSError('Corrupt image')
+        try:
+            with mock.patch.object(
+                CroppedImage, 'retrieve_image', side_effect=error
+            ), self.assertRaises(OSError):
+                image.crop.create_resized_image(
+                    image.name, image.crop['101x101'].name, 101, 101
+                )
+        finally:
+            collector.disconnect()
+            rendition_stage_finished.disconnect(stage_finished, sender=CroppedImage)
+        self.assertEqual(finished, [('retrieve_image', error)])
+        stats = collector.snapshot()
+        self.assertEqual(stats['stages']['retrieve_image']['count'], 1)
+        self.assertEqual(stats['stages']['retrieve_image']['failures'], 1)
+        summary = summarize_rendition_stats(stats)
+        self.assertEqual((summary['created'], summary['failed']), (0, 1))
+
+    def test_rendition_stats_middleware(self):
+        """Ensure RenditionStatsMiddleware records each request's renditions."""
+        image = VersatileImageTestModel.objects.get(img_type='jpg').image
+        image.create_on_demand = True
+        image.crop['103x103']
+
+        def view(request):
+            image.crop['103x103']
+            image.thumbnail['103x103']
+            return HttpResponse()
+
+        middleware = RenditionStatsMiddleware(view)
+        with self.settings(DEBUG=True), self.assertLogs(
+            'versatileimagefield.middleware', 'DEBUG'
+        ) as logs:
+            request = RequestFactory().get('/')
+            response = middleware(request)
+        summary = summarize_rendition_stats(request.rendition_stats.snapshot())
+        self.assertEqual(summary['resolved'], 2)
+        self.assertEqual((summary['cache_hits'], summary['cache_misses']), (1, 1))
+        self.assertEqual(summary['exists_probes'], 1)
+        self.assertEqual(summary['created'], 1)
+        self.assertEqual(response['X-Rendition-Stats'], format_rendition_stats(summary))
+        self.assertEqual(logs.records[0].levelname, 'DEBUG')
+        self.assertEqual(logs.records[0].rendition_stats, summary)
+        # Renditions accessed outside of the request aren't counted.
+        image.crop['103x103']
+        self.assertEqual(request.rendition_stats.snapshot()['resolved']['count'], 2)
+
+        middleware.warning_threshold = 2
+        with self.assertLogs('versatileimagefield.middleware', 'WARNING'):
+            response = middleware(RequestFactory().get('/'))
+        self.assertNotIn('X-Rendition-Stats', response)
+
     def test_horizontal_and_vertical_crop(self):
         """Test horizontal and vertical crops with 'extreme' PPOI values."""
         test_gif = VersatileImageTestModel.objects.get(img_type='gif')
@@ -1015,6 +2330,93 @@ class VersatileImageFieldTestCase(VersatileImageFieldBaseTestCase):
             'test-thumbnail-100x100-{}.webp'.format(WEBP_QUAL)
         )
 
+    def test_path_cache(self):
+        """Ensure sized and filtered paths are memoized."""
+        clear_path_cache()
+        for i in range(2):
+            self.assertEqual(
+                get_resized_path('foo/bar baz.png', 100, 50, 'thumbnail', None),
+                '__sized__/foo/barbaz-thumbnail-100x50.png'
+            )
+            self.assertEqual(
+                get_filtered_path('foo/bar.png', 'invert', None),
+                'foo/__filtered__/bar__invert__.png'
+            )
+        info = get_path_cache_info()
+        self.assertEqual((info['resized'].hits, info['resized'].misses), (1, 1))
+        self.assertEqual((info['filtered'].hits, info['filtered'].misses), (1, 1))
+        # Parsed Rendition Keys are memoized in a bounded cache too.
+        for i in range(2):
+            parse_image_key('filters__invert__crop__100x50')
+        info = get_path_cache_info()['image_keys']
+        self.assertEqual((info.hits, info.misses, info.maxsize), (1, 1, 10000))
+        clear_path_cache()
+        self.assertEqual(get_path_cache_info()['resized'].currsize, 0)
+        self.assertEqual(get_path_cache_info()['image_keys'].currsize, 0)
+
+    def test_storage_urls(self):
+        """Ensure storage URLs are built quickly and cached."""
+        storage = self.jpg.image.field.storage
+        for path in (
+            '__sized__/foo/bar-crop-c0-5__0-5-100x100.jpg',
+            '/foo/bar baz?.jpg',
+            'foo/../bar.jpg',
+            'foo/./bar.jpg',
+            'http:/bar.jpg',
+        ):
+            self.assertEqual(build_url(storage, path), storage.url(path))
+        cdn_storage = FileSystemStorage(base_url='https://cdn.example.com/m/')
+        self.assertEqual(
+            build_url(cdn_storage, 'bar.jpg'), 'https://cdn.example.com/m/bar.jpg'
+        )
+
+        url_cache = StorageURLCache(maxsize=2, timeout=60)
+        signed_storage = mock.Mock()
+        url = signed_storage.url
+        url.side_effect = lambda path: '/signed/' + path
+        self.assertEqual(url_cache.url(signed_storage, 'a.jpg'), '/signed/a.jpg')
+        self.assertEqual(url_cache.url(signed_storage, 'a.jpg'), '/signed/a.jpg')
+        self.assertEqual(url.call_count, 1)
+        self.assertEqual((url_cache.hits, url_cache.misses), (1, 1))
+        # The least recently used URL is discarded.
+        url_cache.url(signed_storage, 'b.jpg')
+        url_cache.url(signed_storage, 'a.jpg')
+        url_cache.url(signed_storage, 'c.jpg')
+        self.assertEqual(url.call_count, 3)
+        url_cache.url(signed_storage, 'a.jpg')
+        self.assertEqual(url.call_count, 3)
+        url_cache.url(signed_storage, 'b.jpg')
+        self.assertEqual(url.call_count, 4)
+        # URLs expire.
+        with mock.patch(
+            'versatileimagefield.storage_urls.time.monotonic',
+            return_value=time.monotonic() + 61
+        ):
+            url_cache.url(signed_storage, 'b.jpg')
+        self.assertEqual(url.call_count, 5)
+        url_cache.clear()
+        self.assertEqual((url_cache.hits, url_cache.misses), (0, 0))
+
+    def test_rendition_file(self):
+        """Ensure renditions are handed to storage without copying them."""
+        imagefile = BytesIO()
+        for i in range(4):
+            imagefile.write(b'x' * 1000)
+        rendition_file = RenditionFile(imagefile, 'foo.jpg', 'image/jpeg')
+        self.assertEqual(rendition_file.size, 4000)
+        self.assertEqual(rendition_file.content_type, 'image/jpeg')
+        self.assertFalse(rendition_file.multiple_chunks())
+        chunks = list(rendition_file.chunks())
+        self.assertEqual(len(chunks), 1)
+        self.assertIs(chunks[0], imagefile.getvalue())
+
+        storage = mock.Mock()
+        processed_image = ProcessedImage('bar.jpg', storage, False)
+        processed_image.save_image(imagefile, 'foo.jpg', 'jpg', 'image/jpeg')
+        save_path, file_to_save = storage.save.call_args[0]
+        self.assertEqual(save_path, 'foo.jpg')
+        self.assertIsInstance(file_to_save, RenditionFile)
+
     def test_transparent_gif_preprocess(self):
         """Test preprocessing a transparent gif image."""
         instance = VersatileImageTestModel.objects.create(
@@ -1,17 +1,95 @@
 """Base datastructures for manipulated images."""
+from contextlib import contextmanager
+from functools import partial
+import os
+from tempfile import SpooledTemporaryFile
+
 from PIL import Image
 
+from django.core.files.base import File
 from django.core.files.uploadedfile import InMemoryUploadedFile
 
 from ..settings import (
     JPEG_QUAL,
+    VERSATILEIMAGEFIELD_JPEG_DRAFT_MODE,
     VERSATILEIMAGEFIELD_PROGRESSIVE_JPEG,
     VERSATILEIMAGEFIELD_LOSSLESS_WEBP,
+    VERSATILEIMAGEFIELD_SOURCE_SPOOL_MAX_SIZE,
+    VERSATILEIMAGEFIELD_USE_PIL_IMAGE_FORMAT,
     WEBP_QUAL,
 )
-from ..utils import get_image_metadata_from_file
+from ..utils import (
+    get_image_metadata_from_file,
+    get_image_metadata_from_image
+)
 
 EXIF_ORIENTATION_KEY = 274
+# The PIL formats that can be decoded at reduced scale (MPO files are JPEGs)
+DRAFTABLE_FORMATS = ('JPEG', 'MPO')
+# EXIF orientations that swap an image's width and height
+EXIF_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+# {EXIF orientation: The transpose that displays the image upright}
+EXIF_ORIENTATION_TRANSPOSES = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+
+
+@contextmanager
+def closing_source(image):
+    """
+    Close the file `image` (a PIL Image returned by
+    ProcessedImage.retrieve_image) is read from once the block this wraps
+    finishes so spooled sources don't linger (on disk, for large images)
+    until they're garbage collected. `image` can't be loaded after that.
+    """
+    source = getattr(image, 'fp', None)
+    try:
+        yield image
+    finally:
+        if source is not None:
+            source.close()
+
+
+class RenditionFile(File):
+    """
+    A File that hands the contents of an encoded image (a BytesIO instance)
+    to storage classes in a single chunk.
+
+    InMemoryUploadedFile.chunks `read`s its file, which copies the
+    (over-allocated) buffer PIL encoded the image into. Here the single
+    chunk is `BytesIO.getvalue()` which (on CPython) trims and shares the
+    BytesIO's buffer rather than copying it. Storages that `read` the file
+    instead are unaffected.
+
+    Constructor arguments:
+        * `imagefile`: A BytesIO instance.
+        * `name`: The name of the file.
+        * `content_type`: The mime type of the image (used by some storages
+                          to set the Content-Type of the uploaded file).
+    """
+
+    def __init__(self, imagefile, name, content_type):
+        """Construct a RenditionFile."""
+        super(RenditionFile, self).__init__(imagefile, name)
+        self.content_type = content_type
+        self.charset = None
+        self.content_type_extra = None
+        # Unlike `getbuffer`, `getvalue` never copies a shared buffer.
+        self.size = len(imagefile.getvalue())
+
+    def chunks(self, chunk_size=None):
+        """Return an iterator over the contents of the file (in one chunk)."""
+        yield self.file.getvalue()
+
+    def multiple_chunks(self, chunk_size=None):
+        """Return False (the contents are always returned in one chunk)."""
+        return False
 
 
 class ProcessedImage(object):
@@ -35,6 +113,11 @@ class ProcessedImage(object):
 
     name = None
     url = None
+    # The ProcessedImage (if any) that creates the image at `path_to_image`.
+    rendition_source = None
+    # The size (in bytes) of the original image read by the most recent
+    # call to `retrieve_image` (None if it isn't known).
+    source_nbytes = None
 
     def __init__(self, path_to_image, storage, create_on_demand,
                  placeholder_image=None):
@@ -44,6 +127,15 @@ class ProcessedImage(object):
         self.create_on_demand = create_on_demand
         self.placeholder_image = placeholder_image
 
+    def get_rendition_job_kwargs(self):
+        """
+        Return the keyword arguments (other than `storage` and
+        `create_on_demand`) needed to reconstruct `self` within a
+        versatileimagefield.tasks.RenditionJob. Subclasses that accept
+        additional constructor arguments should extend this.
+        """
+        return {'path_to_image': self.path_to_image}
+
     def process_image(self, image, image_format, **kwargs):
         """
         Ensure NotImplemented is raised if not overloaded by subclasses.
@@ -81,18 +173,14 @@ class ProcessedImage(object):
         """
         save_kwargs = {'format': image_format}
 
-        # Ensuring image is properly rotated
-        if hasattr(image, '_getexif'):
-            exif_datadict = image._getexif()  # returns None if no EXIF data
-            if exif_datadict is not None:
-                exif = dict(exif_datadict.items())
-                orientation = exif.get(EXIF_ORIENTATION_KEY, None)
-                if orientation == 3:
-                    image = image.transpose(Image.ROTATE_180)
-                elif orientation == 6:
-                    image = image.transpose(Image.ROTATE_270)
-                elif orientation == 8:
-                    image = image.transpose(Image.ROTATE_90)
+        # Ensuring image is properly rotated (and/or mirrored). `image` has
+        # already been drafted (if possible) so this transposes the smallest
+        # bitmap available.
+        transpose = EXIF_ORIENTATION_TRANSPOSES.get(
+            self.get_exif_orientation(image)
+        )
+        if transpose is not None:
+            image = image.transpose(transpose)
 
         # Ensure any embedded ICC profile is preserved
         save_kwargs['icc_profile'] = image.info.get('icc_profile')
@@ -106,6 +194,56 @@ class ProcessedImage(object):
 
         return image, save_kwargs
 
+    def get_exif_orientation(self, image):
+        """
+        Return the EXIF orientation of `image` (or None if unavailable).
+
+        Only the first IFD of `image`'s EXIF data is parsed (by PIL's
+        `getexif`, which caches it on `image`).
+        """
+        if hasattr(image, 'getexif'):
+            return image.getexif().get(EXIF_ORIENTATION_KEY)
+        if hasattr(image, '_getexif'):  # Pillow < 6.0
+            exif_datadict = image._getexif()  # returns None if no EXIF data
+            if exif_datadict is not None:
+                return dict(exif_datadict.items()).get(EXIF_ORIENTATION_KEY)
+        return None
+
+    def draft_image(self, image, get_draft_size):
+        """
+        Reduce the scale `image` will be decoded at, if possible.
+
+        Uses PIL's 'draft' mode which instructs libjpeg to decode JPEGs
+        directly at 1/2, 1/4 or 1/8 scale (the largest that's still at least
+        as big as requested). Must be called before `image` is loaded.
+
+        Arguments:
+            * `image`: a PIL Image instance
+            * `get_draft_size`: A callable that receives the size of `image`
+                                (as it will be displayed, i.e. once EXIF
+                                orientation is applied) and returns the
+                                minimum size `image` can be decoded at as a
+                                2-tuple (or None to decode at full scale).
+
+        Returns `image`. Does nothing if
+        VERSATILEIMAGEFIELD_SETTINGS['jpeg_draft_mode'] is False.
+        """
+        if not VERSATILEIMAGEFIELD_JPEG_DRAFT_MODE or (
+            image.format not in DRAFTABLE_FORMATS
+        ):
+            return image
+        transposed = self.get_exif_orientation(
+            image
+        ) in EXIF_TRANSPOSED_ORIENTATIONS
+        image_size = image.size[::-1] if transposed else image.size
+        draft_size = get_draft_size(image_size)
+        if draft_size is not None:
+            image.draft(
+                image.mode,
+                tuple(draft_size[::-1] if transposed else draft_size)
+            )
+        return image
+
     def preprocess_GIF(self, image, **kwargs):
         """
         Receive a PIL Image instance of a GIF and return 2-tuple.
@@ -156,19 +294,116 @@ class ProcessedImage(object):
 
         return (image, save_kwargs)
 
+    def open_source(self, path_to_image):
+        """
+        Return a file-like object of the image stored at `path_to_image`.
+
+        The image is streamed (in chunks, or via `read` for files without
+        a `chunks` method) from self.storage into a SpooledTemporaryFile
+        which is held in memory until it grows larger than
+        VERSATILEIMAGEFIELD_SETTINGS['source_spool_max_size'] bytes and on
+        disk after that. If that setting is None the file returned by
+        self.storage.open is used instead.
+
+        The caller is responsible for closing the returned file (see
+        `closing_source`).
+        """
+        self.source_nbytes = None
+        source = self.storage.open(path_to_image, 'rb')
+        if VERSATILEIMAGEFIELD_SOURCE_SPOOL_MAX_SIZE is None:
+            return source
+        spooled = SpooledTemporaryFile(
+            max_size=VERSATILEIMAGEFIELD_SOURCE_SPOOL_MAX_SIZE
+        )
+        try:
+            with source:
+                if hasattr(source, 'chunks'):
+                    chunks = source.chunks()
+                else:
+                    chunks = iter(
+                        partial(source.read, File.DEFAULT_CHUNK_SIZE), b''
+                    )
+                for chunk in chunks:
+                    spooled.write(chunk)
+        except Exception:
+            spooled.close()
+            raise
+        self.source_nbytes = spooled.tell()
+        spooled.seek(0)
+        return spooled
+
+    def get_source_path(self, path_to_image):
+        """
+        Return the local filesystem path of the image stored at
+        `path_to_image` (or None if self.storage doesn't support `path`).
+        """
+        try:
+            return self.storage.path(path_to_image)
+        except NotImplementedError:
+            return None
+
     def retrieve_image(self, path_to_image):
-        """Return a PIL Image instance stored at `path_to_image`."""
-        image = self.storage.open(path_to_image, 'rb')
-        image_format, mime_type = get_image_metadata_from_file(image)
+        """
+        Return a PIL Image instance stored at `path_to_image`.
+
+        Images on storages with local paths (like FileSystemStorage) are
+        opened by path so PIL reads (or, for uncompressed formats, memory
+        maps) them directly. Others are read via `open_source`.
+
+        The image's format & mime type are taken from PIL if
+        VERSATILEIMAGEFIELD_SETTINGS['use_pil_image_format'] is True (and
+        PIL's name for the format is known) and sniffed by libmagic
+        otherwise.
+        """
+        source_path = self.get_source_path(path_to_image)
+        if source_path is None:
+            source = self.open_source(path_to_image)
+        else:
+            source = source_path
+            self.source_nbytes = os.path.getsize(source_path)
+        image = None
+        try:
+            metadata = None
+            if not VERSATILEIMAGEFIELD_USE_PIL_IMAGE_FORMAT:
+                metadata = self.sniff_image_metadata(source)
+            image = Image.open(source)
+            if metadata is None:
+                metadata = get_image_metadata_from_image(image)
+            if metadata is None:
+                metadata = self.sniff_image_metadata(source)
+            image_format, mime_type = metadata
+        except Exception:
+            # Corrupt or unsupported images mustn't leak the files they were
+            # read from.
+            if image is not None:
+                image.close()
+            if source_path is None:
+                source.close()
+            raise
         file_ext = path_to_image.rsplit('.')[-1]
 
         return (
-            Image.open(image),
+            image,
             file_ext,
             image_format,
             mime_type
         )
 
+    def sniff_image_metadata(self, source):
+        """
+        Return the format & mime type of `source` (a local path or a file
+        object) via libmagic, see
+        versatileimagefield.utils.get_image_metadata_from_file.
+        """
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                return get_image_metadata_from_file(f)
+        position = source.tell()
+        source.seek(0)
+        metadata = get_image_metadata_from_file(source)
+        source.seek(position)
+        return metadata
+
     def save_image(self, imagefile, save_path, file_ext, mime_type):
         """
         Save an image to self.storage at `save_path`.
@@ -181,13 +416,18 @@ class ProcessedImage(object):
             `mime_type`: A valid image mime type (as found in
                          versatileimagefield.utils)
         """
-        file_to_save = InMemoryUploadedFile(
-            imagefile,
-            None,
-            'foo.%s' % file_ext,
-            mime_type,
-            imagefile.tell(),
-            None
-        )
+        if hasattr(imagefile, 'getvalue'):
+            file_to_save = RenditionFile(
+                imagefile, 'foo.%s' % file_ext, mime_type
+            )
+        else:
+            file_to_save = InMemoryUploadedFile(
+                imagefile,
+                None,
+                'foo.%s' % file_ext,
+                mime_type,
+                imagefile.tell(),
+                None
+            )
         file_to_save.seek(0)
         self.storage.save(save_path, file_to_save)
@@ -1,13 +1,18 @@
+from functools import partial
+
 from django.conf import settings
 
-from ..settings import (
-    cache,
-    VERSATILEIMAGEFIELD_CACHE_LENGTH
+from ..instrumentation import (
+    get_nbytes,
+    instrument_resolution,
+    instrument_stage
 )
+from ..storage_urls import get_storage_url
+from ..tasks import RenditionJob
 from ..utils import get_filtered_path
 
-from .base import ProcessedImage
-from .mixins import DeleteAndClearCacheMixIn
+from .base import closing_source, ProcessedImage
+from .mixins import DeleteAndClearCacheMixIn, RenditionCacheMixIn
 
 
 class InvalidFilter(Exception):
@@ -33,13 +38,20 @@ class FilteredImage(DeleteAndClearCacheMixIn, ProcessedImage):
         super(FilteredImage, self).__init__(
             path_to_image, storage, create_on_demand
         )
+        self.filename_key = filename_key
         self.name = get_filtered_path(
             path_to_image=self.path_to_image,
             filename_key=filename_key,
             storage=storage
         )
 
-        self.url = storage.url(self.name)
+        self.url = get_storage_url(storage, self.name)
+
+    def get_rendition_job_kwargs(self):
+        """Return the keyword arguments needed to reconstruct `self`."""
+        kwargs = super(FilteredImage, self).get_rendition_job_kwargs()
+        kwargs['filename_key'] = self.filename_key
+        return kwargs
 
     def create_filtered_image(self, path_to_image, save_path_on_storage):
         """
@@ -50,12 +62,28 @@ class FilteredImage(DeleteAndClearCacheMixIn, ProcessedImage):
                                 image
         """
 
-        image, file_ext, image_format, mime_type = self.retrieve_image(
-            path_to_image
-        )
-        image, save_kwargs = self.preprocess(image, image_format)
-        imagefile = self.process_image(image, image_format, save_kwargs)
-        self.save_image(imagefile, save_path_on_storage, file_ext, mime_type)
+        with instrument_stage(
+            self.__class__, 'retrieve_image', path_to_image
+        ) as event:
+            image, file_ext, image_format, mime_type = self.retrieve_image(
+                path_to_image
+            )
+            event['nbytes'] = self.source_nbytes
+        with closing_source(image):
+            with instrument_stage(self.__class__, 'preprocess', path_to_image):
+                image, save_kwargs = self.preprocess(image, image_format)
+            with instrument_stage(
+                self.__class__, 'process_image', save_path_on_storage
+            ) as event:
+                imagefile = self.process_image(image, image_format, save_kwargs)
+                event['nbytes'] = get_nbytes(imagefile)
+            with instrument_stage(
+                self.__class__, 'save_image', save_path_on_storage
+            ) as event:
+                self.save_image(
+                    imagefile, save_path_on_storage, file_ext, mime_type
+                )
+                event['nbytes'] = get_nbytes(imagefile)
 
     def __str__(self):
         return self.url
@@ -70,7 +98,7 @@ class DummyFilter(object):
     url = ''
 
 
-class FilterLibrary(dict):
+class FilterLibrary(RenditionCacheMixIn, dict):
     """
     Exposes all filters registered with the sizedimageregistry
     (via sizedimageregistry.register_filter) to each VersatileImageField.
@@ -107,75 +135,115 @@ class FilterLibrary(dict):
             # or self.get(key))
             prepped_filter = dict.__getitem__(self, key)
         except KeyError:
-            # See if `key` is associated with a valid filter.
-            if key not in self.registry._filter_registry:
-                raise InvalidFilter('`%s` is an invalid filter.' % key)
-            else:
-                # Handling 'empty' fields.
-                if not self.original_file_location and getattr(
-                    settings, 'VERSATILEIMAGEFIELD_USE_PLACEHOLDIT', False
+            prepped_filter = self.prep_filter(key)
+            with instrument_resolution(prepped_filter.__class__) as event:
+                if self.create_on_demand is True and not isinstance(
+                    prepped_filter, DummyFilter
                 ):
-                    # If VERSATILEIMAGEFIELD_USE_PLACEHOLDIT is True (i.e.
-                    # settings.VERSATILEIMAGEFIELD_PLACEHOLDER_IMAGE is unset)
-                    # use DummyFilter (so sized renditions can still return
-                    # valid http://placehold.it URLs).
-                    filtered_path = None
-                    prepped_filter = DummyFilter()
-                else:
-                    filtered_path = get_filtered_path(
-                        path_to_image=self.original_file_location,
-                        filename_key=key,
-                        storage=self.storage
-                    )
-
-                    filtered_url = self.storage.url(filtered_path)
-
-                    filter_cls = self.registry._filter_registry[key]
-                    prepped_filter = filter_cls(
-                        path_to_image=self.original_file_location,
-                        storage=self.storage,
-                        create_on_demand=self.create_on_demand,
-                        filename_key=key
-                    )
-                    if self.create_on_demand is True:
-                        if cache.get(filtered_url):
-                            # The filtered_url exists in the cache so the image
-                            # already exists. So we `pass` to skip directly to
-                            # the return statement.
-                            pass
-                        else:
-                            if not self.storage.exists(filtered_path):
-                                prepped_filter.create_filtered_image(
-                                    path_to_image=self.original_file_location,
-                                    save_path_on_storage=filtered_path
-                                )
-
-                            # Setting a super-long cache for the newly created
-                            # image
-                            cache.set(
-                                filtered_url,
-                                1,
-                                VERSATILEIMAGEFIELD_CACHE_LENGTH
-                            )
-
-                # 'Bolting' all image sizers within
-                # `self.registry._sizedimage_registry` onto
-                # the prepped_filter instance
-                for (
-                        attr_name, sizedimage_cls
-                ) in self.registry._sizedimage_registry.items():
-                    setattr(
-                        prepped_filter,
-                        attr_name,
-                        sizedimage_cls(
-                            path_to_image=filtered_path,
-                            storage=self.storage,
-                            create_on_demand=self.create_on_demand,
-                            ppoi=self.ppoi
-                        )
-                    )
-                # Assigning `prepped_filter` to `key` so future access
-                # is fast/cheap
-                self[key] = prepped_filter
-
-        return dict.__getitem__(self, key)
+                    if self.rendition_is_cached(prepped_filter.url):
+                        # The filtered_url exists in the cache so the image
+                        # already exists. So we `pass` to skip directly to
+                        # the return statement.
+                        pass
+                    else:
+                        self.ensure_filtered_image(prepped_filter)
+                event['url'] = prepped_filter.url
+            # Assigning `prepped_filter` to `key` so future access
+            # is fast/cheap
+            self[key] = prepped_filter
+
+        return prepped_filter
+
+    async def aget(self, key):
+        """
+        Async version of `self[key]`.
+
+        The cache is consulted without blocking the event loop and missing
+        images are created outside of it (see RenditionCacheMixIn.arun).
+        """
+        try:
+            return dict.__getitem__(self, key)
+        except KeyError:
+            pass
+        prepped_filter = self.prep_filter(key)
+        with instrument_resolution(prepped_filter.__class__) as event:
+            if self.create_on_demand is True and not isinstance(
+                prepped_filter, DummyFilter
+            ):
+                if not await self.arendition_is_cached(prepped_filter.url):
+                    await self.arun(self.ensure_filtered_image, prepped_filter)
+            event['url'] = prepped_filter.url
+        self[key] = prepped_filter
+        return prepped_filter
+
+    def prep_filter(self, key):
+        """
+        Return a FilteredImage instance (with every registered sizer 'bolted'
+        on) for the filter registered to `key` without creating its image.
+        """
+        # See if `key` is associated with a valid filter.
+        if key not in self.registry._filter_registry:
+            raise InvalidFilter('`%s` is an invalid filter.' % key)
+
+        # Handling 'empty' fields.
+        if not self.original_file_location and getattr(
+            settings, 'VERSATILEIMAGEFIELD_USE_PLACEHOLDIT', False
+        ):
+            # If VERSATILEIMAGEFIELD_USE_PLACEHOLDIT is True (i.e.
+            # settings.VERSATILEIMAGEFIELD_PLACEHOLDER_IMAGE is unset)
+            # use DummyFilter (so sized renditions can still return
+            # valid http://placehold.it URLs).
+            filtered_path = None
+            prepped_filter = DummyFilter()
+        else:
+            filter_cls = self.registry._filter_registry[key]
+            prepped_filter = filter_cls(
+                path_to_image=self.original_file_location,
+                storage=self.storage,
+                create_on_demand=self.create_on_demand,
+                filename_key=key
+            )
+            prepped_filter.rendition_manifest = self.rendition_manifest
+            prepped_filter.rendition_memo = self.rendition_memo
+            filtered_path = prepped_filter.name
+
+        # 'Bolting' all image sizers within
+        # `self.registry._sizedimage_registry` onto
+        # the prepped_filter instance
+        for (
+                attr_name, sizedimage_cls
+        ) in self.registry._sizedimage_registry.items():
+            sizedimage = sizedimage_cls(
+                path_to_image=filtered_path,
+                storage=self.storage,
+                create_on_demand=self.create_on_demand,
+                ppoi=self.ppoi
+            )
+            sizedimage.rendition_memo = self.rendition_memo
+            sizedimage.rendition_manifest = self.rendition_manifest
+            sizedimage.rendition_source = prepped_filter
+            setattr(prepped_filter, attr_name, sizedimage)
+        return prepped_filter
+
+    def ensure_filtered_image(self, prepped_filter):
+        """
+        Create the image of `prepped_filter` (if it doesn't exist yet) and
+        mark it as created in the cache.
+        """
+        if self.ensure_rendition_exists(
+            prepped_filter.name,
+            partial(
+                prepped_filter.create_filtered_image,
+                path_to_image=self.original_file_location,
+                save_path_on_storage=prepped_filter.name
+            ),
+            get_job=partial(
+                RenditionJob.for_processor,
+                prepped_filter,
+                prepped_filter.name,
+                prepped_filter.url
+            )
+        ):
+            # Setting a super-long cache for the newly created
+            # image
+            self.mark_rendition_cached(prepped_filter.url)
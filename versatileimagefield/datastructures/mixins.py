@@ -1,11 +1,159 @@
-from ..settings import cache
+from asgiref.sync import sync_to_async
+
+from ..instrumentation import (
+    alookup_cache,
+    lookup_cache,
+    probe_exists,
+    send_cache_lookup
+)
+from ..locks import RenditionLock
+from ..settings import (
+    cache,
+    VERSATILEIMAGEFIELD_CACHE_LENGTH,
+    VERSATILEIMAGEFIELD_CREATE_IMAGES_ASYNCHRONOUSLY
+)
+from ..tasks import get_rendition_backend
+
+
+async def acache_get(key):
+    """Fetch `key` from the cache without blocking the event loop."""
+    if hasattr(cache, 'aget'):
+        return await cache.aget(key)
+    # Django < 4.0 caches don't have async methods.
+    return await sync_to_async(cache.get)(key)
 
 
 class DeleteAndClearCacheMixIn(object):
 
+    # The RenditionManifest (if any) that records this rendition.
+    rendition_manifest = None
+    # The `rendition_memo` (if any) of the VersatileImageFieldFile this
+    # rendition was created from (see RenditionCacheMixIn).
+    rendition_memo = None
+
     def clear_cache(self):
         cache.delete(self.url)
+        if self.rendition_memo is not None:
+            self.rendition_memo.pop(self.url, None)
 
     def delete(self):
+        if self.rendition_manifest is not None:
+            self.rendition_manifest.discard((self.name,))
         self.storage.delete(self.name)
         self.clear_cache()
+
+
+class RenditionCacheMixIn(object):
+    """
+    Cache lookups for classes that create renditions on demand.
+
+    `rendition_memo` is an optional dict (shared by all the sizers & filters
+    of a single VersatileImageFieldFile) that maps rendition URLs to the
+    value previously fetched for them from the cache. If a URL is in the
+    memo, the cache isn't consulted at all. See
+    versatileimagefield.utils.prefetch_renditions.
+
+    `rendition_manifest` is an optional RenditionManifest (also shared by
+    all the sizers & filters of a single VersatileImageFieldFile) consulted
+    before the storage class when looking for renditions.
+    """
+
+    rendition_memo = None
+    rendition_manifest = None
+    # Whether `arun` runs functions in the thread that runs the sync code of
+    # the current request (see asgiref.sync.sync_to_async) rather than a
+    # thread pool (which lets renditions be created concurrently).
+    arun_thread_sensitive = False
+
+    def rendition_is_cached(self, url):
+        """Return a truthy value if `url` is marked as created in the cache."""
+        memo = self.rendition_memo
+        if memo is not None and url in memo:
+            send_cache_lookup(self.__class__, url, memo[url])
+            return memo[url]
+        return lookup_cache(self.__class__, url, cache.get)
+
+    async def arendition_is_cached(self, url):
+        """Async version of `rendition_is_cached`."""
+        memo = self.rendition_memo
+        if memo is not None and url in memo:
+            send_cache_lookup(self.__class__, url, memo[url])
+            return memo[url]
+        return await alookup_cache(self.__class__, url, acache_get)
+
+    def arun(self, func, *args):
+        """
+        Return an awaitable that calls `func` (which may block on storage,
+        the cache or PIL) outside of the event loop.
+        """
+        return sync_to_async(
+            func, thread_sensitive=self.arun_thread_sensitive
+        )(*args)
+
+    def mark_rendition_cached(self, url):
+        """Mark `url` as created in both the cache and `rendition_memo`."""
+        cache.set(url, 1, VERSATILEIMAGEFIELD_CACHE_LENGTH)
+        if self.rendition_memo is not None:
+            self.rendition_memo[url] = 1
+
+    def rendition_exists(self, path):
+        """Return True if the rendition at `path` exists on storage."""
+        manifest = self.rendition_manifest
+        if manifest is not None and path in manifest:
+            return True
+        if probe_exists(self.__class__, self.storage, path):
+            if manifest is not None:
+                manifest.add(path)
+            return True
+        return False
+
+    def ensure_rendition_exists(self, path, create, get_job=None):
+        """
+        Call `create` (which saves the rendition at `path` to storage) if
+        the rendition doesn't exist yet.
+
+        Only one process creates a given rendition at a time (see
+        versatileimagefield.locks.RenditionLock); others wait for it to
+        finish.
+
+        If VERSATILEIMAGEFIELD_SETTINGS['create_images_asynchronously'] is
+        True, `get_job` (which returns a RenditionJob) is handed to the
+        rendition task backend instead of calling `create`.
+
+        Returns False if the rendition is still being created (once the
+        wait for another process has run out or, when creating renditions
+        asynchronously, whenever it doesn't exist yet) and True otherwise.
+        """
+        if self.rendition_exists(path):
+            return True
+        if VERSATILEIMAGEFIELD_CREATE_IMAGES_ASYNCHRONOUSLY and get_job:
+            # Whoever holds the lock has already enqueued a job.
+            lock = RenditionLock(path, wait=0)
+            if lock.acquire():
+
+                def get_locked_job():
+                    job = get_job()
+                    job.lock_token = lock.token
+                    return job
+
+                try:
+                    enqueued = get_rendition_backend().submit(get_locked_job)
+                except Exception:
+                    lock.release()
+                    raise
+                if not enqueued:
+                    lock.release()
+            return False
+        lock = RenditionLock(path)
+        if not lock.acquire():
+            return False
+        try:
+            if lock.waited and self.rendition_exists(path):
+                # Created by the process that held the lock.
+                return True
+            create()
+        finally:
+            lock.release()
+        if self.rendition_manifest is not None:
+            self.rendition_manifest.add(path)
+        return True
@@ -1,12 +1,17 @@
 """Datastructures for sizing images."""
+from functools import partial
+
 from django.conf import settings
-from ..settings import (
-    cache,
-    VERSATILEIMAGEFIELD_CACHE_LENGTH
+from ..instrumentation import (
+    get_nbytes,
+    instrument_resolution,
+    instrument_stage
 )
+from ..storage_urls import get_storage_url
+from ..tasks import RenditionJob
 from ..utils import get_resized_path
-from .base import ProcessedImage
-from .mixins import DeleteAndClearCacheMixIn
+from .base import closing_source, ProcessedImage
+from .mixins import DeleteAndClearCacheMixIn, RenditionCacheMixIn
 
 
 class MalformedSizedImageKey(Exception):
@@ -29,7 +34,7 @@ class SizedImageInstance(DeleteAndClearCacheMixIn):
         return self.url
 
 
-class SizedImage(ProcessedImage, dict):
+class SizedImage(RenditionCacheMixIn, ProcessedImage, dict):
     """
     A dict subclass that exposes an image sizing API via key access.
 
@@ -57,6 +62,12 @@ class SizedImage(ProcessedImage, dict):
         else:
             del key
 
+    def get_rendition_job_kwargs(self):
+        """Return the keyword arguments needed to reconstruct `self`."""
+        kwargs = super(SizedImage, self).get_rendition_job_kwargs()
+        kwargs['ppoi'] = self.ppoi
+        return kwargs
+
     def ppoi_as_str(self):
         """Return PPOI value as a string."""
         return "%s__%s" % (
@@ -91,9 +102,9 @@ class SizedImage(ProcessedImage, dict):
             ' assignment.' % self.__class__.__name__
         )
 
-    def __getitem__(self, key):
+    def parse_size_key(self, key):
         """
-        Return a URL to an image sized according to key.
+        Return the width & height (as ints) in `key`.
 
         Arguments:
             * `key`: A string in the following format
@@ -108,52 +119,150 @@ class SizedImage(ProcessedImage, dict):
                 "'`width`x`height`' where both `width` and `height` are "
                 "integers." % self.__class__.__name__
             )
+        return width, height
 
-        if not self.path_to_image and getattr(
+    def use_placeholdit(self):
+        """Return True if http://placehold.it URLs should be returned."""
+        return not self.path_to_image and getattr(
             settings, 'VERSATILEIMAGEFIELD_USE_PLACEHOLDIT', False
-        ):
-            resized_url = "http://placehold.it/%dx%d" % (width, height)
-            resized_storage_path = resized_url
-        else:
-            resized_storage_path = get_resized_path(
+        )
+
+    def get_resized_path_and_url(self, width, height):
+        """
+        Return the path (on self.storage) & URL of the image sized to
+        `width` x `height`.
+        """
+        resized_storage_path = get_resized_path(
+            path_to_image=self.path_to_image,
+            width=width,
+            height=height,
+            filename_key=self.get_filename_key(),
+            storage=self.storage
+        )
+
+        try:
+            resized_url = get_storage_url(
+                self.storage, resized_storage_path
+            )
+        except Exception:  # pragma: no cover
+            resized_url = None
+        return resized_storage_path, resized_url
+
+    def ensure_resized_image(self, resized_storage_path, resized_url,
+                             width, height):
+        """
+        Create the image sized to `width` x `height` (if it doesn't exist
+        yet) and mark it as created in the cache. Returns its URL.
+        """
+        if resized_storage_path and self.ensure_rendition_exists(
+            resized_storage_path,
+            partial(
+                self.create_resized_image,
                 path_to_image=self.path_to_image,
+                save_path_on_storage=resized_storage_path,
                 width=width,
-                height=height,
-                filename_key=self.get_filename_key(),
-                storage=self.storage
+                height=height
+            ),
+            get_job=partial(
+                RenditionJob.for_processor,
+                self,
+                resized_storage_path,
+                resized_url,
+                width=width,
+                height=height
             )
-
-            try:
+        ):
+            if resized_url is None:  # pragma: no cover
                 resized_url = self.storage.url(resized_storage_path)
-            except Exception:  # pragma: no cover
-                resized_url = None
-
-            if self.create_on_demand is True:
-                if cache.get(resized_url) and resized_url is not None:
-                    # The sized path exists in the cache so the image already
-                    # exists. So we `pass` to skip directly to the return
-                    # statement
-                    pass
-                else:
-                    if resized_storage_path and not self.storage.exists(
-                        resized_storage_path
-                    ):
-                        self.create_resized_image(
-                            path_to_image=self.path_to_image,
-                            save_path_on_storage=resized_storage_path,
-                            width=width,
-                            height=height
-                        )
 
-                        resized_url = self.storage.url(resized_storage_path)
+            # Setting a super-long cache for a resized image (30 Days)
+            self.mark_rendition_cached(resized_url)
+        return resized_url
 
-                    # Setting a super-long cache for a resized image (30 Days)
-                    cache.set(resized_url, 1, VERSATILEIMAGEFIELD_CACHE_LENGTH)
-        return SizedImageInstance(
+    def get_sized_image_instance(self, resized_storage_path, resized_url):
+        """Return a SizedImageInstance for a sized image."""
+        sized_image_instance = SizedImageInstance(
             name=resized_storage_path,
             url=resized_url,
             storage=self.storage
         )
+        sized_image_instance.rendition_manifest = self.rendition_manifest
+        sized_image_instance.rendition_memo = self.rendition_memo
+        return sized_image_instance
+
+    def __getitem__(self, key):
+        """
+        Return a URL to an image sized according to key.
+
+        Arguments:
+            * `key`: A string in the following format
+                     '[width-in-pixels]x[height-in-pixels]'
+                     Example: '400x400'
+        """
+        return self.get_sized_image(*self.parse_size_key(key))
+
+    def get_sized_image(self, width, height):
+        """
+        Return a SizedImageInstance of the image sized to `width` x `height`
+        (creating it if need be). `self['400x400']` is equivalent to
+        `self.get_sized_image(400, 400)`.
+        """
+        with instrument_resolution(self.__class__) as event:
+            if self.use_placeholdit():
+                resized_url = "http://placehold.it/%dx%d" % (width, height)
+                resized_storage_path = resized_url
+            else:
+                resized_storage_path, resized_url = (
+                    self.get_resized_path_and_url(width, height)
+                )
+
+                if self.create_on_demand is True:
+                    if resized_url is not None and self.rendition_is_cached(
+                        resized_url
+                    ):
+                        # The sized path exists in the cache so the image
+                        # already exists. So we `pass` to skip directly to
+                        # the return statement
+                        pass
+                    else:
+                        resized_url = self.ensure_resized_image(
+                            resized_storage_path, resized_url, width, height
+                        )
+            event['url'] = resized_url
+        return self.get_sized_image_instance(resized_storage_path, resized_url)
+
+    async def aget(self, key):
+        """
+        Async version of `self[key]`.
+
+        The cache is consulted without blocking the event loop and missing
+        images are created outside of it (see RenditionCacheMixIn.arun) so
+        many renditions can be resolved concurrently with `asyncio.gather`.
+        """
+        return await self.aget_sized_image(*self.parse_size_key(key))
+
+    async def aget_sized_image(self, width, height):
+        """Async version of `get_sized_image`."""
+        if self.create_on_demand is not True or self.use_placeholdit():
+            # No I/O is needed.
+            return self.get_sized_image(width, height)
+
+        with instrument_resolution(self.__class__) as event:
+            resized_storage_path, resized_url = self.get_resized_path_and_url(
+                width, height
+            )
+            if resized_url is None or not await self.arendition_is_cached(
+                resized_url
+            ):
+                resized_url = await self.arun(
+                    self.ensure_resized_image,
+                    resized_storage_path,
+                    resized_url,
+                    width,
+                    height
+                )
+            event['url'] = resized_url
+        return self.get_sized_image_instance(resized_storage_path, resized_url)
 
     def process_image(self, image, image_format, save_kwargs,
                       width, height):
@@ -178,6 +287,22 @@ class SizedImage(ProcessedImage, dict):
             'Subclasses MUST provide a `process_image` method.'
         )
 
+    def get_draft_size(self, image_size, width, height):
+        """
+        Return the minimum size an image must be decoded at.
+
+        Arguments:
+            * `image_size`: The full size of the image being resized, as a
+                            2-tuple of ints.
+            * `width` & `height`: The size (in pixels) of the image to create.
+
+        Used to decode images at reduced scale when possible (see
+        `ProcessedImage.draft_image`). Returning None (the default) ensures
+        images are always decoded at full scale. Subclasses that only ever
+        shrink images should override this method.
+        """
+        return None
+
     def create_resized_image(self, path_to_image, save_path_on_storage,
                              width, height):
         """
@@ -193,17 +318,37 @@ class SizedImage(ProcessedImage, dict):
                         to signify what operation was done to it.
                         Examples: 'crop' or 'scale'
         """
-        image, file_ext, image_format, mime_type = self.retrieve_image(
-            path_to_image
-        )
-
-        image, save_kwargs = self.preprocess(image, image_format)
+        with instrument_stage(
+            self.__class__, 'retrieve_image', path_to_image
+        ) as event:
+            image, file_ext, image_format, mime_type = self.retrieve_image(
+                path_to_image
+            )
+            event['nbytes'] = self.source_nbytes
+        with closing_source(image):
+            image = self.draft_image(
+                image,
+                partial(self.get_draft_size, width=width, height=height)
+            )
 
-        imagefile = self.process_image(
-            image=image,
-            image_format=image_format,
-            save_kwargs=save_kwargs,
-            width=width,
-            height=height
-        )
-        self.save_image(imagefile, save_path_on_storage, file_ext, mime_type)
+            with instrument_stage(self.__class__, 'preprocess', path_to_image):
+                image, save_kwargs = self.preprocess(image, image_format)
+
+            with instrument_stage(
+                self.__class__, 'process_image', save_path_on_storage
+            ) as event:
+                imagefile = self.process_image(
+                    image=image,
+                    image_format=image_format,
+                    save_kwargs=save_kwargs,
+                    width=width,
+                    height=height
+                )
+                event['nbytes'] = get_nbytes(imagefile)
+            with instrument_stage(
+                self.__class__, 'save_image', save_path_on_storage
+            ) as event:
+                self.save_image(
+                    imagefile, save_path_on_storage, file_ext, mime_type
+                )
+                event['nbytes'] = get_nbytes(imagefile)
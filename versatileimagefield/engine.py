@@ -0,0 +1,467 @@
+"""Create multiple renditions of an image from a single decode."""
+from functools import partial
+from io import BytesIO
+import logging
+
+from PIL import Image
+
+from .datastructures import FilteredImage, FilterLibrary
+from .datastructures.base import closing_source
+from .instrumentation import (
+    get_nbytes,
+    instrument_stage,
+    lookup_cache,
+    probe_exists
+)
+from .manifest import get_rendition_manifest
+from .registry import versatileimagefield_registry
+from .settings import cache, VERSATILEIMAGEFIELD_CACHE_LENGTH
+from .storage_urls import get_storage_url
+from .utils import _overrides, parse_image_key
+
+logger = logging.getLogger(__name__)
+
+# Sizers & filters that override any of these customize how their
+# renditions are looked up or created so the RenditionEngine leaves
+# creating them to the sizer or filter itself.
+SIZER_CREATION_METHODS = (
+    '__getitem__',
+    'get_sized_image',
+    'ensure_resized_image',
+    'create_resized_image',
+)
+FILTER_CREATION_METHODS = ('create_filtered_image',)
+
+
+class Rendition(object):
+    """A single sized or filtered rendition of a source image."""
+
+    def __init__(self, processor, path, url, source=None,
+                 width=None, height=None):
+        """
+        Construct a Rendition.
+
+        `processor`: The SizedImage or FilteredImage instance that creates
+                     this rendition.
+        `path`: Where on storage this rendition is saved.
+        `url`: The URL of this rendition.
+        `source`: For sized renditions, the path of the filtered image that
+                  is sized (None if the original image is sized).
+        `width` & `height`: For sized renditions, the intended dimensions.
+        """
+        self.processor = processor
+        self.path = path
+        self.url = url
+        self.source = source
+        self.width = width
+        self.height = height
+        self.exists = False
+        self.failed = False
+
+
+class RenditionEngine(object):
+    """
+    Creates a set of renditions from a single source image.
+
+    Creating renditions one at a time (i.e. via `SizedImage.__getitem__`)
+    retrieves and decodes the source image once per rendition. A
+    RenditionEngine retrieves & decodes the source image once, runs it
+    through the preprocessing API once and then derives every missing
+    sized/filtered rendition from that decoded image. Renditions of sizers &
+    filters that customize how they're looked up or created (see
+    SIZER_CREATION_METHODS) are created through them one at a time instead.
+
+    Constructor arguments:
+        * `path_to_image`: A path to a file within `storage`
+        * `storage`: A django storage class
+        * `ppoi`: A 2-tuple of floats, the Primary Point of Interest used by
+                  sizers (like 'crop') that respect it.
+        * `registry`: The VersatileImageFieldRegistry to look up sizers and
+                      filters on. Defaults to versatileimagefield_registry.
+    """
+
+    def __init__(self, path_to_image, storage, ppoi=(0.5, 0.5),
+                 registry=versatileimagefield_registry):
+        """Construct a RenditionEngine."""
+        self.path_to_image = path_to_image
+        self.storage = storage
+        self.ppoi = ppoi
+        self.registry = registry
+        # The URLs & paths of every rendition found on (or saved to) storage
+        # by the most recent call to `create_renditions`.
+        self.available_urls = []
+        self.available_paths = []
+        # The number of bytes saved to storage by `create_renditions`.
+        self.bytes_written = 0
+
+    @classmethod
+    def from_field_file(cls, versatileimagefieldfile):
+        """Return a RenditionEngine for a VersatileImageFieldFile instance."""
+        path_to_image = versatileimagefieldfile.name
+        if not path_to_image:
+            path_to_image = versatileimagefieldfile.field.placeholder_image_name
+        return cls(
+            path_to_image,
+            versatileimagefieldfile.storage,
+            ppoi=versatileimagefieldfile.ppoi
+        )
+
+    def get_filtered_rendition(self, filter_name):
+        """Return a Rendition for the filter registered to `filter_name`."""
+        filtered_image = self.registry._filter_registry[filter_name](
+            path_to_image=self.path_to_image,
+            storage=self.storage,
+            create_on_demand=False,
+            filename_key=filter_name
+        )
+        return Rendition(filtered_image, filtered_image.name, filtered_image.url)
+
+    def get_sized_rendition(self, sizer_name, width, height, filtered=None):
+        """
+        Return a Rendition for the sizer registered to `sizer_name`.
+
+        If `filtered` (a filtered Rendition) is passed, the filtered image
+        will be sized instead of the original.
+        """
+        source = self.path_to_image if filtered is None else filtered.path
+        sized_image = self.registry._sizedimage_registry[sizer_name](
+            path_to_image=source,
+            storage=self.storage,
+            create_on_demand=False,
+            ppoi=self.ppoi
+        )
+        path, url = sized_image.get_resized_path_and_url(width, height)
+        return Rendition(
+            sized_image,
+            path,
+            get_storage_url(self.storage, path) if url is None else url,
+            source=None if filtered is None else filtered.path,
+            width=width,
+            height=height
+        )
+
+    def creates_on_demand(self, filter_name, sizer_name):
+        """
+        Return True if the filter registered to `filter_name` or the sizer
+        registered to `sizer_name` customizes how its renditions are looked
+        up or created (see SIZER_CREATION_METHODS & FILTER_CREATION_METHODS).
+        """
+        if filter_name is not None and any(
+            _overrides(
+                self.registry._filter_registry[filter_name],
+                method_name,
+                FilteredImage
+            )
+            for method_name in FILTER_CREATION_METHODS
+        ):
+            return True
+        return sizer_name is not None and any(
+            _overrides(
+                self.registry._sizedimage_registry[sizer_name], method_name
+            )
+            for method_name in SIZER_CREATION_METHODS
+        )
+
+    def create_on_demand(self, filter_name, sizer_name, width, height):
+        """
+        Return a list of the Renditions of a size key created one at a
+        time through its filter & sizer (i.e. `sizer['400x400']`) exactly
+        as they're created when accessed from a template.
+
+        Unlike the rest of `create_renditions` this consults the cache
+        (for locks) and marks the renditions as created in it.
+        """
+        renditions = []
+        source = None
+        if filter_name is not None:
+            source = FilterLibrary(
+                self.path_to_image,
+                self.storage,
+                self.registry,
+                self.ppoi,
+                create_on_demand=True
+            )[filter_name]
+            renditions.append(Rendition(source, source.name, source.url))
+        if sizer_name is not None:
+            if source is None:
+                sizer = self.registry._sizedimage_registry[sizer_name](
+                    path_to_image=self.path_to_image,
+                    storage=self.storage,
+                    create_on_demand=True,
+                    ppoi=self.ppoi
+                )
+            else:
+                sizer = getattr(source, sizer_name)
+            sized = sizer['{}x{}'.format(width, height)]
+            renditions.append(Rendition(
+                sizer,
+                sized.name,
+                sized.url,
+                source=None if source is None else source.name,
+                width=width,
+                height=height
+            ))
+        for rendition in renditions:
+            rendition.exists = True
+        return renditions
+
+    def create_renditions(self, size_key_list, use_cache=True):
+        """
+        Create every missing rendition in `size_key_list`.
+
+        Arguments:
+            * `size_key_list`: A list of VersatileImageField size keys.
+                               Examples: 'crop__800x450', 'filters__invert__url'
+            * `use_cache`: bool signifying whether the cache should be checked
+                           for (and updated with) created renditions.
+
+        Returns a list of 2-tuples (one for each key in `size_key_list`):
+            [0]: bool signifying whether the rendition is available
+            [1]: The url of the rendition OR the path on storage of the
+                 image the rendition could not be created from.
+        """
+        if not self.path_to_image:
+            return [(False, self.path_to_image) for key in size_key_list]
+
+        filtered_renditions = {}
+        sized_renditions = {}
+        on_demand_renditions = []
+        renditions_by_key = []
+        for size_key in size_key_list:
+            try:
+                filter_name, sizer_name, width, height = parse_image_key(
+                    size_key
+                )
+                if self.creates_on_demand(filter_name, sizer_name):
+                    renditions = self.create_on_demand(
+                        filter_name, sizer_name, width, height
+                    )
+                    on_demand_renditions.extend(renditions)
+                    renditions_by_key.append(renditions)
+                    continue
+                renditions = []
+                filtered = None
+                if filter_name is not None:
+                    if filter_name not in filtered_renditions:
+                        filtered_renditions[filter_name] = \
+                            self.get_filtered_rendition(filter_name)
+                    filtered = filtered_renditions[filter_name]
+                    renditions.append(filtered)
+                if sizer_name is not None:
+                    sized_key = (filter_name, sizer_name, width, height)
+                    if sized_key not in sized_renditions:
+                        sized_renditions[sized_key] = self.get_sized_rendition(
+                            sizer_name, width, height, filtered
+                        )
+                    renditions.append(sized_renditions[sized_key])
+            except Exception:
+                logger.exception('Thumbnail generation failed',
+                                 extra={'path': self.path_to_image})
+                renditions = None
+            renditions_by_key.append(renditions)
+
+        manifest = None
+        if use_cache:
+            manifest = get_rendition_manifest(self.path_to_image)
+        for rendition in list(filtered_renditions.values()) + list(
+            sized_renditions.values()
+        ):
+            sender = rendition.processor.__class__
+            if use_cache and lookup_cache(sender, rendition.url, cache.get):
+                rendition.exists = True
+            elif (manifest is not None and rendition.path in manifest) or (
+                probe_exists(sender, self.storage, rendition.path)
+            ):
+                rendition.exists = True
+                if use_cache:
+                    cache.set(
+                        rendition.url, 1, VERSATILEIMAGEFIELD_CACHE_LENGTH
+                    )
+
+        try:
+            self.render(
+                filtered_renditions,
+                [r for r in sized_renditions.values() if not r.exists],
+                use_cache
+            )
+        except Exception:
+            logger.exception('Thumbnail generation failed',
+                             extra={'path': self.path_to_image})
+            for rendition in list(filtered_renditions.values()) + list(
+                sized_renditions.values()
+            ):
+                if not rendition.exists:
+                    rendition.failed = True
+
+        available = [
+            rendition
+            for rendition in list(filtered_renditions.values()) + list(
+                sized_renditions.values()
+            )
+            if rendition.exists
+        ] + on_demand_renditions
+        self.available_urls = [rendition.url for rendition in available]
+        self.available_paths = [rendition.path for rendition in available]
+        if manifest is not None:
+            if not manifest.paths.issuperset(self.available_paths):
+                manifest.update(self.available_paths)
+        to_return = []
+        for renditions in renditions_by_key:
+            if renditions is None or any(r.failed for r in renditions):
+                to_return.append((False, self.path_to_image))
+            elif renditions:
+                to_return.append((True, renditions[-1].url))
+            else:
+                to_return.append((True, self.storage.url(self.path_to_image)))
+        return to_return
+
+    @staticmethod
+    def get_draft_size(image_size, sized_renditions):
+        """
+        Return the minimum size an image must be decoded at to create all of
+        `sized_renditions` (or None if any of them need the full image).
+        """
+        draft_width = draft_height = 0
+        for rendition in sized_renditions:
+            draft_size = rendition.processor.get_draft_size(
+                image_size, rendition.width, rendition.height
+            )
+            if draft_size is None:
+                return None
+            draft_width = max(draft_width, draft_size[0])
+            draft_height = max(draft_height, draft_size[1])
+        return (draft_width, draft_height)
+
+    def preprocess(self, processor, image, image_format, preprocessed):
+        """
+        Return `image` preprocessed by `processor` (a ProcessedImage).
+
+        `preprocessed` is a dict used to ensure processors that share the same
+        preprocessing methods only preprocess `image` once.
+        """
+        processor_cls = processor.__class__
+        key = (
+            processor_cls.preprocess,
+            getattr(processor_cls, 'preprocess_%s' % image_format, None)
+        )
+        if key not in preprocessed:
+            with instrument_stage(
+                processor_cls, 'preprocess', self.path_to_image
+            ):
+                preprocessed[key] = processor.preprocess(image, image_format)
+        return preprocessed[key]
+
+    def render(self, filtered_renditions, sized_renditions, use_cache):
+        """
+        Create (and save) missing renditions from a single decode.
+
+        `filtered_renditions`: A dict of filter name -> filtered Rendition.
+            Filters are applied if their Rendition doesn't exist yet or if
+            any sized rendition in `sized_renditions` is built from them.
+        `sized_renditions`: A list of sized Renditions to create.
+        """
+        needed_sources = set(
+            rendition.source for rendition in sized_renditions
+        )
+        filtered_to_render = [
+            rendition for rendition in filtered_renditions.values()
+            if not rendition.exists or rendition.path in needed_sources
+        ]
+        if not filtered_to_render and not sized_renditions:
+            return
+
+        processor = (filtered_to_render or sized_renditions)[0].processor
+        with instrument_stage(
+            processor.__class__, 'retrieve_image', self.path_to_image
+        ) as event:
+            image, file_ext, image_format, mime_type = processor.retrieve_image(
+                self.path_to_image
+            )
+            event['nbytes'] = processor.source_nbytes
+        with closing_source(image):
+            if not filtered_to_render:
+                # Only sized renditions of the original image are being created
+                # so it can be decoded at the smallest scale all of them allow.
+                image = processor.draft_image(
+                    image,
+                    partial(self.get_draft_size, sized_renditions=sized_renditions)
+                )
+            # {source path (None for the original): (PIL Image, preprocessed)}
+            sources = {None: (image, {})}
+
+            for rendition in filtered_to_render:
+                filtered_image = rendition.processor
+                try:
+                    base, save_kwargs = self.preprocess(
+                        filtered_image, image, image_format, sources[None][1]
+                    )
+                    with instrument_stage(
+                        filtered_image.__class__, 'process_image', rendition.path
+                    ) as event:
+                        imagefile = filtered_image.process_image(
+                            base.copy(), image_format, dict(save_kwargs)
+                        )
+                        event['nbytes'] = get_nbytes(imagefile)
+                    if not rendition.exists:
+                        with instrument_stage(
+                            filtered_image.__class__, 'save_image', rendition.path
+                        ) as event:
+                            filtered_image.save_image(
+                                imagefile, rendition.path, file_ext, mime_type
+                            )
+                            event['nbytes'] = get_nbytes(imagefile)
+                        self.bytes_written += len(imagefile.getvalue())
+                        rendition.exists = True
+                        if use_cache:
+                            cache.set(
+                                rendition.url, 1, VERSATILEIMAGEFIELD_CACHE_LENGTH
+                            )
+                except Exception:
+                    logger.exception('Thumbnail generation failed',
+                                     extra={'path': self.path_to_image})
+                    rendition.failed = True
+                else:
+                    sources[rendition.path] = (
+                        Image.open(BytesIO(imagefile.getvalue())), {}
+                    )
+
+            for rendition in sized_renditions:
+                if rendition.source not in sources:
+                    # The filtered image this rendition is sized from failed.
+                    rendition.failed = True
+                    continue
+                source, preprocessed = sources[rendition.source]
+                sized_image = rendition.processor
+                try:
+                    base, save_kwargs = self.preprocess(
+                        sized_image, source, image_format, preprocessed
+                    )
+                    with instrument_stage(
+                        sized_image.__class__, 'process_image', rendition.path
+                    ) as event:
+                        imagefile = sized_image.process_image(
+                            image=base.copy(),
+                            image_format=image_format,
+                            save_kwargs=dict(save_kwargs),
+                            width=rendition.width,
+                            height=rendition.height
+                        )
+                        event['nbytes'] = get_nbytes(imagefile)
+                    with instrument_stage(
+                        sized_image.__class__, 'save_image', rendition.path
+                    ) as event:
+                        sized_image.save_image(
+                            imagefile, rendition.path, file_ext, mime_type
+                        )
+                        event['nbytes'] = get_nbytes(imagefile)
+                    self.bytes_written += len(imagefile.getvalue())
+                except Exception:
+                    logger.exception('Thumbnail generation failed',
+                                     extra={'path': self.path_to_image})
+                    rendition.failed = True
+                else:
+                    rendition.exists = True
+                    if use_cache:
+                        cache.set(
+                            rendition.url, 1, VERSATILEIMAGEFIELD_CACHE_LENGTH
+                        )
@@ -108,6 +108,7 @@ class VersatileImageFileDescriptor(ImageFileDescriptor):
 
         # That was fun, wasn't it?
         # Finally, ensure all the sizers/filters are available after pickling
+        # (they're only rebuilt if ppoi or create_on_demand have changed).
         to_return = instance.__dict__[self.field.name]
         to_return.build_filters_and_sizers(to_return.ppoi, to_return.create_on_demand)
         instance.__dict__[self.field.name] = to_return
@@ -1,13 +1,29 @@
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait
+)
 from functools import reduce
+import json
 import logging
+import os
 from sys import stdout
+import threading
 
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Model
 from django.db.models.query import QuerySet
+from django.utils.module_loading import import_string
 
+from .engine import RenditionEngine
+from .manifest import get_rendition_manifest
+from .settings import cache, VERSATILEIMAGEFIELD_CACHE_LENGTH
 from .utils import (
     get_rendition_key_set,
-    get_url_from_image_key,
     validate_versatileimagefield_sizekey_list
 )
 
@@ -32,7 +48,7 @@ def cli_progress_bar(start, end, bar_length=50):
     Based on an implementation found here:
         http://stackoverflow.com/a/13685020/1149774
     """
-    percent = float(start) / end
+    percent = min(float(start) / end, 1.0) if end else 1.0
     hashes = '#' * int(round(percent * bar_length))
     spaces = '-' * (bar_length - len(hashes))
     stdout.write(
@@ -46,13 +62,162 @@ def cli_progress_bar(start, end, bar_length=50):
     stdout.flush()
 
 
+class FileCheckpoint(object):
+    """
+    Persists the progress of a VersatileImageFieldWarmer to a JSON file at
+    `path` so an interrupted run can be resumed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Return the saved state (or None if nothing has been saved)."""
+        try:
+            with open(self.path) as checkpoint_file:
+                return json.load(checkpoint_file)
+        except FileNotFoundError:
+            return None
+
+    def save(self, state):
+        """Save `state` (a JSON-serializable dict)."""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as checkpoint_file:
+            json.dump(state, checkpoint_file, cls=DjangoJSONEncoder)
+        # Replacing the checkpoint in a single step ensures an interrupted
+        # save never leaves a partially written checkpoint behind.
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """Remove any saved state."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class CacheCheckpoint(object):
+    """
+    Persists the progress of a VersatileImageFieldWarmer to `key` on
+    VERSATILEIMAGEFIELD_CACHE_NAME so an interrupted run can be resumed.
+    """
+
+    def __init__(self, key, timeout=None):
+        self.key = key
+        self.timeout = timeout
+
+    def load(self):
+        """Return the saved state (or None if nothing has been saved)."""
+        return cache.get(self.key)
+
+    def save(self, state):
+        """Save `state`."""
+        cache.set(self.key, state, self.timeout)
+
+    def clear(self):
+        """Remove any saved state."""
+        cache.delete(self.key)
+
+
+def only_image_attr(queryset, image_attr):
+    """
+    Return `queryset` trimmed down to the columns required to access the
+    VersatileImageField at `image_attr` (a dot-notated path to the field),
+    following relations with select_related.
+    """
+    relations = image_attr.split(".")
+    field_name = relations.pop()
+    model = queryset.model
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    field = model._meta.get_field(field_name)
+    prefix = ''.join(relation + '__' for relation in relations)
+    only = [prefix + field.name]
+    for attname in (field.ppoi_field, field.width_field, field.height_field):
+        if attname:
+            only.append(prefix + attname)
+    if relations:
+        queryset = queryset.select_related('__'.join(relations))
+    return queryset.only(*only)
+
+
+_worker_state = threading.local()
+
+
+def _init_worker():
+    """Prepare a freshly spawned worker process to create renditions."""
+    if not apps.ready:  # pragma: no cover
+        import django
+        django.setup()
+
+
+def _get_worker_storage(model_label, field_name):
+    """
+    Return a storage class for the field named `field_name` on the model
+    labelled `model_label` that is private to the calling worker.
+
+    Storage classes often hold connections (to S3 et al) that are not safe
+    to share across threads or processes so each worker instantiates its
+    own from the field's deconstructed storage.
+    """
+    storages = _worker_state.__dict__.setdefault('storages', {})
+    key = (model_label, field_name)
+    if key not in storages:
+        storage = apps.get_model(model_label)._meta.get_field(
+            field_name
+        ).storage
+        try:
+            path, args, kwargs = storage.deconstruct()
+        except AttributeError:  # pragma: no cover
+            storages[key] = storage
+        else:
+            storages[key] = import_string(path)(*args, **kwargs)
+    return storages[key]
+
+
+def _warm_work_unit(work_unit):
+    """
+    Create the renditions described by `work_unit` (see
+    `VersatileImageFieldWarmer.get_work_unit`) within a worker.
+
+    Workers do not touch the cache: they return a 4-tuple of the
+    `RenditionEngine.create_renditions` results, the URLs & paths of the
+    renditions now on storage (so the warming process can record them) and
+    the number of bytes written to storage.
+    """
+    model_label, field_name, path_to_image, ppoi, size_key_list = work_unit
+    try:
+        engine = RenditionEngine(
+            path_to_image,
+            _get_worker_storage(model_label, field_name),
+            ppoi=ppoi
+        )
+        return (
+            engine.create_renditions(size_key_list, use_cache=False),
+            engine.available_urls,
+            engine.available_paths,
+            engine.bytes_written
+        )
+    except Exception:
+        logger.exception('Thumbnail generation failed',
+                         extra={'path': path_to_image})
+        return ([(False, path_to_image) for key in size_key_list], [], [], 0)
+
+
 class VersatileImageFieldWarmer(object):
     """
     A class for creating sets of images from a VersatileImageField
     """
 
+    executors = {
+        'process': ProcessPoolExecutor,
+        'thread': ThreadPoolExecutor,
+    }
+
     def __init__(self, instance_or_queryset,
-                 rendition_key_set, image_attr, verbose=False):
+                 rendition_key_set, image_attr, verbose=False,
+                 workers=1, executor='process', chunk_size=2000, total=None,
+                 checkpoint=None, resume=True, checkpoint_every=100):
         """
         Arguments:
         `instance_or_queryset`: A django model instance or QuerySet
@@ -71,6 +236,35 @@ class VersatileImageFieldWarmer(object):
                       `instance_or_queryset`
         `verbose`: bool signifying whether a progress bar should be printed
                    to sys.stdout
+        `workers`: The number of images to create renditions for in
+                   parallel. The default (1) warms images one at a time
+                   in the calling thread.
+        `executor`: Either 'process' (the default) or 'thread'; how
+                    renditions are created when `workers` is more than 1.
+                    Image processing is CPU-bound so processes scale best;
+                    threads avoid the cost of starting new processes.
+        `chunk_size`: How many instances are fetched from the database at a
+                      time. Instances are streamed (not cached on the
+                      queryset) so memory use stays flat no matter how many
+                      instances are warmed.
+        `total`: The number of instances being warmed (an estimate is fine),
+                 only used to draw the progress bar when `verbose` is True.
+                 If not provided `instance_or_queryset` will be counted.
+        `checkpoint`: A FileCheckpoint or CacheCheckpoint. If provided,
+                      how far `warm` has progressed (along with any
+                      failures) is saved to it as `warm` progresses.
+                      Unordered querysets are warmed in primary key order
+                      and resumed after the primary key of the last warmed
+                      instance; ordered querysets keep their ordering (with
+                      the primary key breaking ties) and are resumed after
+                      the number of instances already warmed. Sliced
+                      querysets can't be checkpointed. The checkpoint is
+                      cleared once `warm` completes.
+        `resume`: bool signifying whether a run interrupted before it
+                  completed should be resumed from `checkpoint` (skipping
+                  instances it already warmed) or started over.
+        `checkpoint_every`: How many instances are warmed between saves to
+                            `checkpoint`.
         """
         if isinstance(instance_or_queryset, Model):
             queryset = instance_or_queryset.__class__._default_manager.filter(
@@ -83,6 +277,15 @@ class VersatileImageFieldWarmer(object):
                 "Only django model instances or QuerySets can be processed by "
                 "{}".format(self.__class__.__name__)
             )
+        # Query.is_sliced was only added in Django 3.1.
+        if checkpoint is not None and (
+            queryset.query.low_mark or queryset.query.high_mark is not None
+        ):
+            raise ValueError(
+                "Sliced QuerySets can't be checkpointed by {} (warming can't "
+                "be resumed from a position within a slice); filter the "
+                "QuerySet instead.".format(self.__class__.__name__)
+            )
         self.queryset = queryset
         if isinstance(rendition_key_set, str):
             rendition_key_set = get_rendition_key_set(rendition_key_set)
@@ -94,33 +297,252 @@ class VersatileImageFieldWarmer(object):
         ]
         self.image_attr = image_attr
         self.verbose = verbose
+        if executor not in self.executors:
+            raise ValueError(
+                "`executor` must be one of: {}".format(
+                    ', '.join(sorted(self.executors))
+                )
+            )
+        self.workers = max(int(workers), 1)
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.total = total
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.checkpoint_every = checkpoint_every
+        # The primary key (unordered querysets) or number of instances
+        # (ordered querysets) warming (re)starts after; set by `warm`.
+        self.resume_after_pk = None
+        self.resume_offset = 0
+        # The number of bytes saved to storage by `warm`.
+        self.bytes_written = 0
 
-    @staticmethod
-    def _prewarm_versatileimagefield(size_key, versatileimagefieldfile):
+    def _prewarm_versatileimagefield(self, size_key_list,
+                                     versatileimagefieldfile):
         """
-        Returns a 2-tuple:
+        Returns a list of 2-tuples (one for each key in `size_key_list`):
         0: bool signifying whether the image was successfully pre-warmed
         1: The url of the successfully created image OR the path on storage of
            the image that was not able to be successfully created.
 
+        The source image is retrieved & decoded (at most) once no matter
+        how many renditions are created from it.
+
         Arguments:
         `size_key_list`: A list of VersatileImageField size keys. Examples:
             * 'crop__800x450'
             * 'thumbnail__800x800'
         `versatileimagefieldfile`: A VersatileImageFieldFile instance
         """
-        versatileimagefieldfile.create_on_demand = True
-        try:
-            url = get_url_from_image_key(versatileimagefieldfile, size_key)
-        except Exception:  # pragma: no cover
-            success = False
-            url_or_filepath = versatileimagefieldfile.name
-            logger.exception('Thumbnail generation failed',
-                             extra={'path': url_or_filepath})
+        engine = RenditionEngine.from_field_file(versatileimagefieldfile)
+        results = engine.create_renditions(size_key_list)
+        self.bytes_written += engine.bytes_written
+        return results
+
+    def get_queryset(self):
+        """
+        Return `self.queryset` trimmed down to the columns required to warm
+        `self.image_attr`.
+        """
+        return only_image_attr(self.queryset, self.image_attr)
+
+    def get_ordering(self):
+        """
+        Return the ordering instances are warmed in when `self.checkpoint`
+        is set: the ordering of `self.queryset` (with the primary key
+        breaking ties so resuming by offset is deterministic) or None if it
+        isn't ordered (in which case instances are warmed in primary key
+        order).
+        """
+        if not self.queryset.ordered:
+            return None
+        query = self.queryset.query
+        ordering = list(query.order_by or (
+            self.queryset.model._meta.ordering if query.default_ordering
+            else ()
+        ))
+        return ordering + ['pk']
+
+    def resume_queryset(self, queryset):
+        """
+        Return `queryset` ordered (and, if resuming, trimmed) so warming
+        proceeds from the progress loaded from `self.checkpoint`.
+        """
+        if self.checkpoint is None:
+            return queryset
+        ordering = self.get_ordering()
+        if ordering is None:
+            queryset = queryset.order_by('pk')
+            if self.resume_after_pk is not None:
+                queryset = queryset.filter(pk__gt=self.resume_after_pk)
+            return queryset
+        queryset = queryset.order_by(*ordering)
+        if self.resume_offset:
+            queryset = queryset[self.resume_offset:]
+        return queryset
+
+    def iterator(self):
+        """Stream the instances to warm from the database."""
+        return self.resume_queryset(self.get_queryset()).iterator(
+            chunk_size=self.chunk_size
+        )
+
+    @property
+    def checkpoint_job(self):
+        """
+        Identifies what `self` warms so checkpoints saved by a different
+        warming job aren't resumed from.
+        """
+        ordering = self.get_ordering()
+        return [
+            self.queryset.model._meta.label,
+            self.image_attr,
+            sorted(self.size_key_list),
+            ordering and [str(field) for field in ordering]
+        ]
+
+    def load_checkpoint(self):
+        """
+        Return a 3-tuple of the progress saved to `self.checkpoint`:
+        [0]: The primary key of the last warmed instance (None if warming
+             should start from the beginning)
+        [1]: The number of instances warmed
+        [2]: A list of the paths that have failed so far
+        """
+        if self.checkpoint is None:
+            return None, 0, []
+        if not self.resume:
+            self.checkpoint.clear()
+            return None, 0, []
+        state = self.checkpoint.load()
+        if not state or state.get('job') != self.checkpoint_job:
+            return None, 0, []
+        return state['last_pk'], state['warmed'], list(state['failed'])
+
+    def save_checkpoint(self, last_pk, num_warmed,
+                        failed_to_create_image_path_list):
+        """Save the progress of `warm` to `self.checkpoint`."""
+        self.checkpoint.save({
+            'job': self.checkpoint_job,
+            'last_pk': last_pk,
+            'warmed': num_warmed,
+            'failed': failed_to_create_image_path_list,
+        })
+
+    def get_work_unit(self, instance):
+        """
+        Return a picklable description of the renditions to create for the
+        VersatileImageField of `instance`:
+        [0]: The label of the model the field is defined on
+        [1]: The name of the field
+        [2]: The path of the image on the field's storage
+        [3]: The image's PPOI
+        [4]: The list of size keys to create
+        """
+        versatileimagefieldfile = reduce(
+            getattr, self.image_attr.split("."), instance
+        )
+        field = versatileimagefieldfile.field
+        engine = RenditionEngine.from_field_file(versatileimagefieldfile)
+        return (
+            field.model._meta.label,
+            field.name,
+            engine.path_to_image,
+            engine.ppoi,
+            self.size_key_list
+        )
+
+    def _warm_in_parallel(self):
+        """
+        Yield a 3-tuple for each instance in `self.queryset` (in completion
+        order) as its renditions are created by a pool of `self.workers`
+        workers:
+        [0]: The primary key of the last instance every instance before
+             (and including) has been warmed; None until the first instance
+             submitted has been warmed.
+        [1]: The number of instances (including any skipped by resuming)
+             warmed up to and including [0].
+        [2]: The `_prewarm_versatileimagefield`-style results.
+        """
+        if self.executor == 'process':
+            pool = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker
+            )
         else:
-            success = True
-            url_or_filepath = url
-        return (success, url_or_filepath)
+            pool = ThreadPoolExecutor(max_workers=self.workers)
+        # Bound the number of queued work units so large querysets aren't
+        # loaded into memory all at once.
+        max_pending = self.workers * 2
+        pending = {}
+        # Instances are tracked by their position in the queryset (rather
+        # than their primary key) so the count warmed through is exact.
+        submitted = deque()
+        warmed_positions = set()
+        warmed_through_pk = None
+        warmed_through = self.resume_offset
+        with pool:
+            instances = enumerate(self.iterator(), self.resume_offset)
+            while True:
+                for position, instance in instances:
+                    work_unit = self.get_work_unit(instance)
+                    future = pool.submit(_warm_work_unit, work_unit)
+                    pending[future] = (position, work_unit[2])
+                    submitted.append((position, instance.pk))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+                done = wait(pending, return_when=FIRST_COMPLETED).done
+                for future in done:
+                    position, path_to_image = pending.pop(future)
+                    warmed_positions.add(position)
+                    while submitted and submitted[0][0] in warmed_positions:
+                        position, warmed_through_pk = submitted.popleft()
+                        warmed_positions.remove(position)
+                        warmed_through = position + 1
+                    yield (
+                        warmed_through_pk,
+                        warmed_through,
+                        self._record_worker_result(
+                            path_to_image, future.result()
+                        )
+                    )
+
+    def _record_worker_result(self, path_to_image, worker_result):
+        """
+        Mark the renditions a worker found or created (from the image at
+        `path_to_image`) as cached and return its `create_renditions`
+        results.
+        """
+        results, available_urls, available_paths, bytes_written = \
+            worker_result
+        self.bytes_written += bytes_written
+        if available_urls:
+            cache.set_many(
+                dict.fromkeys(available_urls, 1),
+                VERSATILEIMAGEFIELD_CACHE_LENGTH
+            )
+            manifest = get_rendition_manifest(path_to_image)
+            if manifest is not None:
+                manifest.update(available_paths)
+        return results
+
+    def _warm_serially(self):
+        """
+        Yield a 3-tuple for each instance in `self.queryset`:
+        [0]: The primary key of the instance
+        [1]: The number of instances (including any skipped by resuming)
+             warmed up to and including the instance.
+        [2]: The `_prewarm_versatileimagefield` results.
+        """
+        for warmed_through, instance in enumerate(
+            self.iterator(), self.resume_offset + 1
+        ):
+            yield instance.pk, warmed_through, \
+                self._prewarm_versatileimagefield(
+                    self.size_key_list,
+                    reduce(getattr, self.image_attr.split("."), instance)
+                )
 
     def warm(self):
         """
@@ -131,24 +553,48 @@ class VersatileImageFieldWarmer(object):
              files that could not be successfully seeded.
         """
         num_images_pre_warmed = 0
-        failed_to_create_image_path_list = []
-        total = self.queryset.count() * len(self.size_key_list)
-        for a, instance in enumerate(self.queryset, start=1):
-            for b, size_key in enumerate(self.size_key_list, start=1):
-                success, url_or_filepath = self._prewarm_versatileimagefield(
-                    size_key,
-                    reduce(getattr, self.image_attr.split("."), instance)
-                )
+        self.bytes_written = 0
+        self.resume_after_pk, self.resume_offset, \
+            failed_to_create_image_path_list = self.load_checkpoint()
+        if self.verbose:
+            total = self.total
+            if total is None:
+                total = self.resume_queryset(self.queryset).count()
+            total *= len(self.size_key_list)
+        if self.workers > 1:
+            results_by_instance = self._warm_in_parallel()
+        else:
+            results_by_instance = self._warm_serially()
+        for num_warmed, (warmed_through_pk, warmed_through, results) in \
+                enumerate(results_by_instance, 1):
+            for success, url_or_filepath in results:
                 if success is True:
                     num_images_pre_warmed += 1
                     if self.verbose:
                         cli_progress_bar(num_images_pre_warmed, total)
                 else:  # pragma: no cover
                     failed_to_create_image_path_list.append(url_or_filepath)
-
-                if a * b == total and self.verbose:
-                    stdout.write('\n')
+            if self.checkpoint is not None and warmed_through_pk is not None:
+                if num_warmed % self.checkpoint_every == 0:
+                    self.save_checkpoint(
+                        warmed_through_pk, warmed_through,
+                        failed_to_create_image_path_list
+                    )
+        if self.checkpoint is not None:
+            self.checkpoint.clear()
 
         if self.verbose:
+            if num_images_pre_warmed:
+                stdout.write('\n')
             stdout.flush()
         return (num_images_pre_warmed, failed_to_create_image_path_list)
+
+    async def awarm(self):
+        """
+        Async version of `warm`.
+
+        Warming runs in the thread that runs the sync code of the current
+        request (like the ORM, which `warm` queries) so the event loop isn't
+        blocked. Use `workers` to create renditions in parallel.
+        """
+        return await sync_to_async(self.warm)()
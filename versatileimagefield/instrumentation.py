@@ -0,0 +1,363 @@
+"""Time the stages of the rendition pipeline and aggregate the results."""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+import time
+
+from .signals import (
+    rendition_cache_lookup,
+    rendition_exists_probe,
+    rendition_resolved,
+    rendition_stage_finished,
+    rendition_stage_started,
+)
+
+STAGES = ('retrieve_image', 'preprocess', 'process_image', 'save_image')
+
+
+def new_stage_totals():
+    """Return the totals RenditionStatsCollector keeps for each stage."""
+    return {
+        'count': 0,
+        'failures': 0,
+        'duration': 0.0,
+        'max_duration': 0.0,
+        'nbytes': 0,
+    }
+
+
+@contextmanager
+def instrument_stage(sender, stage, path):
+    """
+    Send rendition_stage_started & rendition_stage_finished around the
+    block this wraps (if either has receivers).
+
+    Yields a dict; set its 'nbytes' key to report a byte count with
+    rendition_stage_finished. rendition_stage_finished is sent (with the
+    exception) even if the block raises.
+    """
+    event = {}
+    if not rendition_stage_started.has_listeners(sender) and not (
+        rendition_stage_finished.has_listeners(sender)
+    ):
+        yield event
+        return
+    rendition_stage_started.send(sender=sender, stage=stage, path=path)
+    start = time.perf_counter()
+    exception = None
+    try:
+        yield event
+    except BaseException as e:
+        exception = e
+        raise
+    finally:
+        rendition_stage_finished.send(
+            sender=sender,
+            stage=stage,
+            path=path,
+            duration=time.perf_counter() - start,
+            nbytes=event.get('nbytes'),
+            exception=exception
+        )
+
+
+@contextmanager
+def instrument_resolution(sender):
+    """
+    Send rendition_resolved (if it has receivers) once the block this wraps
+    (which resolves a rendition) finishes.
+
+    Yields a dict; its 'url' key must be set to the URL of the rendition.
+    rendition_resolved is sent (with the exception) even if the block
+    raises.
+    """
+    event = {}
+    if not rendition_resolved.has_listeners(sender):
+        yield event
+        return
+    start = time.perf_counter()
+    exception = None
+    try:
+        yield event
+    except BaseException as e:
+        exception = e
+        raise
+    finally:
+        rendition_resolved.send(
+            sender=sender,
+            url=event.get('url'),
+            duration=time.perf_counter() - start,
+            exception=exception
+        )
+
+
+def get_nbytes(imagefile):
+    """
+    Return the size (in bytes) of `imagefile` (as returned by a
+    `process_image` method) or None if it isn't a BytesIO instance.
+    """
+    if hasattr(imagefile, 'getvalue'):
+        return len(imagefile.getvalue())
+    return None
+
+
+def send_cache_lookup(sender, url, hit, duration=0.0):
+    """Send rendition_cache_lookup (if it has receivers)."""
+    if rendition_cache_lookup.has_listeners(sender):
+        rendition_cache_lookup.send(
+            sender=sender, url=url, hit=bool(hit), duration=duration
+        )
+
+
+def lookup_cache(sender, url, get):
+    """
+    Return `get(url)` (a cache lookup), sending rendition_cache_lookup (if
+    it has receivers).
+    """
+    if not rendition_cache_lookup.has_listeners(sender):
+        return get(url)
+    start = time.perf_counter()
+    cached = get(url)
+    send_cache_lookup(sender, url, cached, time.perf_counter() - start)
+    return cached
+
+
+async def alookup_cache(sender, url, aget):
+    """Async version of `lookup_cache` (`aget` is a coroutine function)."""
+    if not rendition_cache_lookup.has_listeners(sender):
+        return await aget(url)
+    start = time.perf_counter()
+    cached = await aget(url)
+    send_cache_lookup(sender, url, cached, time.perf_counter() - start)
+    return cached
+
+
+def probe_exists(sender, storage, path):
+    """
+    Return `storage.exists(path)`, sending rendition_exists_probe (if it
+    has receivers).
+    """
+    if not rendition_exists_probe.has_listeners(sender):
+        return storage.exists(path)
+    start = time.perf_counter()
+    exists = storage.exists(path)
+    rendition_exists_probe.send(
+        sender=sender,
+        path=path,
+        exists=exists,
+        duration=time.perf_counter() - start
+    )
+    return exists
+
+
+class RenditionStatsCollector(object):
+    """
+    Aggregates the signals in versatileimagefield.signals.
+
+    Call `connect` to start collecting and `snapshot` to read the totals
+    (to export them to statsd or Prometheus, for instance):
+
+        collector = RenditionStatsCollector()
+        collector.connect()
+        ...
+        stats = collector.snapshot(reset=True)
+        statsd.incr('renditions.cache.hits', stats['cache']['hits'])
+
+    Thread safe. Events from every thread in the process are aggregated;
+    see `collect_rendition_stats` to only aggregate those of a block of
+    code (a single request, for instance).
+    """
+
+    def __init__(self):
+        """Construct a RenditionStatsCollector."""
+        self._lock = Lock()
+        self.reset()
+
+    def connect(self):
+        """Start receiving signals."""
+        rendition_resolved.connect(
+            self.resolved, weak=False, dispatch_uid=id(self)
+        )
+        rendition_stage_finished.connect(
+            self.stage_finished, weak=False, dispatch_uid=id(self)
+        )
+        rendition_cache_lookup.connect(
+            self.cache_lookup, weak=False, dispatch_uid=id(self)
+        )
+        rendition_exists_probe.connect(
+            self.exists_probe, weak=False, dispatch_uid=id(self)
+        )
+
+    def disconnect(self):
+        """Stop receiving signals."""
+        rendition_resolved.disconnect(dispatch_uid=id(self))
+        rendition_stage_finished.disconnect(dispatch_uid=id(self))
+        rendition_cache_lookup.disconnect(dispatch_uid=id(self))
+        rendition_exists_probe.disconnect(dispatch_uid=id(self))
+
+    def reset(self):
+        """Zero every total."""
+        with self._lock:
+            self._zero()
+
+    def _zero(self):
+        self.resolved_renditions = {'count': 0, 'duration': 0.0}
+        self.stages = {stage: new_stage_totals() for stage in STAGES}
+        self.cache = {'hits': 0, 'misses': 0, 'duration': 0.0}
+        self.exists = {'count': 0, 'found': 0, 'duration': 0.0}
+
+    def resolved(self, sender, duration, **kwargs):
+        """Receive rendition_resolved."""
+        with self._lock:
+            self.resolved_renditions['count'] += 1
+            self.resolved_renditions['duration'] += duration
+
+    def stage_finished(self, sender, stage, duration, nbytes=None,
+                       exception=None, **kwargs):
+        """Receive rendition_stage_finished."""
+        with self._lock:
+            totals = self.stages.setdefault(stage, new_stage_totals())
+            totals['count'] += 1
+            if exception is not None:
+                totals['failures'] += 1
+            totals['duration'] += duration
+            totals['max_duration'] = max(totals['max_duration'], duration)
+            if nbytes is not None:
+                totals['nbytes'] += nbytes
+
+    def cache_lookup(self, sender, hit, duration=0.0, **kwargs):
+        """Receive rendition_cache_lookup."""
+        with self._lock:
+            self.cache['hits' if hit else 'misses'] += 1
+            self.cache['duration'] += duration
+
+    def exists_probe(self, sender, exists, duration, **kwargs):
+        """Receive rendition_exists_probe."""
+        with self._lock:
+            self.exists['count'] += 1
+            self.exists['duration'] += duration
+            if exists:
+                self.exists['found'] += 1
+
+    def snapshot(self, reset=False):
+        """
+        Return a copy of the totals as a dict with 'resolved', 'stages',
+        'cache' and 'exists' keys. Zeroes them afterwards if `reset` is
+        True.
+        """
+        with self._lock:
+            snapshot = {
+                'resolved': dict(self.resolved_renditions),
+                'stages': {
+                    stage: dict(totals) for stage, totals in self.stages.items()
+                },
+                'cache': dict(self.cache),
+                'exists': dict(self.exists),
+            }
+            if reset:
+                self._zero()
+        return snapshot
+
+
+# The RenditionStatsCollectors of the `collect_rendition_stats` blocks
+# being run by the current thread or task (innermost last).
+current_collectors = ContextVar(
+    'versatileimagefield_current_collectors', default=()
+)
+
+
+def forward_to_current_collector(method_name):
+    """
+    Return a signal receiver that calls the `method_name` method of the
+    collectors of the `collect_rendition_stats` blocks (if any) the signal
+    is sent from.
+    """
+    def receiver(sender, **kwargs):
+        for collector in current_collectors.get():
+            getattr(collector, method_name)(sender, **kwargs)
+    return receiver
+
+
+CONTEXT_RECEIVERS = (
+    (rendition_resolved, forward_to_current_collector('resolved')),
+    (rendition_stage_finished, forward_to_current_collector('stage_finished')),
+    (rendition_cache_lookup, forward_to_current_collector('cache_lookup')),
+    (rendition_exists_probe, forward_to_current_collector('exists_probe')),
+)
+context_receivers_connected = False
+
+
+@contextmanager
+def collect_rendition_stats():
+    """
+    Collect the rendition stats of the code run by the block this wraps
+    (in the current thread or asyncio task, and any they hand work to via
+    asgiref's sync_to_async/async_to_sync).
+
+    Yields a (disconnected) RenditionStatsCollector with the totals:
+
+        with collect_rendition_stats() as collector:
+            response = view(request)
+        print(collector.snapshot())
+
+    Once this has been used, the signals in versatileimagefield.signals
+    always have a receiver so rendition lookups & creation are timed for
+    the rest of the process' life (which is why this is intended for
+    development).
+    """
+    global context_receivers_connected
+    if not context_receivers_connected:
+        for signal, receiver in CONTEXT_RECEIVERS:
+            signal.connect(
+                receiver,
+                weak=False,
+                dispatch_uid='versatileimagefield.instrumentation.collect_rendition_stats'
+            )
+        context_receivers_connected = True
+    collector = RenditionStatsCollector()
+    token = current_collectors.set(current_collectors.get() + (collector,))
+    try:
+        yield collector
+    finally:
+        current_collectors.reset(token)
+
+
+def summarize_rendition_stats(stats):
+    """
+    Return a flat dict summarizing `stats` (as returned by
+    RenditionStatsCollector.snapshot) with these keys:
+        * `resolved`: How many renditions were accessed.
+        * `cache_hits` & `cache_misses`: How many cache lookups found
+          renditions marked as created (or didn't).
+        * `exists_probes`: How many `storage.exists` calls were made.
+        * `created`: How many renditions were created (synchronously).
+        * `failed`: How many stages of creating renditions raised.
+    and the total time (in milliseconds) of each (`resolved_ms`,
+    `cache_ms`, `exists_ms` & `created_ms`, which includes stages that
+    failed).
+    """
+    stages = stats['stages'].values()
+    saved = stats['stages'].get('save_image', new_stage_totals())
+    return {
+        'resolved': stats['resolved']['count'],
+        'resolved_ms': stats['resolved']['duration'] * 1000,
+        'cache_hits': stats['cache']['hits'],
+        'cache_misses': stats['cache']['misses'],
+        'cache_ms': stats['cache']['duration'] * 1000,
+        'exists_probes': stats['exists']['count'],
+        'exists_ms': stats['exists']['duration'] * 1000,
+        'created': saved['count'] - saved['failures'],
+        'failed': sum(totals['failures'] for totals in stages),
+        'created_ms': sum(totals['duration'] for totals in stages) * 1000,
+    }
+
+
+def format_rendition_stats(summary):
+    """Return `summary` (see `summarize_rendition_stats`) as a string."""
+    return (
+        'resolved={resolved} ({resolved_ms:.1f}ms); '
+        'cache_hits={cache_hits}; cache_misses={cache_misses} '
+        '({cache_ms:.1f}ms); exists_probes={exists_probes} '
+        '({exists_ms:.1f}ms); created={created} ({created_ms:.1f}ms); '
+        'failed={failed}'
+    ).format(**summary)
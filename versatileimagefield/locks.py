@@ -0,0 +1,83 @@
+"""Cache-based locks that keep renditions from being created concurrently."""
+from hashlib import md5
+import time
+from uuid import uuid4
+
+from .settings import (
+    cache,
+    VERSATILEIMAGEFIELD_RENDITION_LOCK_TIMEOUT,
+    VERSATILEIMAGEFIELD_RENDITION_LOCK_WAIT
+)
+
+
+class RenditionLock(object):
+    """
+    A lock (shared by every process using VERSATILEIMAGEFIELD_CACHE_NAME)
+    held while a rendition is being created so that concurrent requests
+    for the same missing rendition only create it once.
+
+    The lock is taken with `cache.add` (which only succeeds if the key
+    doesn't exist yet) and expires after `timeout` seconds so a process
+    that dies while holding it can't block creation forever. `timeout`
+    should comfortably exceed the time it takes to create a rendition.
+    The lock's key holds a token unique to its holder and is only deleted
+    on release if it still holds that token, so a holder that outlives
+    `timeout` can't release a lock another process has since acquired.
+
+    Constructor arguments:
+        * `path`: The path (on storage) of the rendition to lock.
+        * `timeout`: How long (in seconds) the lock can be held. If falsy,
+                     locking is disabled and `acquire` always succeeds.
+        * `wait`: How long (in seconds) `acquire` waits for another process
+                  to release the lock.
+        * `token`: The token of a lock acquired by another RenditionLock
+                   (in another process, for instance) to release it.
+    """
+
+    key_prefix = 'versatileimagefield_lock:'
+
+    def __init__(self, path, timeout=None, wait=None, token=None):
+        """
+        Construct a RenditionLock. `timeout` and `wait` default to the
+        'rendition_lock_timeout' and 'rendition_lock_wait' settings.
+        """
+        self.key = self.key_prefix + md5(path.encode('utf-8')).hexdigest()
+        if timeout is None:
+            timeout = VERSATILEIMAGEFIELD_RENDITION_LOCK_TIMEOUT
+        if wait is None:
+            wait = VERSATILEIMAGEFIELD_RENDITION_LOCK_WAIT
+        self.timeout = timeout
+        self.wait = wait
+        self.token = token or uuid4().hex
+        self.acquired = token is not None
+        # Whether `acquire` had to wait for another process.
+        self.waited = False
+
+    def acquire(self):
+        """
+        Acquire the lock, waiting up to `self.wait` seconds for another
+        process to release it. Returns False if the lock wasn't acquired.
+        """
+        if not self.timeout:
+            return True
+        deadline = time.monotonic() + self.wait
+        delay = 0.05
+        while not cache.add(self.key, self.token, self.timeout):
+            self.waited = True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.5)
+        self.acquired = True
+        return True
+
+    def release(self):
+        """
+        Release the lock (if it was acquired by `self` and hasn't expired
+        and been acquired by another process since).
+        """
+        if self.acquired:
+            if cache.get(self.key) == self.token:
+                cache.delete(self.key)
+            self.acquired = False
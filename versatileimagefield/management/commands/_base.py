@@ -0,0 +1,97 @@
+"""Functionality shared by the versatileimagefield management commands."""
+import datetime
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+class ImageAttrCommand(BaseCommand):
+    """
+    A management command that processes a VersatileImageField on every
+    instance of a model.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model',
+            help="The model to process, as app_label.ModelName."
+        )
+        parser.add_argument(
+            'image_attr',
+            help=(
+                "The VersatileImageField to process. Can be dot-notated to "
+                "follow relations, e.g. 'related_model.headshot'."
+            )
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help="How many instances to fetch from the database at a time."
+        )
+        parser.add_argument(
+            '--since',
+            help="Only process instances whose --since-field is on or after "
+                 "this date (YYYY-MM-DD) or datetime (YYYY-MM-DD HH:MM)."
+        )
+        parser.add_argument(
+            '--since-field',
+            help="The date or datetime field of the model --since filters on."
+        )
+
+    def get_model(self, options):
+        """Return the model class named by the `model` argument."""
+        try:
+            return apps.get_model(options['model'])
+        except (LookupError, ValueError) as e:
+            raise CommandError(str(e))
+
+    @staticmethod
+    def parse_since(value):
+        """Return the date or datetime `value` as a datetime."""
+        try:
+            since = parse_datetime(value)
+            if since is None:
+                since_date = parse_date(value)
+                if since_date is not None:
+                    since = datetime.datetime.combine(
+                        since_date, datetime.time()
+                    )
+        except ValueError:
+            since = None
+        if since is None:
+            raise CommandError(
+                "--since must be a date (YYYY-MM-DD) or datetime "
+                "(YYYY-MM-DD HH:MM), not '{}'.".format(value)
+            )
+        if settings.USE_TZ and timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+    def get_queryset(self, model, options):
+        """Return a QuerySet of the instances of `model` to process."""
+        queryset = model._default_manager.all()
+        if options['since']:
+            if not options['since_field']:
+                raise CommandError("--since requires --since-field.")
+            queryset = queryset.filter(**{
+                '{}__gte'.format(options['since_field']):
+                    self.parse_since(options['since'])
+            })
+        return queryset
+
+    def write_throughput(self, verb, num_images, seconds, bytes_written=None,
+                         bytes_deleted=None):
+        """Report how many images were processed (and how quickly)."""
+        images_per_second = num_images / seconds if seconds else 0.0
+        message = "{} {} image(s) in {:.2f}s ({:.2f} images/sec".format(
+            verb, num_images, seconds, images_per_second
+        )
+        if bytes_written is not None:
+            message += ", {} bytes written".format(bytes_written)
+        if bytes_deleted is not None:
+            message += ", {} bytes deleted".format(bytes_deleted)
+        self.stdout.write(message + ").")
@@ -0,0 +1,37 @@
+"""Delete every rendition created from the images of a VersatileImageField."""
+from functools import reduce
+import time
+
+from ...image_warmer import only_image_attr
+from ._base import ImageAttrCommand
+
+
+class Command(ImageAttrCommand):
+    help = (
+        "Deletes every sized and filtered image created from the images of a "
+        "VersatileImageField on every instance of a model."
+    )
+
+    def handle(self, *args, **options):
+        model = self.get_model(options)
+        queryset = only_image_attr(
+            self.get_queryset(model, options), options['image_attr']
+        )
+        num_deleted = 0
+        bytes_deleted = 0
+        start = time.perf_counter()
+        for instance in queryset.iterator(chunk_size=options['batch_size']):
+            versatileimagefieldfile = reduce(
+                getattr, options['image_attr'].split("."), instance
+            )
+            if versatileimagefieldfile:
+                deleted, num_bytes = \
+                    versatileimagefieldfile.delete_all_created_images(
+                        measure=True
+                    )
+                num_deleted += len(deleted)
+                bytes_deleted += num_bytes
+        self.write_throughput(
+            'Deleted', num_deleted, time.perf_counter() - start,
+            bytes_deleted=bytes_deleted
+        )
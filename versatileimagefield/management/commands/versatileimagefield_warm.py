@@ -0,0 +1,98 @@
+"""Create renditions for every image of a VersatileImageField."""
+from hashlib import md5
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import CommandError
+
+from ...image_warmer import CacheCheckpoint, FileCheckpoint, VersatileImageFieldWarmer
+from ...utils import get_rendition_key_set, InvalidSizeKey
+from ._base import ImageAttrCommand
+
+
+class Command(ImageAttrCommand):
+    help = (
+        "Creates the renditions in a Rendition Key Set for the images of a "
+        "VersatileImageField on every instance of a model. Progress is "
+        "checkpointed so an interrupted run can be continued with --resume."
+    )
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--set',
+            dest='rendition_key_set',
+            required=True,
+            help="The name of a Rendition Key Set in "
+                 "VERSATILEIMAGEFIELD_RENDITION_KEY_SETS."
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help="How many images to create renditions for in parallel."
+        )
+        parser.add_argument(
+            '--executor',
+            choices=sorted(VersatileImageFieldWarmer.executors),
+            default='process',
+            help="How renditions are created when --workers is more than 1."
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help="Continue from the checkpoint of an interrupted run instead "
+                 "of starting over."
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help="Save checkpoints to this file. By default checkpoints are "
+                 "saved to VERSATILEIMAGEFIELD_CACHE_NAME (which must "
+                 "outlive this command for --resume to work)."
+        )
+
+    def handle(self, *args, **options):
+        model = self.get_model(options)
+        try:
+            get_rendition_key_set(options['rendition_key_set'])
+        except (ImproperlyConfigured, InvalidSizeKey) as e:
+            raise CommandError(str(e))
+        queryset = self.get_queryset(model, options)
+
+        if options['checkpoint']:
+            checkpoint = FileCheckpoint(options['checkpoint'])
+        else:
+            job = '{}:{}:{}:{}'.format(
+                model._meta.label,
+                options['image_attr'],
+                options['rendition_key_set'],
+                options['since'] or ''
+            )
+            # Hashed so cache keys stay memcached-safe (--since can contain
+            # spaces).
+            checkpoint = CacheCheckpoint(
+                'versatileimagefield_warm:' + md5(
+                    job.encode('utf-8')
+                ).hexdigest()
+            )
+        warmer = VersatileImageFieldWarmer(
+            instance_or_queryset=queryset,
+            rendition_key_set=options['rendition_key_set'],
+            image_attr=options['image_attr'],
+            verbose=options['verbosity'] > 1,
+            workers=options['workers'],
+            executor=options['executor'],
+            chunk_size=options['batch_size'],
+            checkpoint=checkpoint,
+            resume=options['resume']
+        )
+        start = time.perf_counter()
+        num_created, failed_to_create = warmer.warm()
+        self.write_throughput(
+            'Warmed',
+            num_created,
+            time.perf_counter() - start,
+            bytes_written=warmer.bytes_written
+        )
+        for path in failed_to_create:
+            self.stderr.write("Failed to create images from: {}".format(path))
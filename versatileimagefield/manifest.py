@@ -0,0 +1,146 @@
+"""A per-image index of the renditions that exist on storage."""
+from hashlib import md5
+import time
+from uuid import uuid4
+
+from .settings import (
+    cache,
+    VERSATILEIMAGEFIELD_CACHE_LENGTH,
+    VERSATILEIMAGEFIELD_USE_RENDITION_MANIFEST
+)
+
+
+class RenditionManifest(object):
+    """
+    Records which renditions (sized, filtered & filtered + sized) of an
+    image exist on storage.
+
+    The manifest is saved to the cache as a single entry per image so one
+    cache lookup answers whether any of its renditions exist, without
+    calling `storage.exists` (a network request on S3-like storages) for
+    each of them. A rendition missing from the manifest is still looked for
+    on storage (and added to the manifest if found) so an evicted manifest
+    only costs performance.
+
+    Since renditions present in the manifest are trusted, changes are made
+    with compare-and-set: each saved manifest has a version and a change
+    is only saved by the process that claims the next version (via
+    `cache.add`, which only succeeds if the key doesn't exist yet). Others
+    re-read the manifest and try again, so a rendition discarded by one
+    process can't be written back by another that read the manifest
+    before it was discarded. (Like RenditionLock, this relies on changes
+    taking less than `claim_timeout` seconds.)
+
+    Constructor arguments:
+        * `path_to_image`: The path (on storage) of the image whose
+                           renditions are recorded.
+    """
+
+    key_prefix = 'versatileimagefield_manifest:'
+    # How long (in seconds) a claim on a version is held. Should comfortably
+    # exceed the time it takes to read, change and save the manifest.
+    claim_timeout = 10
+    # How many times (and how long apart) a change is attempted.
+    max_attempts = 50
+    retry_delay = 0.01
+
+    def __init__(self, path_to_image):
+        """Construct a RenditionManifest."""
+        self.path_to_image = path_to_image
+        self.key = self.key_prefix + md5(
+            path_to_image.encode('utf-8')
+        ).hexdigest()
+        self._paths = None
+
+    @property
+    def paths(self):
+        """The set of rendition paths known to exist on storage."""
+        if self._paths is None:
+            self._paths = self.fetch()
+        return self._paths
+
+    def __contains__(self, path):
+        """Return True if the rendition at `path` exists on storage."""
+        return path in self.paths
+
+    @staticmethod
+    def new_entry():
+        """
+        Return an empty manifest. Each has its own `generation` so version
+        claims made before a manifest was evicted don't apply to the next.
+        """
+        return {'generation': uuid4().hex, 'version': 0, 'paths': []}
+
+    def fetch(self):
+        """Return the set of rendition paths saved to the cache."""
+        entry = cache.get(self.key)
+        return set(entry['paths']) if entry else set()
+
+    def change(self, change_paths):
+        """
+        Apply `change_paths` (a callable that changes the set of paths it's
+        passed in place) to the saved manifest.
+
+        Returns False if another process held the claim on the next version
+        for all `max_attempts` attempts.
+        """
+        for attempt in range(self.max_attempts):
+            entry = cache.get(self.key)
+            if entry is None:
+                cache.add(
+                    self.key, self.new_entry(), VERSATILEIMAGEFIELD_CACHE_LENGTH
+                )
+                continue
+            version = entry['version'] + 1
+            if cache.add(
+                '%s:%s:%d' % (self.key, entry['generation'], version),
+                1,
+                self.claim_timeout
+            ):
+                paths = set(entry['paths'])
+                change_paths(paths)
+                cache.set(
+                    self.key,
+                    {
+                        'generation': entry['generation'],
+                        'version': version,
+                        'paths': sorted(paths),
+                    },
+                    VERSATILEIMAGEFIELD_CACHE_LENGTH
+                )
+                self._paths = paths
+                return True
+            time.sleep(self.retry_delay)
+        return False
+
+    def update(self, paths):
+        """Record that the renditions at `paths` exist on storage."""
+        # If the change can't be saved the renditions are looked for on
+        # storage next time, so there's nothing else to do.
+        self.change(lambda saved: saved.update(paths))
+
+    def add(self, path):
+        """Record that the rendition at `path` exists on storage."""
+        self.update((path,))
+
+    def discard(self, paths):
+        """Record that the renditions at `paths` no longer exist."""
+        if not self.change(lambda saved: saved.difference_update(paths)):
+            # Renditions in the manifest are trusted so, rather than risk
+            # leaving `paths` in it, start a new (empty) manifest.
+            self.clear()
+
+    def clear(self):
+        """Replace the manifest with an empty one."""
+        self._paths = set()
+        cache.set(self.key, self.new_entry(), VERSATILEIMAGEFIELD_CACHE_LENGTH)
+
+
+def get_rendition_manifest(path_to_image):
+    """
+    Return a RenditionManifest for `path_to_image` or None if
+    VERSATILEIMAGEFIELD_SETTINGS['use_rendition_manifest'] is False.
+    """
+    if VERSATILEIMAGEFIELD_USE_RENDITION_MANIFEST and path_to_image:
+        return RenditionManifest(path_to_image)
+    return None
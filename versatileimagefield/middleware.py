@@ -0,0 +1,60 @@
+"""Middleware that reports the renditions each request resolves & creates."""
+import logging
+
+from django.conf import settings
+
+from .instrumentation import (
+    collect_rendition_stats,
+    format_rendition_stats,
+    summarize_rendition_stats
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RenditionStatsMiddleware(object):
+    """
+    Records, for each request, how many renditions were accessed, how many
+    were found in the cache, how many `storage.exists` calls were made and
+    how many renditions were created (and how long each took).
+
+    Intended for development (see
+    versatileimagefield.instrumentation.collect_rendition_stats). The stats
+    are:
+        * Available to views as `request.rendition_stats` (a
+          RenditionStatsCollector).
+        * Logged to the 'versatileimagefield.middleware' logger (at WARNING
+          level if `warning_threshold` or more renditions were accessed and
+          DEBUG level otherwise).
+        * Added to responses as an 'X-Rendition-Stats' header if
+          settings.DEBUG is True.
+    """
+
+    header = 'X-Rendition-Stats'
+    # How many renditions a request can access before a warning is logged.
+    warning_threshold = 100
+
+    def __init__(self, get_response):
+        """Construct a RenditionStatsMiddleware."""
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Collect the rendition stats of `request`."""
+        with collect_rendition_stats() as collector:
+            request.rendition_stats = collector
+            response = self.get_response(request)
+        summary = summarize_rendition_stats(collector.snapshot())
+        if summary['resolved']:
+            logger.log(
+                logging.WARNING
+                if summary['resolved'] >= self.warning_threshold
+                else logging.DEBUG,
+                'Renditions for %s %s: %s',
+                request.method,
+                request.path,
+                format_rendition_stats(summary),
+                extra={'rendition_stats': summary}
+            )
+        if settings.DEBUG:
+            response[self.header] = format_rendition_stats(summary)
+        return response
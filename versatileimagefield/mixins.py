@@ -3,6 +3,7 @@ import os
 import re
 
 from .datastructures import FilterLibrary
+from .manifest import get_rendition_manifest
 from .registry import autodiscover, versatileimagefield_registry
 from .settings import (
     cache,
@@ -96,32 +97,91 @@ class VersatileImageMixIn(object):
             self._ppoi_value = ppoi
             self.build_filters_and_sizers(ppoi, self.create_on_demand)
 
+    @property
+    def rendition_memo(self):
+        """
+        Return a dict of rendition URL -> previously fetched cache value.
+
+        Shared by all of this file's sizers & filters so they can skip cache
+        lookups that have already been made in bulk (see
+        versatileimagefield.utils.prefetch_renditions).
+        """
+        try:
+            return self.__dict__['_rendition_memo']
+        except KeyError:
+            memo = self.__dict__['_rendition_memo'] = {}
+            return memo
+
+    def get_rendition_manifest(self, name):
+        """
+        Return the RenditionManifest of the image at `name` shared by all of
+        this file's sizers & filters (or None if manifests are disabled).
+        """
+        manifest = self.__dict__.get('_rendition_manifest')
+        if manifest is None or manifest.path_to_image != name:
+            manifest = get_rendition_manifest(name)
+            self.__dict__['_rendition_manifest'] = manifest
+        return manifest
+
     def build_filters_and_sizers(self, ppoi_value, create_on_demand):
-        """Build the filters and sizers for a field."""
+        """
+        Prepare the filters and sizers for a field.
+
+        Filters and sizers aren't actually constructed until they're accessed
+        for the first time (see `__getattr__`). Once built they're reused
+        until the file's name, `ppoi_value` or `create_on_demand` change.
+        """
         name = self.name
         if not name and self.field.placeholder_image_name:
             name = self.field.placeholder_image_name
-        self.filters = FilterLibrary(
-            name,
-            self.storage,
-            versatileimagefield_registry,
-            ppoi_value,
-            create_on_demand
-        )
-        for (
-            attr_name,
-            sizedimage_cls
-        ) in versatileimagefield_registry._sizedimage_registry.items():
-            setattr(
-                self,
-                attr_name,
-                sizedimage_cls(
-                    path_to_image=name,
-                    storage=self.storage,
-                    create_on_demand=create_on_demand,
-                    ppoi=ppoi_value
+        state = self.__dict__.get('_filters_and_sizers_state')
+        # Comparing each value individually (as opposed to building a new
+        # tuple) keeps repeated descriptor access allocation-free.
+        if state is not None and state[0] == name and state[1] == ppoi_value:
+            if state[2] is create_on_demand:
+                return
+        self.__dict__.pop('filters', None)
+        for attr_name in versatileimagefield_registry._sizedimage_registry:
+            self.__dict__.pop(attr_name, None)
+        self._filters_and_sizers_state = (name, ppoi_value, create_on_demand)
+
+    def __getattr__(self, attr_name):
+        """Build filters and sizers the first time they're accessed."""
+        if attr_name != 'filters' and (
+            attr_name not in versatileimagefield_registry._sizedimage_registry
+        ):
+            raise AttributeError(
+                "'%s' object has no attribute '%s'" % (
+                    self.__class__.__name__, attr_name
                 )
             )
+        if '_filters_and_sizers_state' not in self.__dict__:
+            self.build_filters_and_sizers(self.ppoi, self.create_on_demand)
+        name, ppoi_value, create_on_demand = self._filters_and_sizers_state
+        if attr_name == 'filters':
+            built = FilterLibrary(
+                name,
+                self.storage,
+                versatileimagefield_registry,
+                ppoi_value,
+                create_on_demand
+            )
+        else:
+            sizedimage_cls = versatileimagefield_registry._sizedimage_registry[
+                attr_name
+            ]
+            built = sizedimage_cls(
+                path_to_image=name,
+                storage=self.storage,
+                create_on_demand=create_on_demand,
+                ppoi=ppoi_value
+            )
+        built.rendition_memo = self.rendition_memo
+        built.rendition_manifest = self.get_rendition_manifest(name)
+        # Storing `built` on the instance means subsequent access won't pass
+        # through __getattr__ at all.
+        self.__dict__[attr_name] = built
+        return built
 
     def get_filtered_root_folder(self):
         """Return the location where filtered images are stored."""
@@ -141,7 +201,8 @@ class VersatileImageMixIn(object):
             VERSATILEIMAGEFIELD_FILTERED_DIRNAME
         )
 
-    def delete_matching_files_from_storage(self, root_folder, regex):
+    def delete_matching_files_from_storage(self, root_folder, regex,
+                                           measure=False):
         """
         Delete files in `root_folder` which match `regex` before file ext.
 
@@ -153,9 +214,18 @@ class VersatileImageMixIn(object):
             Result:
                 * foo/bar-baz.jpg <- Deleted
                 * foo/bar-biz.jpg <- Not deleted
+
+        Returns a list of the paths of the deleted files. If `measure` is
+        True, the size of each file is fetched from storage before it's
+        deleted (an extra request per file on remote storages) and a
+        2-tuple is returned instead:
+            [0]: The list of the paths of the deleted files
+            [1]: The number of bytes they took up on storage
         """
+        deleted = []
+        num_bytes = 0
         if not self.name:   # pragma: no cover
-            return
+            return (deleted, num_bytes) if measure else deleted
         try:
             directory_list, file_list = self.storage.listdir(root_folder)
         except OSError:   # pragma: no cover
@@ -169,41 +239,88 @@ class VersatileImageMixIn(object):
                 tag = f[len(basename):-len(ext)]
                 assert f == basename + tag + ext
                 if regex.match(tag) is not None:
-                    file_location = os.path.join(root_folder, f)
-                    self.storage.delete(file_location)
-                    cache.delete(
-                        self.storage.url(file_location)
-                    )
-                    print(
-                        "Deleted {file} (created from: {original})".format(
-                            file=os.path.join(root_folder, f),
-                            original=self.name
-                        )
+                    deleted.append(os.path.join(root_folder, f))
+            manifest = self.get_rendition_manifest(self.name)
+            if manifest is not None and deleted:
+                # Removed from the manifest first so nothing relies on it
+                # for files that are about to be deleted.
+                manifest.discard(deleted)
+            for file_location in deleted:
+                if measure:
+                    try:
+                        num_bytes += self.storage.size(file_location)
+                    except (OSError, NotImplementedError):  # pragma: no cover
+                        pass
+                self.storage.delete(file_location)
+                url = self.storage.url(file_location)
+                cache.delete(url)
+                # Renditions created (or prefetched) through this file are
+                # memoized; forget them so they're recreated on demand.
+                self.rendition_memo.pop(url, None)
+                print(
+                    "Deleted {file} (created from: {original})".format(
+                        file=file_location,
+                        original=self.name
                     )
+                )
+            if deleted:
+                # The filter library holds on to the filtered images it has
+                # created; it's rebuilt on next access so they're recreated.
+                self.__dict__.pop('filters', None)
+        return (deleted, num_bytes) if measure else deleted
 
-    def delete_filtered_images(self):
-        """Delete all filtered images created from `self.name`."""
-        self.delete_matching_files_from_storage(
+    def delete_filtered_images(self, measure=False):
+        """
+        Delete all filtered images created from `self.name`.
+
+        See `delete_matching_files_from_storage` for `measure`.
+        """
+        return self.delete_matching_files_from_storage(
             self.get_filtered_root_folder(),
-            filter_regex
+            filter_regex,
+            measure=measure
         )
 
-    def delete_sized_images(self):
-        """Delete all sized images created from `self.name`."""
-        self.delete_matching_files_from_storage(
+    def delete_sized_images(self, measure=False):
+        """
+        Delete all sized images created from `self.name`.
+
+        See `delete_matching_files_from_storage` for `measure`.
+        """
+        return self.delete_matching_files_from_storage(
             self.get_sized_root_folder(),
-            sizer_regex
+            sizer_regex,
+            measure=measure
         )
 
-    def delete_filtered_sized_images(self):
-        """Delete all filtered sized images created from `self.name`."""
-        self.delete_matching_files_from_storage(
+    def delete_filtered_sized_images(self, measure=False):
+        """
+        Delete all filtered sized images created from `self.name`.
+
+        See `delete_matching_files_from_storage` for `measure`.
+        """
+        return self.delete_matching_files_from_storage(
             self.get_filtered_sized_root_folder(),
-            filter_and_sizer_regex
+            filter_and_sizer_regex,
+            measure=measure
         )
 
-    def delete_all_created_images(self):
-        """Delete all images created from `self.name`."""
-        self.delete_filtered_images()
-        self.delete_sized_images()
-        self.delete_filtered_sized_images()
+    def delete_all_created_images(self, measure=False):
+        """
+        Delete all images created from `self.name`.
+
+        Returns a list of the paths of the deleted files (see
+        `delete_matching_files_from_storage` for `measure`).
+        """
+        deleted = []
+        num_bytes = 0
+        for delete in (self.delete_filtered_images,
+                       self.delete_sized_images,
+                       self.delete_filtered_sized_images):
+            if measure:
+                paths, nbytes = delete(measure=True)
+                num_bytes += nbytes
+            else:
+                paths = delete()
+            deleted.extend(paths)
+        return (deleted, num_bytes) if measure else deleted
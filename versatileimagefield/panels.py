@@ -0,0 +1,51 @@
+"""
+A django-debug-toolbar panel that reports the renditions each request
+resolves & creates. Add 'versatileimagefield.panels.RenditionStatsPanel'
+to settings.DEBUG_TOOLBAR_PANELS to use it.
+"""
+from debug_toolbar.panels import Panel
+from django.utils.translation import gettext_lazy as _
+
+from .instrumentation import (
+    collect_rendition_stats,
+    STAGES,
+    summarize_rendition_stats
+)
+
+
+class RenditionStatsPanel(Panel):
+    """
+    Shows how many renditions were accessed, found in the cache, looked
+    for on storage & created while handling a request (and how long each
+    took) along with the time spent in each stage of creating renditions.
+    """
+
+    title = _('Renditions')
+    template = 'versatileimagefield/debug_toolbar/rendition_stats.html'
+
+    @property
+    def nav_subtitle(self):
+        """Return a one-line summary for the toolbar."""
+        summary = self.get_stats().get('summary')
+        if not summary:
+            return ''
+        return _('%(resolved)d accessed, %(created)d created') % summary
+
+    def process_request(self, request):
+        """Collect the rendition stats of `request`."""
+        with collect_rendition_stats() as collector:
+            self.collector = collector
+            return super(RenditionStatsPanel, self).process_request(request)
+
+    def generate_stats(self, request, response):
+        """Record the stats collected by `process_request`."""
+        stats = self.collector.snapshot()
+        self.record_stats({
+            'summary': summarize_rendition_stats(stats),
+            'stages': [
+                dict(stats['stages'][stage], name=stage, duration_ms=(
+                    stats['stages'][stage]['duration'] * 1000
+                ))
+                for stage in STAGES
+            ],
+        })
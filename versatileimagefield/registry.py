@@ -64,6 +64,7 @@ class VersatileImageFieldRegistry(object):
         'filters',
         'flush',
         'get_filtered_root_folder',
+        'get_rendition_manifest',
         'get_sized_root_folder',
         'get_filtered_sized_root_folder',
         'delete_matching_files_from_storage',
@@ -84,6 +85,7 @@ class VersatileImageFieldRegistry(object):
         'readinto',
         'readline',
         'readlines',
+        'rendition_memo',
         'save',
         'seek',
         'size',
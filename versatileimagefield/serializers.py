@@ -1,8 +1,13 @@
-from rest_framework.serializers import ImageField
+from django.db.models.manager import BaseManager
+from rest_framework.fields import SkipField
+from rest_framework.serializers import ImageField, ListSerializer
 
 from .utils import (
-    build_versatileimagefield_url_set,
+    build_url_set_from_plans,
+    compile_rendition_key_set,
     get_rendition_key_set,
+    get_rendition_plans,
+    prefetch_image_renditions,
     validate_versatileimagefield_sizekey_list
 )
 
@@ -29,8 +34,11 @@ class VersatileImageFieldSerializer(ImageField):
 
     def __init__(self, sizes, *args, **kwargs):
         if isinstance(sizes, str):
-            sizes = get_rendition_key_set(sizes)
-        self.sizes = validate_versatileimagefield_sizekey_list(sizes)
+            self.sizes = get_rendition_key_set(sizes)
+            self.plans = get_rendition_plans(sizes)
+        else:
+            self.sizes = validate_versatileimagefield_sizekey_list(sizes)
+            self.plans = compile_rendition_key_set(self.sizes)
         super(VersatileImageFieldSerializer, self).__init__(
             *args, **kwargs
         )
@@ -40,9 +48,9 @@ class VersatileImageFieldSerializer(ImageField):
         context_request = None
         if self.context:
             context_request = self.context.get('request', None)
-        return build_versatileimagefield_url_set(
+        return build_url_set_from_plans(
             value,
-            self.sizes,
+            self.plans,
             request=context_request
         )
 
@@ -51,3 +59,49 @@ class VersatileImageFieldSerializer(ImageField):
         For djangorestframework >= 3
         """
         return self.to_native(value)
+
+    def prefetch_renditions(self, instances):
+        """
+        Fetch the cache entries for the renditions in `self.plans` of the
+        image of each of `instances` with a single query.
+        """
+        image_instances = []
+        for instance in instances:
+            try:
+                image_instance = self.get_attribute(instance)
+            except SkipField:
+                continue
+            if image_instance is not None:
+                image_instances.append(image_instance)
+        prefetch_image_renditions(image_instances, self.plans)
+
+
+class VersatileImageListSerializer(ListSerializer):
+    """
+    A ListSerializer that fetches the cache entries for every rendition
+    its child's VersatileImageFieldSerializer fields will serialize with
+    a single query per field (instead of one per rendition per object).
+
+    Use it as the `list_serializer_class` of serializers with
+    VersatileImageFieldSerializer fields:
+
+        class PersonSerializer(serializers.ModelSerializer):
+            headshot = VersatileImageFieldSerializer(sizes='headshot')
+
+            class Meta:
+                model = Person
+                fields = ('name', 'headshot')
+                list_serializer_class = VersatileImageListSerializer
+    """
+
+    def to_representation(self, data):
+        """Prefetch rendition cache entries then serialize `data`."""
+        iterable = list(
+            data.all() if isinstance(data, BaseManager) else data
+        )
+        for field in self.child._readable_fields:
+            if isinstance(field, VersatileImageFieldSerializer):
+                field.prefetch_renditions(iterable)
+        return super(VersatileImageListSerializer, self).to_representation(
+            iterable
+        )
@@ -66,7 +66,80 @@ VERSATILEIMAGEFIELD_SETTINGS = {
     'image_key_post_processor': None,
     # Whether to create progressive JPEGs. Read more about progressive JPEGs
     # here: https://optimus.io/support/progressive-jpeg/
-    'progressive_jpeg': False
+    'progressive_jpeg': False,
+    # Whether sizers should decode JPEGs at a reduced scale (1/2, 1/4 or 1/8)
+    # when the image they're creating is small enough to allow it. Read more
+    # about draft mode here:
+    # https://pillow.readthedocs.io/en/latest/reference/Image.html#PIL.Image.Image.draft
+    # Reduced scale decoding is much faster but changes the pixels of crops &
+    # thumbnails slightly. Defaults to False
+    'jpeg_draft_mode': False,
+    # Whether to keep a 'manifest' (a single cache entry per image) of the
+    # renditions that exist on storage. When an image's renditions aren't
+    # individually cached, the manifest answers whether they exist without
+    # a `storage.exists` call (a network request on S3-like storages).
+    # Defaults to False
+    'use_rendition_manifest': False,
+    # When many processes request the same missing rendition at once, only
+    # the first creates it; the rest wait for it. This is how long (in
+    # seconds) a process can spend creating a rendition before others stop
+    # waiting for it. Set to 0 to disable. Defaults to 60
+    'rendition_lock_timeout': 60,
+    # How long (in seconds) a process waits for another process to create a
+    # rendition before returning its URL anyway. Defaults to 5
+    'rendition_lock_wait': 5,
+    # Whether images created on demand should be created asynchronously (by
+    # 'rendition_task_backend') instead of within the request that first
+    # accesses them. The URL of a rendition that's being created is returned
+    # immediately. Requires 'rendition_lock_timeout' (which keeps a job from
+    # being enqueued by every request for a missing rendition). Defaults to
+    # False
+    'create_images_asynchronously': False,
+    # A dot-notated python path string to the class that creates images
+    # asynchronously. `django-versatileimagefield` ships with
+    # 'versatileimagefield.tasks.ThreadPoolBackend' (which creates images in
+    # a pool of threads within the current process) and
+    # 'versatileimagefield.tasks.SynchronousBackend'. Subclass
+    # 'versatileimagefield.tasks.BaseRenditionBackend' to use a task queue.
+    'rendition_task_backend': 'versatileimagefield.tasks.ThreadPoolBackend',
+    # How many threads 'versatileimagefield.tasks.ThreadPoolBackend' creates
+    # images in. Defaults to 4
+    'rendition_task_workers': 4,
+    # How many sized & filtered image paths (and parsed Rendition Keys) to
+    # memoize (per process). Paths only depend on the name of the original
+    # image and the rendition so memoizing them saves recomputing them every
+    # time a URL is built. Set to 0 to disable or None for no limit. Defaults
+    # to 10000
+    'path_cache_size': 10000,
+    # How long (in seconds) to cache the URLs returned by storage classes
+    # (per process). Useful with storages that sign their URLs (like S3 with
+    # querystring auth); keep it well under how long signatures are valid.
+    # Set to 0 to disable. Defaults to 0
+    'storage_url_cache_timeout': 0,
+    # How many URLs to cache when 'storage_url_cache_timeout' is set (a
+    # positive integer). Defaults to 10000
+    'storage_url_cache_size': 10000,
+    # How many bytes of an original image to hold in memory while creating
+    # renditions of it. Originals are streamed from storage into a temporary
+    # file that moves to disk once it grows larger than this. Set to None to
+    # read originals straight from the file returned by `storage.open`.
+    # Defaults to 10485760 (10MB)
+    'source_spool_max_size': 10485760,
+    # Whether to take the format & mime type of original images from PIL
+    # (which has already identified them) rather than sniffing them with
+    # libmagic. libmagic is still used for formats PIL names differently.
+    # Defaults to True
+    'use_pil_image_format': True,
+    # How the 'crop' and 'thumbnail' Sizers resample images:
+    #   'pillow': Pillow's defaults ('exact' for crops, 'reducing_gap' for
+    #       thumbnails), which is how images were always resampled.
+    #   'exact': A single LANCZOS pass from the full-size image.
+    #   'reducing_gap': Reduce the image by an integer factor (to no less
+    #       than twice the target size) then make a final LANCZOS pass.
+    #   'fast': Reduce the image by an integer factor (to no less than the
+    #       target size) then make a final LANCZOS pass.
+    # Defaults to 'pillow'
+    'resampling_strategy': 'pillow'
 }
 
 USER_DEFINED = getattr(
@@ -118,6 +191,101 @@ VERSATILEIMAGEFIELD_LOSSLESS_WEBP = VERSATILEIMAGEFIELD_SETTINGS.get(
     'lossless_webp'
 )
 
+VERSATILEIMAGEFIELD_JPEG_DRAFT_MODE = VERSATILEIMAGEFIELD_SETTINGS.get(
+    'jpeg_draft_mode'
+)
+
+VERSATILEIMAGEFIELD_USE_RENDITION_MANIFEST = VERSATILEIMAGEFIELD_SETTINGS.get(
+    'use_rendition_manifest'
+)
+
+VERSATILEIMAGEFIELD_RENDITION_LOCK_TIMEOUT = VERSATILEIMAGEFIELD_SETTINGS.get(
+    'rendition_lock_timeout'
+)
+
+VERSATILEIMAGEFIELD_RENDITION_LOCK_WAIT = VERSATILEIMAGEFIELD_SETTINGS.get(
+    'rendition_lock_wait'
+)
+
+VERSATILEIMAGEFIELD_CREATE_IMAGES_ASYNCHRONOUSLY = VERSATILEIMAGEFIELD_SETTINGS.get(
+    'create_images_asynchronously'
+)
+
+if VERSATILEIMAGEFIELD_CREATE_IMAGES_ASYNCHRONOUSLY and not (
+    VERSATILEIMAGEFIELD_RENDITION_LOCK_TIMEOUT
+):
+    raise ImproperlyConfigured(
+        "VERSATILEIMAGEFIELD_SETTINGS['create_images_asynchronously'] "
+        "requires rendition locks: 'rendition_lock_timeout' can't be 0."
+    )
+
+VERSATILEIMAGEFIELD_RENDITION_TASK_BACKEND = VERSATILEIMAGEFIELD_SETTINGS.get(
+    'rendition_task_backend'
+)
+
+VERSATILEIMAGEFIELD_RENDITION_TASK_WORKERS = VERSATILEIMAGEFIELD_SETTINGS.get(
+    'rendition_task_workers'
+)
+
+VERSATILEIMAGEFIELD_PATH_CACHE_SIZE = VERSATILEIMAGEFIELD_SETTINGS.get(
+    'path_cache_size'
+)
+
+VERSATILEIMAGEFIELD_STORAGE_URL_CACHE_TIMEOUT = VERSATILEIMAGEFIELD_SETTINGS.get(
+    'storage_url_cache_timeout'
+)
+
+VERSATILEIMAGEFIELD_STORAGE_URL_CACHE_SIZE = VERSATILEIMAGEFIELD_SETTINGS.get(
+    'storage_url_cache_size'
+)
+
+if VERSATILEIMAGEFIELD_STORAGE_URL_CACHE_TIMEOUT and not (
+    type(VERSATILEIMAGEFIELD_STORAGE_URL_CACHE_SIZE) is int and VERSATILEIMAGEFIELD_STORAGE_URL_CACHE_SIZE > 0
+):
+    raise ImproperlyConfigured(
+        "VERSATILEIMAGEFIELD_SETTINGS['storage_url_cache_size'] must be a "
+        "positive integer, not {!r}.".format(
+            VERSATILEIMAGEFIELD_STORAGE_URL_CACHE_SIZE
+        )
+    )
+
+VERSATILEIMAGEFIELD_SOURCE_SPOOL_MAX_SIZE = VERSATILEIMAGEFIELD_SETTINGS.get(
+    'source_spool_max_size'
+)
+
+VERSATILEIMAGEFIELD_USE_PIL_IMAGE_FORMAT = VERSATILEIMAGEFIELD_SETTINGS.get(
+    'use_pil_image_format'
+)
+
+# The `reducing_gap` that leaves it to Image.resize & Image.thumbnail to
+# pick their own (see versatileimagefield.versatileimagefield.get_resize_kwargs)
+PILLOW_DEFAULT_REDUCING_GAP = 'default'
+
+# {Resampling strategy: The `reducing_gap` passed to Image.resize}
+RESAMPLING_STRATEGY_REDUCING_GAPS = {
+    'exact': None,
+    'pillow': PILLOW_DEFAULT_REDUCING_GAP,
+    'reducing_gap': 2.0,
+    'fast': 1.0,
+}
+
+VERSATILEIMAGEFIELD_RESAMPLING_STRATEGY = VERSATILEIMAGEFIELD_SETTINGS.get(
+    'resampling_strategy'
+)
+
+if VERSATILEIMAGEFIELD_RESAMPLING_STRATEGY not in RESAMPLING_STRATEGY_REDUCING_GAPS:
+    raise ImproperlyConfigured(
+        "VERSATILEIMAGEFIELD_SETTINGS['resampling_strategy'] must be one of "
+        "{}.".format(', '.join(
+            "'{}'".format(strategy)
+            for strategy in RESAMPLING_STRATEGY_REDUCING_GAPS
+        ))
+    )
+
+VERSATILEIMAGEFIELD_REDUCING_GAP = RESAMPLING_STRATEGY_REDUCING_GAPS[
+    VERSATILEIMAGEFIELD_RESAMPLING_STRATEGY
+]
+
 IMAGE_SETS = getattr(settings, 'VERSATILEIMAGEFIELD_RENDITION_KEY_SETS', {})
 
 post_processor_string = VERSATILEIMAGEFIELD_SETTINGS.get(
@@ -0,0 +1,52 @@
+"""
+Signals sent while renditions are looked up and created.
+
+None of them are sent unless they have receivers (see
+versatileimagefield.instrumentation, which also provides a collector that
+aggregates them).
+
+Every signal's `sender` is the class (a SizedImage or FilteredImage
+subclass) of the sizer or filter that sends it.
+
+rendition_stage_started & rendition_stage_finished are sent around each
+stage of creating a rendition with these arguments:
+    * `stage`: One of 'retrieve_image', 'preprocess', 'process_image' or
+               'save_image'.
+    * `path`: The path on storage of the image being read ('retrieve_image'
+              & 'preprocess') or written ('process_image' & 'save_image').
+rendition_stage_finished (which is sent even if the stage raises) also
+provides:
+    * `duration`: How long the stage took (in seconds).
+    * `nbytes`: How many bytes of the original image were read
+                ('retrieve_image') or how many bytes were encoded
+                ('process_image') or saved ('save_image'). None for
+                'preprocess' or if the size isn't known.
+    * `exception`: The exception the stage raised (None if it succeeded).
+
+rendition_resolved is sent when a sized or filtered image is accessed
+(`field.crop['400x400']` or `field.filters.invert`, for instance) with
+these arguments:
+    * `url`: The URL of the rendition.
+    * `duration`: How long resolving it (including any cache lookups,
+                  `storage.exists` calls & image creation) took (in seconds).
+    * `exception`: The exception resolving it raised (None if it didn't).
+
+rendition_cache_lookup is sent when the cache (or a prefetched
+`rendition_memo`) is consulted for a rendition with these arguments:
+    * `url`: The URL of the rendition.
+    * `hit`: Whether the rendition was marked as created.
+    * `duration`: How long the lookup took (in seconds).
+
+rendition_exists_probe is sent when storage is asked whether a rendition
+exists with these arguments:
+    * `path`: The path of the rendition on storage.
+    * `exists`: The answer.
+    * `duration`: How long `storage.exists` took (in seconds).
+"""
+from django.dispatch import Signal
+
+rendition_stage_started = Signal(use_caching=True)
+rendition_stage_finished = Signal(use_caching=True)
+rendition_resolved = Signal(use_caching=True)
+rendition_cache_lookup = Signal(use_caching=True)
+rendition_exists_probe = Signal(use_caching=True)
@@ -0,0 +1,101 @@
+"""Build (and optionally cache) the URLs of files on storage."""
+from collections import OrderedDict
+from threading import Lock
+import time
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
+
+from .settings import (
+    VERSATILEIMAGEFIELD_STORAGE_URL_CACHE_SIZE,
+    VERSATILEIMAGEFIELD_STORAGE_URL_CACHE_TIMEOUT
+)
+
+
+def build_url(storage, path):
+    """
+    Return `storage.url(path)`.
+
+    FileSystemStorage URLs (and those of subclasses that don't override
+    `url`) are built by appending `path` to the storage's `base_url`,
+    skipping the `urljoin` call they'd otherwise make.
+    """
+    # `storage.__class__` (unlike `type(storage)`) sees through
+    # django.core.files.storage.default_storage.
+    if getattr(storage.__class__, 'url', None) is FileSystemStorage.url:
+        base_url = storage.base_url
+        if base_url is not None:
+            url = filepath_to_uri(path).lstrip('/')
+            # urljoin resolves '.' & '..' path segments.
+            if '/.' not in '/' + url:
+                return base_url + url
+    return storage.url(path)
+
+
+class StorageURLCache(object):
+    """
+    A bounded, per-process cache of `storage.url(path)` results.
+
+    Useful for storages that sign their URLs (or otherwise make them
+    expensive to compute). Entries expire `timeout` seconds after they're
+    computed, which must be shorter than how long signed URLs are valid.
+
+    Constructor arguments:
+        * `maxsize`: How many URLs to keep. The least recently used URLs are
+                     discarded first.
+        * `timeout`: How long (in seconds) URLs are kept.
+    """
+
+    def __init__(self, maxsize, timeout):
+        """Construct a StorageURLCache."""
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.hits = self.misses = 0
+        self._urls = OrderedDict()
+        self._lock = Lock()
+
+    def url(self, storage, path):
+        """Return `storage.url(path)`, computing it if need be."""
+        key = (id(storage), path)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._urls.get(key)
+            # Entries hold a reference to their storage so its id can't be
+            # reused by another storage while they're cached.
+            if entry is not None and entry[0] is storage and entry[2] > now:
+                self._urls.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        url = build_url(storage, path)
+        with self._lock:
+            self._urls[key] = (storage, url, now + self.timeout)
+            self._urls.move_to_end(key)
+            while len(self._urls) > self.maxsize:
+                self._urls.popitem(last=False)
+        return url
+
+    def clear(self):
+        """Remove every URL from the cache."""
+        with self._lock:
+            self._urls.clear()
+            self.hits = self.misses = 0
+
+
+if VERSATILEIMAGEFIELD_STORAGE_URL_CACHE_TIMEOUT:
+    storage_url_cache = StorageURLCache(
+        VERSATILEIMAGEFIELD_STORAGE_URL_CACHE_SIZE,
+        VERSATILEIMAGEFIELD_STORAGE_URL_CACHE_TIMEOUT
+    )
+else:
+    storage_url_cache = None
+
+
+def get_storage_url(storage, path):
+    """
+    Return `storage.url(path)`, from `storage_url_cache` if
+    VERSATILEIMAGEFIELD_SETTINGS['storage_url_cache_timeout'] is set.
+    """
+    if storage_url_cache is None:
+        return build_url(storage, path)
+    return storage_url_cache.url(storage, path)
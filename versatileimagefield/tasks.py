@@ -0,0 +1,266 @@
+"""Create renditions outside of the request/response cycle."""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+from django.utils.module_loading import import_string
+
+from .locks import RenditionLock
+from .manifest import get_rendition_manifest
+from .settings import (
+    cache,
+    VERSATILEIMAGEFIELD_CACHE_LENGTH,
+    VERSATILEIMAGEFIELD_RENDITION_TASK_BACKEND,
+    VERSATILEIMAGEFIELD_RENDITION_TASK_WORKERS
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RenditionJob(object):
+    """
+    A description of a rendition to create that can be pickled (or, via
+    `to_dict`, serialized to JSON) and handed to a task queue.
+
+    Constructor arguments:
+        * `processor_path`: The dotted path to the SizedImage or
+                            FilteredImage subclass that creates the rendition.
+        * `processor_kwargs`: The keyword arguments (other than `storage` and
+                              `create_on_demand`) to construct it with.
+        * `storage`: The storage class to save the rendition to, as a 3-tuple
+                     returned by its `deconstruct` method.
+        * `save_path`: Where on storage to save the rendition.
+        * `url`: The URL of the rendition.
+        * `width` & `height`: The size of sized renditions.
+        * `source`: A RenditionJob for the (filtered) image this rendition is
+                    created from, if that image must exist first.
+        * `manifest_path`: The path of the image whose RenditionManifest
+                           records this rendition (if manifests are enabled).
+        * `lock_token`: The token of the RenditionLock taken on the rendition
+                        when it was enqueued, released once it's created.
+    """
+
+    def __init__(self, processor_path, processor_kwargs, storage, save_path,
+                 url, width=None, height=None, source=None,
+                 manifest_path=None, lock_token=None):
+        """Construct a RenditionJob."""
+        self.processor_path = processor_path
+        self.processor_kwargs = processor_kwargs
+        self.storage = storage
+        self.save_path = save_path
+        self.url = url
+        self.width = width
+        self.height = height
+        self.source = source
+        self.manifest_path = manifest_path
+        self.lock_token = lock_token
+
+    @classmethod
+    def for_processor(cls, processor, save_path, url, width=None, height=None):
+        """
+        Return a RenditionJob for the rendition `processor` (a SizedImage
+        or FilteredImage instance) saves at `save_path`.
+        """
+        processor_cls = processor.__class__
+        source = None
+        if processor.rendition_source is not None:
+            source = cls.for_processor(
+                processor.rendition_source,
+                processor.rendition_source.name,
+                processor.rendition_source.url
+            )
+        manifest = processor.rendition_manifest
+        return cls(
+            processor_path='{}.{}'.format(
+                processor_cls.__module__, processor_cls.__qualname__
+            ),
+            processor_kwargs=processor.get_rendition_job_kwargs(),
+            storage=processor.storage.deconstruct(),
+            save_path=save_path,
+            url=url,
+            width=width,
+            height=height,
+            source=source,
+            manifest_path=None if manifest is None else manifest.path_to_image
+        )
+
+    def to_dict(self):
+        """Return a JSON-serializable dict representation of `self`."""
+        storage_path, storage_args, storage_kwargs = self.storage
+        return {
+            'processor_path': self.processor_path,
+            'processor_kwargs': self.processor_kwargs,
+            'storage': [storage_path, list(storage_args), storage_kwargs],
+            'save_path': self.save_path,
+            'url': self.url,
+            'width': self.width,
+            'height': self.height,
+            'source': None if self.source is None else self.source.to_dict(),
+            'manifest_path': self.manifest_path,
+            'lock_token': self.lock_token,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Return a RenditionJob from the output of `to_dict`."""
+        data = dict(data)
+        if data['source'] is not None:
+            data['source'] = cls.from_dict(data['source'])
+        return cls(**data)
+
+    def get_storage(self):
+        """Return a new instance of the storage class to save to."""
+        storage_path, storage_args, storage_kwargs = self.storage
+        return import_string(storage_path)(*storage_args, **storage_kwargs)
+
+    def create(self, storage):
+        """Create the rendition on `storage` (if it doesn't exist yet)."""
+        if self.source is not None:
+            self.source.create(storage)
+        if not storage.exists(self.save_path):
+            processor = import_string(self.processor_path)(
+                storage=storage,
+                create_on_demand=False,
+                **self.processor_kwargs
+            )
+            path_to_image = self.processor_kwargs['path_to_image']
+            if self.width is None:
+                processor.create_filtered_image(path_to_image, self.save_path)
+            else:
+                processor.create_resized_image(
+                    path_to_image, self.save_path, self.width, self.height
+                )
+        cache.set(self.url, 1, VERSATILEIMAGEFIELD_CACHE_LENGTH)
+        if self.manifest_path:
+            manifest = get_rendition_manifest(self.manifest_path)
+            if manifest is not None:
+                manifest.add(self.save_path)
+
+    def run(self):
+        """
+        Create the rendition then release the lock taken on it when `self`
+        was enqueued (see RenditionCacheMixIn.ensure_rendition_exists).
+        """
+        try:
+            self.create(self.get_storage())
+        except Exception:
+            logger.exception('Thumbnail generation failed',
+                             extra={'path': self.save_path})
+        finally:
+            if self.lock_token:
+                # The lock was acquired by the process that enqueued `self`.
+                RenditionLock(self.save_path, token=self.lock_token).release()
+
+
+class BaseRenditionBackend(object):
+    """
+    The base class for backends that create renditions asynchronously.
+
+    Subclasses must implement `enqueue`.
+    """
+
+    def submit(self, get_job):
+        """
+        Enqueue the RenditionJob returned by `get_job`. Returns True if it
+        was enqueued.
+
+        `get_job` is only called once the job is going to be enqueued so
+        backends that drop jobs (by overriding `submit`) don't build them.
+        """
+        self.enqueue(get_job())
+        return True
+
+    def enqueue(self, job):
+        """Arrange for `job` (a RenditionJob) to be run."""
+        raise NotImplementedError(
+            'Subclasses MUST provide an `enqueue` method.'
+        )
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting jobs and release the backend's resources (waiting for
+        enqueued jobs to finish if `wait` is True and the backend runs them).
+        """
+        pass
+
+
+class ThreadPoolBackend(BaseRenditionBackend):
+    """
+    Runs RenditionJobs in a pool of `max_workers` threads within the current
+    process (no task queue required). `max_workers` defaults to
+    VERSATILEIMAGEFIELD_SETTINGS['rendition_task_workers'].
+
+    Exceptions raised by jobs are logged. Jobs submitted once the backend
+    has been shut down are dropped.
+    """
+
+    def __init__(self, max_workers=None):
+        """Construct a ThreadPoolBackend."""
+        if max_workers is None:
+            max_workers = VERSATILEIMAGEFIELD_RENDITION_TASK_WORKERS
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='versatileimagefield'
+        )
+        self.is_shut_down = False
+
+    def submit(self, get_job):
+        """
+        Enqueue the RenditionJob returned by `get_job` unless the backend has
+        been shut down.
+        """
+        if self.is_shut_down:
+            return False
+        return super(ThreadPoolBackend, self).submit(get_job)
+
+    def enqueue(self, job):
+        """Run `job` in the thread pool. Returns a Future."""
+        future = self.executor.submit(job.run)
+        future.add_done_callback(self.log_failure)
+        return future
+
+    @staticmethod
+    def log_failure(future):
+        """Log the exception raised by a job's `future` (if any)."""
+        if not future.cancelled() and future.exception() is not None:
+            logger.error('Rendition job failed', exc_info=future.exception())
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting jobs and shut down the thread pool (waiting for
+        running & enqueued jobs to finish if `wait` is True).
+        """
+        self.is_shut_down = True
+        self.executor.shutdown(wait=wait)
+
+
+class SynchronousBackend(BaseRenditionBackend):
+    """Runs RenditionJobs immediately (useful for tests & debugging)."""
+
+    def enqueue(self, job):
+        """Run `job`."""
+        job.run()
+
+
+_backend = None
+
+
+def get_rendition_backend():
+    """
+    Return the backend configured by
+    VERSATILEIMAGEFIELD_SETTINGS['rendition_task_backend'].
+    """
+    global _backend
+    if _backend is None:
+        _backend = import_string(VERSATILEIMAGEFIELD_RENDITION_TASK_BACKEND)()
+    return _backend
+
+
+def shutdown_rendition_backend(wait=True):
+    """
+    Shut down the backend returned by `get_rendition_backend` (if it has
+    been created) so the next call creates a new one.
+    """
+    global _backend
+    if _backend is not None:
+        backend, _backend = _backend, None
+        backend.shutdown(wait=wait)
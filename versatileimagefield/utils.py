@@ -1,4 +1,6 @@
-from functools import reduce
+import asyncio
+from collections import namedtuple
+from functools import lru_cache, reduce
 
 import os
 
@@ -6,13 +8,16 @@ import magic
 from django.core.exceptions import ImproperlyConfigured
 
 from .settings import (
+    cache,
     IMAGE_SETS,
     JPEG_QUAL,
+    VERSATILEIMAGEFIELD_PATH_CACHE_SIZE,
     VERSATILEIMAGEFIELD_POST_PROCESSOR,
     VERSATILEIMAGEFIELD_SIZED_DIRNAME,
     VERSATILEIMAGEFIELD_FILTERED_DIRNAME,
     WEBP_QUAL,
 )
+from .storage_urls import get_storage_url
 
 # PIL-supported file formats as found here:
 # https://infohost.nmt.edu/tcc/help/pubs/pil/formats.html
@@ -35,6 +40,14 @@ MIME_TYPE_TO_PIL_IDENTIFIER = {
     'image/x-xpm': 'XPM',
     'image/webp': 'WEBP',
 }
+# {PIL Identifier: mime type}
+PIL_IDENTIFIER_TO_MIME_TYPE = {
+    pil_identifier: mime_type
+    for mime_type, pil_identifier in MIME_TYPE_TO_PIL_IDENTIFIER.items()
+}
+# Many cameras save JPEGs with extra frames (like a second image for 3D
+# displays) which PIL identifies as MPO. Only the first frame is used.
+PIL_IDENTIFIER_TO_MIME_TYPE['MPO'] = 'image/jpeg'
 
 
 class InvalidSizeKeySet(Exception):
@@ -89,7 +102,14 @@ def get_resized_path(path_to_image, width, height,
     """
     Return a `path_to_image` location on `storage` as dictated by `width`, `height`
     and `filename_key`
+
+    Paths are memoized (see `get_path_cache_info`).
     """
+    return _get_resized_path(path_to_image, width, height, filename_key)
+
+
+@lru_cache(maxsize=VERSATILEIMAGEFIELD_PATH_CACHE_SIZE)
+def _get_resized_path(path_to_image, width, height, filename_key):
     containing_folder, filename = os.path.split(path_to_image)
 
     resized_filename = get_resized_filename(
@@ -129,7 +149,14 @@ def get_filtered_filename(filename, filename_key):
 def get_filtered_path(path_to_image, filename_key, storage):
     """
     Return the 'filtered path'
+
+    Paths are memoized (see `get_path_cache_info`).
     """
+    return _get_filtered_path(path_to_image, filename_key)
+
+
+@lru_cache(maxsize=VERSATILEIMAGEFIELD_PATH_CACHE_SIZE)
+def _get_filtered_path(path_to_image, filename_key):
     containing_folder, filename = os.path.split(path_to_image)
 
     filtered_filename = get_filtered_filename(filename, filename_key)
@@ -143,6 +170,31 @@ def get_filtered_path(path_to_image, filename_key, storage):
     return path_to_return
 
 
+def get_path_cache_info():
+    """
+    Return the hits, misses, maximum size & current size (as
+    `functools.lru_cache` CacheInfo named tuples) of the memoized
+    'resized' and 'filtered' paths and parsed Rendition Keys
+    ('image_keys'), keyed by type. Size the caches with
+    VERSATILEIMAGEFIELD_SETTINGS['path_cache_size'].
+    """
+    return {
+        'resized': _get_resized_path.cache_info(),
+        'filtered': _get_filtered_path.cache_info(),
+        'image_keys': parse_image_key.cache_info(),
+    }
+
+
+def clear_path_cache():
+    """
+    Clear the memoized 'resized' and 'filtered' paths (and parsed
+    Rendition Keys).
+    """
+    _get_resized_path.cache_clear()
+    _get_filtered_path.cache_clear()
+    parse_image_key.cache_clear()
+
+
 def get_image_metadata_from_file(file_like):
     """
     Receive a valid image file and returns a 2-tuple of two strings:
@@ -156,6 +208,19 @@ def get_image_metadata_from_file(file_like):
     return image_format, mime_type
 
 
+def get_image_metadata_from_image(image):
+    """
+    Receive a PIL Image instance and return the same 2-tuple as
+    `get_image_metadata_from_file` (from `image.format`) without sniffing
+    its file. Returns None if `image.format` isn't a key of
+    PIL_IDENTIFIER_TO_MIME_TYPE.
+    """
+    mime_type = PIL_IDENTIFIER_TO_MIME_TYPE.get(image.format)
+    if mime_type is None:
+        return None
+    return MIME_TYPE_TO_PIL_IDENTIFIER[mime_type], mime_type
+
+
 def validate_versatileimagefield_sizekey_list(sizes):
     """
     Validate a list of size keys.
@@ -200,6 +265,25 @@ def get_url_from_image_key(image_instance, image_key):
     return img_url
 
 
+async def aget_url_from_image_key(image_instance, image_key):
+    """Async version of `get_url_from_image_key`."""
+    img_key_split = image_key.split('__')
+    if 'x' in img_key_split[-1]:
+        size_key = img_key_split.pop(-1)
+    else:
+        size_key = None
+    img_url = image_instance
+    for attr in img_key_split:
+        if hasattr(img_url, 'aget'):
+            # A FilterLibrary (which creates filtered images on access).
+            img_url = await img_url.aget(attr)
+        else:
+            img_url = getattr(img_url, attr)
+    if size_key:
+        img_url = (await img_url.aget(size_key)).url
+    return img_url
+
+
 def build_versatileimagefield_url_set(image_instance, size_set, request=None):
     """
     Return a dictionary of urls corresponding to size_set
@@ -219,14 +303,42 @@ def build_versatileimagefield_url_set(image_instance, size_set, request=None):
         }
     - `request`:
     """
-    size_set = validate_versatileimagefield_sizekey_list(size_set)
+    return build_url_set_from_plans(
+        image_instance, compile_rendition_key_set(size_set), request=request
+    )
+
+
+def build_url_set_from_plans(image_instance, plans, request=None):
+    """
+    Return `build_versatileimagefield_url_set(image_instance, size_set)`
+    where `plans` is the output of `compile_rendition_key_set(size_set)`.
+    """
     to_return = {}
     if image_instance or image_instance.field.placeholder_image:
-        for key, image_key in size_set:
-            img_url = get_url_from_image_key(image_instance, image_key)
+        for plan in plans:
+            img_url = plan.get_url(image_instance)
             if request is not None:
                 img_url = request.build_absolute_uri(img_url)
-            to_return[key] = img_url
+            to_return[plan.key] = img_url
+    return to_return
+
+
+async def build_versatileimagefield_url_set_async(image_instance, size_set,
+                                                  request=None):
+    """
+    Async version of `build_versatileimagefield_url_set`. The URLs in
+    `size_set` are resolved concurrently.
+    """
+    plans = compile_rendition_key_set(size_set)
+    to_return = {}
+    if image_instance or image_instance.field.placeholder_image:
+        img_urls = await asyncio.gather(*[
+            plan.aget_url(image_instance) for plan in plans
+        ])
+        for plan, img_url in zip(plans, img_urls):
+            if request is not None:
+                img_url = request.build_absolute_uri(img_url)
+            to_return[plan.key] = img_url
     return to_return
 
 
@@ -244,3 +356,270 @@ def get_rendition_key_set(key):
         )
     else:
         return validate_versatileimagefield_sizekey_list(rendition_key_set)
+
+
+@lru_cache(maxsize=VERSATILEIMAGEFIELD_PATH_CACHE_SIZE)
+def parse_image_key(image_key):
+    """
+    Parse a Rendition Key into a 4-tuple:
+        [0]: The name of a registered filter (or None)
+        [1]: The name of a registered sizer (or None)
+        [2]: Width in pixels, as an int (or None if there is no sizer)
+        [3]: Height in pixels, as an int (or None if there is no sizer)
+
+    Examples:
+        'url' -> (None, None, None, None)
+        'filters__invert__url' -> ('invert', None, None, None)
+        'crop__400x400' -> (None, 'crop', 400, 400)
+        'filters__invert__crop__400x400' -> ('invert', 'crop', 400, 400)
+
+    InvalidSizeKey will raise if `image_key` isn't in one of these forms.
+
+    Memoized (in a cache sized by
+    VERSATILEIMAGEFIELD_SETTINGS['path_cache_size']).
+    """
+    img_key_split = image_key.split('__')
+    if img_key_split[-1] == 'url':
+        img_key_split.pop(-1)
+    filter_name = sizer_name = width = height = None
+    if img_key_split[:1] == ['filters'] and len(img_key_split) >= 2:
+        filter_name = img_key_split[1]
+        img_key_split = img_key_split[2:]
+    if len(img_key_split) == 2:
+        sizer_name, size_key = img_key_split
+        try:
+            width, height = [int(i) for i in size_key.split('x')]
+        except ValueError:
+            img_key_split = None
+    if img_key_split is None or len(img_key_split) not in (0, 2):
+        raise InvalidSizeKey(
+            "{0} is an invalid Rendition Key. Rendition Keys must either "
+            "be 'url' or made up of an (optional) filter and a sizer. "
+            "Examples: 'crop__400x400', 'filters__invert__url', "
+            "'filters__invert__crop__400x400'".format(image_key)
+        )
+    return filter_name, sizer_name, width, height
+
+
+def get_rendition_urls(image_instance, image_key):
+    """
+    Return a list of the URLs `image_key` will look up in the cache.
+
+    These are the same URLs the sizers and filters of `image_instance` (a
+    VersatileImageFieldFile) check (and mark in the cache) when resolving
+    `image_key`, computed without touching the cache or storage.
+    """
+    return RenditionPlan.compile(None, image_key).get_rendition_urls(
+        image_instance
+    )
+
+
+def _overrides(processor, method_name, base_cls=None):
+    """
+    Return True if `processor` (a sizer or filter, or its class) overrides
+    `base_cls`.`method_name` (`base_cls` defaults to SizedImage).
+    """
+    if base_cls is None:
+        from .datastructures.sizedimage import SizedImage as base_cls
+    if not isinstance(processor, type):
+        processor = type(processor)
+    return getattr(processor, method_name) is not getattr(
+        base_cls, method_name
+    )
+
+
+class RenditionPlan(namedtuple('RenditionPlan', [
+    'key', 'image_key', 'filter_name', 'sizer_name', 'width', 'height'
+])):
+    """
+    A Rendition Key parsed ahead of time (see `compile_rendition_key_set`)
+    so it can be resolved against many images without any string parsing.
+
+    Attributes:
+        * `key`: The key of the rendition's URL in a URL set.
+        * `image_key`: The Rendition Key. Example: 'filters__invert__url'
+        * `filter_name`, `sizer_name`, `width` & `height`: See
+          `parse_image_key`. If `image_key` can't be parsed (i.e. it's an
+          arbitrary dunder path to an attribute) all four are None and
+          `image_key` is resolved with `get_url_from_image_key`.
+
+    Sized renditions are resolved via the sizer's `get_sized_image` (or
+    `aget_sized_image`) method, skipping the parsing of size keys, unless
+    the sizer overrides `__getitem__` (or `aget`) in which case it's used
+    instead, just like in templates.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def compile(cls, key, image_key):
+        """Return a RenditionPlan for `image_key`."""
+        try:
+            parsed = parse_image_key(image_key)
+        except InvalidSizeKey:
+            return cls(key, image_key, None, None, None, None)
+        return cls(key, image_key, *parsed)
+
+    def get_url(self, image_instance):
+        """Return the URL of this rendition of `image_instance`."""
+        if self.filter_name is None and self.sizer_name is None:
+            return get_url_from_image_key(image_instance, self.image_key)
+        source = image_instance
+        if self.filter_name is not None:
+            source = image_instance.filters[self.filter_name]
+        if self.sizer_name is None:
+            return source.url
+        sizer = getattr(source, self.sizer_name)
+        if _overrides(sizer, '__getitem__'):
+            return sizer[self.size_key].url
+        return sizer.get_sized_image(self.width, self.height).url
+
+    async def aget_url(self, image_instance):
+        """Async version of `get_url`."""
+        if self.filter_name is None and self.sizer_name is None:
+            return await aget_url_from_image_key(
+                image_instance, self.image_key
+            )
+        source = image_instance
+        if self.filter_name is not None:
+            source = await image_instance.filters.aget(self.filter_name)
+        if self.sizer_name is None:
+            return source.url
+        sizer = getattr(source, self.sizer_name)
+        if _overrides(sizer, 'aget'):
+            return (await sizer.aget(self.size_key)).url
+        return (await sizer.aget_sized_image(self.width, self.height)).url
+
+    @property
+    def size_key(self):
+        """The size key of this rendition. Example: '400x400'"""
+        return '{}x{}'.format(self.width, self.height)
+
+    def get_rendition_urls(self, image_instance):
+        """
+        Return a list of the URLs resolving `self` against `image_instance`
+        will look up in the cache (see `get_rendition_urls`).
+        """
+        path_to_image = image_instance.name
+        if not path_to_image:
+            path_to_image = image_instance.field.placeholder_image_name
+        if not path_to_image:
+            return []
+
+        storage = image_instance.storage
+        registry = image_instance.filters.registry
+        urls = []
+        if self.filter_name is not None:
+            if self.filter_name not in registry._filter_registry:
+                return urls
+            path_to_image = get_filtered_path(
+                path_to_image=path_to_image,
+                filename_key=self.filter_name,
+                storage=storage
+            )
+            urls.append(get_storage_url(storage, path_to_image))
+
+        if self.sizer_name in registry._sizedimage_registry:
+            sizedimage = registry._sizedimage_registry[self.sizer_name](
+                path_to_image=path_to_image,
+                storage=storage,
+                create_on_demand=image_instance.create_on_demand,
+                ppoi=image_instance.ppoi
+            )
+            urls.append(get_storage_url(storage, get_resized_path(
+                path_to_image=path_to_image,
+                width=self.width,
+                height=self.height,
+                filename_key=sizedimage.get_filename_key(),
+                storage=storage
+            )))
+        return urls
+
+
+def compile_rendition_key_set(size_set):
+    """
+    Validate `size_set` (see `validate_versatileimagefield_sizekey_list`)
+    and return it as a tuple of RenditionPlan instances.
+    """
+    return tuple(
+        RenditionPlan.compile(key, image_key)
+        for key, image_key in validate_versatileimagefield_sizekey_list(
+            size_set
+        )
+    )
+
+
+_rendition_plans = {}
+
+
+def get_rendition_plans(key):
+    """
+    Return the Rendition Key Set at
+    settings.VERSATILEIMAGEFIELD_RENDITION_KEY_SETS[`key`] as a tuple of
+    RenditionPlan instances. Each set is only compiled once.
+    """
+    try:
+        return _rendition_plans[key]
+    except KeyError:
+        plans = _rendition_plans[key] = compile_rendition_key_set(
+            get_rendition_key_set(key)
+        )
+        return plans
+
+
+def prefetch_renditions(queryset_or_list, image_attr, rendition_key_set):
+    """
+    Fetch the cache entries for a set of renditions with a single query.
+
+    Without prefetching, each sized/filtered image accessed on a
+    VersatileImageField with on-demand creation turned on makes its own cache
+    lookup. This function computes the URLs of every rendition in
+    `rendition_key_set` for every object in `queryset_or_list`, fetches them
+    with one `cache.get_many` call and stores the results on each field's
+    `rendition_memo` so subsequent access skips the cache entirely.
+
+    - `queryset_or_list`: An iterable of model instances (i.e. a QuerySet)
+    - `image_attr`: A dot-notated path to a VersatileImageField on each object
+    - `rendition_key_set`: Either a string that corresponds to a key on
+      settings.VERSATILEIMAGEFIELD_RENDITION_KEY_SETS or an iterable of
+      2-tuples, both strings (see `build_versatileimagefield_url_set`).
+
+    Returns `queryset_or_list` so it can be passed directly to a template.
+    """
+    if isinstance(rendition_key_set, str):
+        plans = get_rendition_plans(rendition_key_set)
+    else:
+        plans = compile_rendition_key_set(rendition_key_set)
+    attr_path = image_attr.split('.')
+    prefetch_image_renditions(
+        [reduce(getattr, attr_path, obj) for obj in queryset_or_list],
+        plans
+    )
+    return queryset_or_list
+
+
+def prefetch_image_renditions(image_instances, plans):
+    """
+    Fetch the cache entries for the renditions in `plans` (the output of
+    `compile_rendition_key_set`) of each VersatileImageFieldFile in
+    `image_instances` with a single query. See `prefetch_renditions`.
+    """
+    urls_by_image = []
+    all_urls = set()
+    for image_instance in image_instances:
+        if not image_instance.create_on_demand:
+            # Nothing is looked up in the cache if images aren't created
+            # on demand.
+            continue
+        urls = []
+        for plan in plans:
+            urls.extend(plan.get_rendition_urls(image_instance))
+        urls_by_image.append((image_instance, urls))
+        all_urls.update(urls)
+
+    if all_urls:
+        cached = cache.get_many(list(all_urls))
+        for image_instance, urls in urls_by_image:
+            memo = image_instance.rendition_memo
+            for url in urls:
+                memo[url] = cached.get(url)
@@ -1,10 +1,15 @@
 """Default sizer & filter definitions."""
 from io import BytesIO
+import math
 
 from PIL import Image, ImageOps
 
 from .datastructures import FilteredImage, SizedImage
 from .registry import versatileimagefield_registry
+from .settings import (
+    PILLOW_DEFAULT_REDUCING_GAP,
+    VERSATILEIMAGEFIELD_REDUCING_GAP
+)
 
 
 try:
@@ -12,6 +17,21 @@ try:
 except AttributeError:
     ANTIALIAS = Image.ANTIALIAS  # deprecated in 9.1.0 and removed in 10.0.0
 
+# `reducing_gap` was added to Image.resize & Image.thumbnail in Pillow 7.0.0
+SUPPORTS_REDUCING_GAP = hasattr(Image.Image, 'reduce')
+
+
+def get_resize_kwargs():
+    """
+    Return the keyword arguments (other than size & resample) to resize
+    images with according to VERSATILEIMAGEFIELD_SETTINGS['resampling_strategy'].
+    """
+    if not SUPPORTS_REDUCING_GAP or (
+        VERSATILEIMAGEFIELD_REDUCING_GAP == PILLOW_DEFAULT_REDUCING_GAP
+    ):
+        return {}
+    return {'reducing_gap': VERSATILEIMAGEFIELD_REDUCING_GAP}
+
 
 class CroppedImage(SizedImage):
     """
@@ -30,6 +50,25 @@ class CroppedImage(SizedImage):
             ppoi=self.ppoi_as_str()
         )
 
+    def get_draft_size(self, image_size, width, height):
+        """
+        Return the minimum size an image must be decoded at to be cropped.
+
+        The area cropped from an image (as determined by the PPOI) has to be
+        at least `width`x`height` so the image must be scaled no smaller than
+        the largest of the two ratios.
+        """
+        scale = max(
+            float(width) / image_size[0],
+            float(height) / image_size[1]
+        )
+        if scale >= 1:
+            return None
+        return (
+            int(math.ceil(image_size[0] * scale)),
+            int(math.ceil(image_size[1] * scale))
+        )
+
     def crop_on_centerpoint(self, image, width, height, ppoi=(0.5, 0.5)):
         """
         Return a PIL Image instance cropped from `image`.
@@ -121,7 +160,8 @@ class CroppedImage(SizedImage):
         # (as determined by `width`x`height`)
         return cropped_image.resize(
             (width, height),
-            ANTIALIAS
+            ANTIALIAS,
+            **get_resize_kwargs()
         )
 
     def process_image(self, image, image_format, save_kwargs,
@@ -164,6 +204,24 @@ class ThumbnailImage(SizedImage):
 
     filename_key = 'thumbnail'
 
+    def get_draft_size(self, image_size, width, height):
+        """
+        Return the minimum size an image must be decoded at to be thumbnailed.
+
+        Thumbnails fit within `width`x`height` so the image must be scaled no
+        smaller than the smallest of the two ratios.
+        """
+        scale = min(
+            float(width) / image_size[0],
+            float(height) / image_size[1]
+        )
+        if scale >= 1:
+            return None
+        return (
+            int(math.ceil(image_size[0] * scale)),
+            int(math.ceil(image_size[1] * scale))
+        )
+
     def process_image(self, image, image_format, save_kwargs,
                       width, height):
         """
@@ -174,7 +232,8 @@ class ThumbnailImage(SizedImage):
         imagefile = BytesIO()
         image.thumbnail(
             (width, height),
-            ANTIALIAS
+            ANTIALIAS,
+            **get_resize_kwargs()
         )
         image.save(
             imagefile,